@@ -1,12 +1,73 @@
 """
 Gemini Image Generator SDK
 A Python SDK for AI-powered image generation using Gemini 2.5 Flash
+
+ImageGenerator, ImageGeneratorAgent, PromptEnhancer and PerceptualIndex
+are imported on first access, so configuring and validating the SDK does
+not pay for aiohttp and Pillow.
 """
 
-from .agent import ImageGeneratorAgent
-from .core import ImageGenerator
-from .config import Config, APIConfig
-from .types import GenerationResult, BatchConfig, ImagePrompt
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+from .config import (
+    Config,
+    APIConfig,
+    OutputConfig,
+    EnhancerConfig,
+    DedupConfig,
+    RoutingConfig,
+    TransportConfig
+)
+from .cache import ImageCache
+from .concurrency import AdaptiveConcurrencyLimiter, MemoryBudget
+from .errors import (
+    GeminiImageError,
+    APIError,
+    RateLimitError,
+    ServerError,
+    ClientError,
+    AuthenticationError,
+    RequestTimeoutError,
+    NoImageDataError,
+    ResponseFormatError,
+    CassetteMissError
+)
+from .keys import APIKey, KeyPool
+from .memory import MemoryLog
+from .metrics import MetricsRegistry
+from .ratelimit import RateLimiter, FileRateLimiter
+from .routing import ModelRoute, ModelRouter
+from .transport import Cassette, Transport, RecordingTransport, ReplayTransport
+from .types import GenerationResult, BatchConfig, ImagePrompt, Rendition, ChainResult, StepResult
+
+if TYPE_CHECKING:
+    from .agent import ImageGeneratorAgent
+    from .core import ImageGenerator
+    from .enhance import PromptEnhancer
+    from .phash import PerceptualIndex
+
+# Public names whose modules pull in aiohttp or Pillow, by defining module
+_LAZY = {
+    "ImageGeneratorAgent": ".agent",
+    "ImageGenerator": ".core",
+    "PromptEnhancer": ".enhance",
+    "PerceptualIndex": ".phash"
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
 
 __version__ = "1.0.0"
 __all__ = [
@@ -14,7 +75,42 @@ __all__ = [
     "ImageGenerator",
     "Config",
     "APIConfig",
+    "OutputConfig",
+    "EnhancerConfig",
+    "DedupConfig",
+    "RoutingConfig",
+    "TransportConfig",
+    "ImageCache",
+    "AdaptiveConcurrencyLimiter",
+    "MemoryBudget",
+    "PromptEnhancer",
+    "GeminiImageError",
+    "APIError",
+    "RateLimitError",
+    "ServerError",
+    "ClientError",
+    "AuthenticationError",
+    "RequestTimeoutError",
+    "NoImageDataError",
+    "ResponseFormatError",
+    "CassetteMissError",
+    "APIKey",
+    "KeyPool",
+    "MemoryLog",
+    "MetricsRegistry",
+    "PerceptualIndex",
+    "RateLimiter",
+    "FileRateLimiter",
+    "ModelRoute",
+    "ModelRouter",
+    "Cassette",
+    "Transport",
+    "RecordingTransport",
+    "ReplayTransport",
     "GenerationResult",
     "BatchConfig",
-    "ImagePrompt"
+    "ImagePrompt",
+    "Rendition",
+    "ChainResult",
+    "StepResult"
 ]
\ No newline at end of file
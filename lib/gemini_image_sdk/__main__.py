@@ -0,0 +1,7 @@
+"""Allow ``python -m gemini_image_sdk`` as an alias for the gemini-image CLI"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
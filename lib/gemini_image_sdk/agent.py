@@ -1,30 +1,161 @@
 """Agent-oriented features for intelligent image generation"""
 
+import hashlib
 import json
+import re
+import time
 import asyncio
-from typing import Optional, List, Dict, Any, Callable
+from itertools import combinations, islice
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
 from pathlib import Path
 
 from .core import ImageGenerator
 from .config import Config
-from .types import GenerationResult, ImagePrompt, AgentMemory, BatchConfig
+from .enhance import PromptEnhancer
+from .memory import MemoryLog
+from .metrics import MetricsRegistry
+from .ratelimit import RateLimiter
+from .types import (
+    AgentMemory,
+    BatchConfig,
+    ChainResult,
+    GenerationResult,
+    ImagePrompt,
+    Interaction,
+    StepResult
+)
+
+# The first five are the original variations; later ones combine modifiers
+VARIATION_MODIFIERS = [
+    "morning light",
+    "sunset atmosphere",
+    "dramatic lighting",
+    "minimalist style",
+    "vibrant colors",
+    "soft pastel palette",
+    "cinematic wide angle",
+    "black and white",
+    "close-up detail",
+    "aerial view"
+]
+
+
+def _variation_suffixes(count: int) -> Iterator[str]:
+    """First `count` distinct variation suffixes: single modifiers, then pairs, triples, ..."""
+    combos = (
+        ", ".join(combo)
+        for size in range(1, len(VARIATION_MODIFIERS) + 1)
+        for combo in combinations(VARIATION_MODIFIERS, size)
+    )
+    return islice(combos, max(0, count))
+
+
+_REF = re.compile(r"\$\{([^}]+)\}")
+
+
+def _chain_ids(chain: List[Dict[str, Any]]) -> List[str]:
+    return [str(step.get("id", f"step_{i}")) for i, step in enumerate(chain)]
+
+
+def _find_refs(value: Any, ids: List[str]) -> List[str]:
+    """Step ids referenced by "$id" or "${id}" anywhere in a params value.
+    
+    A bare "$..." string that names no step (e.g. "$5 off") stays literal.
+    """
+    if isinstance(value, str):
+        if value[1:] in ids and value.startswith("$"):
+            return [value[1:]]
+        return _REF.findall(value)
+    if isinstance(value, dict):
+        return [ref for v in value.values() for ref in _find_refs(v, ids)]
+    if isinstance(value, (list, tuple)):
+        return [ref for v in value for ref in _find_refs(v, ids)]
+    return []
+
+
+def _resolve_refs(value: Any, results: Dict[str, StepResult]) -> Any:
+    """Substitute earlier step outputs into a params value"""
+    if isinstance(value, str):
+        if value.startswith("$") and value[1:] in results:
+            return results[value[1:]].output
+        return _REF.sub(lambda m: _output_text(results[m.group(1)].output), value)
+    if isinstance(value, dict):
+        return {k: _resolve_refs(v, results) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_resolve_refs(v, results) for v in value]
+    return value
+
+
+def _output_text(output: Any) -> str:
+    if isinstance(output, GenerationResult):
+        return output.path or ""
+    return str(output)
+
+
+def _short_id(text: str) -> str:
+    """A short, filename-safe id for text: its stem if already one, else a digest of it"""
+    stem = Path(text).stem
+    if re.fullmatch(r"[\w-]{1,40}", stem):
+        return stem
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def _plan_chain(chain: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any], List[str]]]:
+    """Validate a chain and order it so every step follows its dependencies"""
+    ids = _chain_ids(chain)
+    if len(set(ids)) != len(ids):
+        raise ValueError("Chain step ids must be unique")
+    
+    deps: Dict[str, List[str]] = {}
+    for step_id, step in zip(ids, chain):
+        wanted = list(step.get("depends_on", [])) + _find_refs(step.get("params", {}), ids)
+        unknown = [d for d in wanted if d not in ids]
+        if unknown:
+            raise ValueError(f"Chain step {step_id} depends on unknown step(s): {', '.join(unknown)}")
+        deps[step_id] = list(dict.fromkeys(wanted))
+    
+    ordered: List[Tuple[str, Dict[str, Any], List[str]]] = []
+    placed = set()
+    pending = list(zip(ids, chain))
+    while pending:
+        ready = [(i, s) for i, s in pending if all(d in placed for d in deps[i])]
+        if not ready:
+            raise ValueError(f"Chain has a dependency cycle among: {', '.join(i for i, _ in pending)}")
+        for step_id, step in ready:
+            ordered.append((step_id, step, deps[step_id]))
+            placed.add(step_id)
+        pending = [(i, s) for i, s in pending if i not in placed]
+    return ordered
 
 
 class ImageGeneratorAgent:
     """AI Agent for intelligent image generation with memory and tool chaining"""
     
-    def __init__(self, config: Config, name: str = "ImageAgent"):
+    def __init__(
+        self,
+        config: Config,
+        name: str = "ImageAgent",
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        memory_window: Optional[int] = 1000
+    ):
         self.config = config
         self.name = name
-        self.generator = ImageGenerator(config)
-        self.memory = AgentMemory(
-            conversation_history=[],
-            generated_images=[],
-            context={}
-        )
+        self.generator = ImageGenerator(config, rate_limiter=rate_limiter, metrics=metrics)
+        self.enhancer = PromptEnhancer(self.generator)
+        self.memory = AgentMemory(max_entries=memory_window)
+        self._memory_log: Optional[MemoryLog] = None
         self.tools: Dict[str, Callable] = {}
         self._register_default_tools()
     
+    async def __aenter__(self):
+        """Keep the generator's HTTP session open across tool calls and chat turns"""
+        await self.generator.__aenter__()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.generator.__aexit__(exc_type, exc_val, exc_tb)
+    
     def _register_default_tools(self):
         """Register default agent tools"""
         self.register_tool("enhance_prompt", self._enhance_prompt)
@@ -38,6 +169,12 @@ class ImageGeneratorAgent:
     
     async def _enhance_prompt(self, base_prompt: str) -> str:
         """Enhance a basic prompt with artistic details"""
+        if self.config.enhancer.enabled:
+            async with self.generator:
+                return await self.enhancer.enhance(
+                    base_prompt, self.memory.context.get("preferred_style")
+                )
+        
         enhancements = [
             "high quality, professional",
             "detailed, photorealistic",
@@ -57,32 +194,29 @@ class ImageGeneratorAgent:
         base_prompt: str,
         count: int = 3
     ) -> List[GenerationResult]:
-        """Generate multiple variations of a prompt"""
-        variations = [
-            f"{base_prompt}, morning light",
-            f"{base_prompt}, sunset atmosphere",
-            f"{base_prompt}, dramatic lighting",
-            f"{base_prompt}, minimalist style",
-            f"{base_prompt}, vibrant colors"
-        ][:count]
-        
-        results = []
-        async with self.generator:
-            for i, variant_prompt in enumerate(variations):
-                filename = f"variation_{i+1}.{self.config.output.format}"
-                result = await self.generator.generate_single(
-                    variant_prompt,
-                    filename
+        """Generate multiple variations of a prompt concurrently, returned in order"""
+        batch_config = BatchConfig(
+            images=[
+                ImagePrompt(
+                    id=f"variation_{i+1}",
+                    prompt=f"{base_prompt}, {suffix}",
+                    filename=f"variation_{i+1}.{self.config.output.format}"
                 )
-                results.append(result)
-                await asyncio.sleep(self.config.rate_limit.delay_ms / 1000)
+                for i, suffix in enumerate(_variation_suffixes(count))
+            ],
+            parallel=True,
+            max_workers=3,
+            adaptive_concurrency=True
+        )
         
-        return results
+        async with self.generator:
+            return await self.generator.generate_batch(batch_config)
     
     async def _style_transfer(
         self,
         prompt: str,
-        style: str
+        style: str,
+        hedge: bool = False
     ) -> GenerationResult:
         """Apply a specific artistic style to the prompt"""
         style_mappings = {
@@ -98,7 +232,8 @@ class ImageGeneratorAgent:
         async with self.generator:
             return await self.generator.generate_single(
                 styled_prompt,
-                f"{style}_{Path(prompt).stem}.{self.config.output.format}"
+                f"{style}_{_short_id(prompt)}.{self.config.output.format}",
+                hedge=hedge
             )
     
     async def _batch_theme_generation(
@@ -143,7 +278,8 @@ class ImageGeneratorAgent:
                 for i, prompt in enumerate(prompts)
             ],
             parallel=True,
-            max_workers=3
+            max_workers=3,
+            adaptive_concurrency=True
         )
         
         async with self.generator:
@@ -159,6 +295,9 @@ class ImageGeneratorAgent:
             "suggestions": []
         }
         
+        # Someone is waiting on the reply: race a fallback model if the first is slow
+        hedge = self.config.routing.hedge_chat
+        
         # Parse user intent
         user_input_lower = user_input.lower()
         
@@ -171,7 +310,8 @@ class ImageGeneratorAgent:
             async with self.generator:
                 result = await self.generator.generate_single(
                     enhanced,
-                    f"enhanced_{len(self.memory.generated_images)}.{self.config.output.format}"
+                    f"enhanced_{self.memory.total_images}.{self.config.output.format}",
+                    hedge=hedge
                 )
             response["results"].append(result)
             self.memory.add_interaction(user_input, result)
@@ -191,7 +331,7 @@ class ImageGeneratorAgent:
                 style = parts[0].strip()
                 prompt = parts[1].strip()
                 response["actions"].append(f"Applying {style} style to: {prompt}")
-                result = await self._style_transfer(prompt, style)
+                result = await self._style_transfer(prompt, style, hedge)
                 response["results"].append(result)
                 self.memory.add_interaction(user_input, result)
         
@@ -215,7 +355,8 @@ class ImageGeneratorAgent:
             async with self.generator:
                 result = await self.generator.generate_single(
                     user_input,
-                    f"image_{len(self.memory.generated_images)}.{self.config.output.format}"
+                    f"image_{self.memory.total_images}.{self.config.output.format}",
+                    hedge=hedge
                 )
             response["results"].append(result)
             self.memory.add_interaction(user_input, result)
@@ -232,49 +373,121 @@ class ImageGeneratorAgent:
         return response
     
     async def execute_chain(self, chain: List[Dict[str, Any]]) -> List[GenerationResult]:
-        """Execute a chain of image generation tasks"""
-        results = []
+        """Execute a chain of tool calls and return their outputs in step order.
         
-        for step in chain:
+        List outputs are flattened, so an enhance_prompt step contributes its
+        string and generation steps their GenerationResults. Steps run as in
+        execute_dag, whose ChainResult also has each step's error and timing.
+        """
+        outputs = []
+        for step in (await self.execute_dag(chain)).steps.values():
+            if isinstance(step.output, list):
+                outputs.extend(step.output)
+            elif step.output is not None:
+                outputs.append(step.output)
+        return outputs
+    
+    async def execute_dag(self, chain: List[Dict[str, Any]]) -> ChainResult:
+        """Execute chain steps as a dependency graph.
+        
+        Each step is {"tool", "params", "id", "depends_on"}; id defaults to
+        "step_<n>". A param value "$<id>" is replaced by that step's output
+        and "${<id>}" inside a string by its text, both implying a dependency.
+        Steps start as soon as their dependencies finish, so independent
+        branches run concurrently; only API calls are rate limited. A failed
+        step marks everything downstream of it as failed without running it.
+        """
+        steps = _plan_chain(chain)
+        results: Dict[str, StepResult] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        chain_start = time.perf_counter()
+        
+        async def run(step_id: str, step: Dict[str, Any], deps: List[str]) -> StepResult:
             tool_name = step.get("tool")
-            params = step.get("params", {})
-            
-            if tool_name in self.tools:
-                tool_result = await self.tools[tool_name](**params)
-                if isinstance(tool_result, list):
-                    results.extend(tool_result)
+            if deps:
+                await asyncio.gather(*(tasks[d] for d in deps))
+            started = time.perf_counter()
+            result = StepResult(
+                id=step_id,
+                tool=tool_name,
+                started_ms=round((started - chain_start) * 1000, 2)
+            )
+            failed = [d for d in deps if results[d].error is not None]
+            if failed:
+                result.error = f"Skipped: dependency {', '.join(failed)} failed"
+            elif tool_name not in self.tools:
+                result.error = f"Unknown tool: {tool_name}"
+            else:
+                try:
+                    params = _resolve_refs(step.get("params", {}), results)
+                    result.output = await self.tools[tool_name](**params)
+                except Exception as e:
+                    result.error = str(e) or type(e).__name__
                 else:
-                    results.append(tool_result)
-            
-            # Add delay between steps
-            await asyncio.sleep(self.config.rate_limit.delay_ms / 1000)
+                    outputs = result.output if isinstance(result.output, list) else [result.output]
+                    if any(isinstance(o, GenerationResult) and not o.success for o in outputs):
+                        result.error = "Image generation failed"
+            result.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            results[step_id] = result
+            if self.config.logging_enabled:
+                status = "ok" if result.error is None else result.error
+                print(f"Chain step {step_id} ({tool_name}): {status} in {result.duration_ms:.0f}ms")
+            return result
+        
+        async with self.generator:
+            # _plan_chain returns steps in dependency order, so every task's deps exist already
+            for step_id, step, deps in steps:
+                tasks[step_id] = asyncio.ensure_future(run(step_id, step, deps))
+            try:
+                await asyncio.gather(*tasks.values())
+            finally:
+                for task in tasks.values():
+                    task.cancel()
         
-        return results
+        return ChainResult(
+            steps={step_id: results[step_id] for step_id in _chain_ids(chain)},
+            duration_ms=round((time.perf_counter() - chain_start) * 1000, 2)
+        )
     
     def save_memory(self, filepath: str):
-        """Save agent memory to file"""
-        memory_data = {
-            "conversation_history": self.memory.conversation_history,
-            "generated_images": [
-                {
-                    "id": img.id,
-                    "filename": img.filename,
-                    "path": img.path,
-                    "success": img.success
-                }
-                for img in self.memory.generated_images
-            ],
-            "context": self.memory.context
-        }
-        
-        with open(filepath, "w") as f:
-            json.dump(memory_data, f, indent=2)
+        """Save agent memory to an append-only log; only new entries are written"""
+        if self._memory_log is None or self._memory_log.path != Path(filepath):
+            self._memory_log = MemoryLog(filepath)
+        self._memory_log.save(self.memory)
     
     def load_memory(self, filepath: str):
-        """Load agent memory from file"""
+        """Load agent memory from a log written by save_memory, or an older JSON dump.
+        
+        Log records are only parsed when memory is first used, and the log
+        keeps being appended to by later save_memory calls.
+        """
+        log = MemoryLog(filepath)
+        if log.load(self.memory):
+            self._memory_log = log
+            return
+        
         with open(filepath, "r") as f:
             memory_data = json.load(f)
         
-        self.memory.conversation_history = memory_data.get("conversation_history", [])
-        self.memory.context = memory_data.get("context", {})
-        # Note: generated_images would need reconstruction from paths
\ No newline at end of file
+        images = [
+            GenerationResult(
+                success=img.get("success", True),
+                id=img.get("id", ""),
+                filename=img.get("filename", ""),
+                path=img.get("path")
+            )
+            for img in memory_data.get("generated_images", [])
+        ]
+        by_id = {img.id: img for img in images}
+        history = [
+            Interaction(
+                entry.get("prompt", ""),
+                entry.get("result_id", ""),
+                entry.get("success", False),
+                result=by_id.get(entry.get("result_id")) if entry.get("success") else None
+            )
+            for entry in memory_data.get("conversation_history", [])
+        ]
+        self.memory.replace(history, images, memory_data.get("context", {}))
+        # The next save rewrites the file in the log format
+        self._memory_log = None
@@ -0,0 +1,176 @@
+"""Content-addressed on-disk cache for generated images"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class ImageCache:
+    """Size-bounded LRU cache of encoded images, keyed on generation parameters"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: str,
+        width: int,
+        height: int,
+        format: str,
+        quality: int,
+        fit: str = "stretch",
+        resample: str = "lanczos",
+        reducing_gap: Optional[float] = None
+    ) -> str:
+        """Build a cache key from everything that determines the output bytes"""
+        parts = [model, prompt, width, height, format.lower(), quality]
+        # Appended only when non-default so keys from before these options stay valid
+        if (fit, resample) != ("stretch", "lanczos"):
+            parts += [fit, resample]
+        if reducing_gap is not None:
+            parts += [{"reducing_gap": reducing_gap}]
+        material = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Rebuild the LRU order from the files on disk, oldest access first"""
+        if self._entries is not None:
+            return self._entries
+
+        found = []
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*"):
+                if path.is_file() and not path.name.endswith(".tmp"):
+                    stat = path.stat()
+                    found.append((stat.st_mtime, path.name, stat.st_size))
+
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._total_bytes = sum(self._entries.values())
+        return self._entries
+
+    def _present(self, key: str) -> bool:
+        """Whether key is cached, forgetting it if its file has gone; call with the lock held"""
+        entries = self._load_index()
+        if key not in entries:
+            return False
+        if not self._path_for(key).exists():
+            self._total_bytes -= entries.pop(key)
+            return False
+        return True
+
+    def get(self, key: str, output_path: str) -> bool:
+        """Copy a cached image to output_path; returns False on a miss"""
+        return self.get_first([[(key, output_path)]]) is not None
+
+    def get_first(self, candidates: Sequence[Sequence[Tuple[str, str]]]) -> Optional[int]:
+        """Restore the first candidate whose keys are all cached; returns its index or None.
+
+        Each candidate is a list of (key, output_path) pairs. Nothing is
+        copied unless every key of the chosen candidate is present, and the
+        lookup counts as a single hit or miss however many were checked.
+        """
+        with self._lock:
+            chosen = next(
+                (i for i, pairs in enumerate(candidates) if all(self._present(key) for key, _ in pairs)),
+                None
+            )
+            if chosen is None:
+                self.misses += 1
+                return None
+            for key, _ in candidates[chosen]:
+                self._entries.move_to_end(key)
+
+        written: List[str] = []
+        try:
+            for key, output_path in candidates[chosen]:
+                self._copy_out(key, output_path)
+                written.append(output_path)
+        except FileNotFoundError:
+            # Evicted by another process since the check; don't leave a partial set behind
+            for path in written:
+                os.remove(path)
+            with self._lock:
+                for key, _ in candidates[chosen]:
+                    self._present(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return chosen
+
+    def _copy_out(self, key: str, output_path: str):
+        cached = self._path_for(key)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        shutil.copyfile(cached, tmp_path)
+        os.replace(tmp_path, output_path)
+        # mtime doubles as the access time so LRU order survives restarts
+        os.utime(cached, None)
+
+    def put(self, key: str, source_path: str):
+        """Store the file at source_path under key, evicting old entries if needed"""
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return
+
+        cached = self._path_for(key)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, cached)
+
+        with self._lock:
+            entries = self._load_index()
+            if key in entries:
+                self._total_bytes -= entries.pop(key)
+            entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        entries = self._entries
+        while entries and self._total_bytes > self.max_bytes:
+            key, size = entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path_for(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            if self.cache_dir.exists():
+                shutil.rmtree(self.cache_dir)
+            self._entries = OrderedDict()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current cache size"""
+        with self._lock:
+            entries = self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,263 @@
+"""gemini-image: generate images from a streamed JSONL/YAML manifest
+
+Each manifest record is one ImagePrompt:
+
+    {"id": "hero", "prompt": "...", "filename": "hero.webp", "width": 1920, "height": 1080}
+
+Only "prompt" is required; "id" defaults to the record number and
+"filename" to "<id>.<format>". Records may also set dir, format, quality,
+metadata and renditions (a list of {"width", "height", "format", ...}).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from collections import Counter
+from dataclasses import fields
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, TextIO
+
+from .config import APIConfig, Config
+from .types import BatchConfig, GenerationResult, ImagePrompt, Rendition
+
+_PROMPT_FIELDS = {f.name for f in fields(ImagePrompt)}
+_RENDITION_FIELDS = {f.name for f in fields(Rendition)}
+
+
+def _open_manifest(path: str) -> ContextManager[TextIO]:
+    # Leaving the with block must not close stdin
+    return contextlib.nullcontext(sys.stdin) if path == "-" else open(path, "r")
+
+
+def _iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield raw manifest records one at a time without loading the whole file"""
+    is_yaml = path.endswith((".yaml", ".yml"))
+    with _open_manifest(path) as f:
+        if is_yaml:
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("YAML manifests require PyYAML (pip install pyyaml)")
+            # Each YAML document is a record, or a list of records
+            for document in yaml.safe_load_all(f):
+                if isinstance(document, list):
+                    yield from document
+                elif document is not None:
+                    yield document
+        else:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise SystemExit(f"{path}:{line_number}: invalid JSON: {e}")
+
+
+def _to_prompt(
+    record: Dict[str, Any],
+    index: int,
+    formats: List[str],
+    config: Config
+) -> ImagePrompt:
+    if not isinstance(record, dict) or "prompt" not in record:
+        raise SystemExit(f"Manifest record {index + 1} needs at least a 'prompt'")
+
+    unknown = set(record) - _PROMPT_FIELDS
+    if unknown:
+        raise SystemExit(f"Manifest record {index + 1} has unknown fields: {', '.join(sorted(unknown))}")
+
+    data = dict(record)
+    data["id"] = str(data.get("id", index + 1))
+    image_format = data.get("format") or formats[0]
+    data.setdefault("filename", f"{data['id']}.{image_format}")
+    data["renditions"] = [
+        Rendition(**{k: v for k, v in r.items() if k in _RENDITION_FIELDS})
+        for r in data.get("renditions") or []
+    ]
+    # Extra formats at the main size: same stem, different extension
+    for extra in formats[1:]:
+        data["renditions"].append(Rendition(
+            width=data.get("width") or config.output.width,
+            height=data.get("height") or config.output.height,
+            format=extra,
+            suffix=""
+        ))
+    data["renditions"] = data["renditions"] or None
+    return ImagePrompt(**data)
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="gemini-image",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("manifest", help="JSONL or YAML manifest of prompts ('-' for JSONL on stdin)")
+    parser.add_argument("-o", "--output-dir", help="directory for generated images")
+    parser.add_argument("-c", "--concurrency", type=int, default=3, help="API calls in flight (default 3)")
+    parser.add_argument("--adaptive", action="store_true", help="grow/shrink concurrency from 429s and latency")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="upper bound with --adaptive")
+    parser.add_argument("--memory-budget", type=float,
+                        help="MiB that in-flight images may hold; new work waits above it")
+    parser.add_argument("-r", "--rate-limit", type=float, help="requests per minute")
+    parser.add_argument("--burst", type=int, help="requests allowed back to back")
+    parser.add_argument("--formats", help="comma-separated output formats; the first is the main file")
+    parser.add_argument("--width", type=int, help="default output width")
+    parser.add_argument("--height", type=int, help="default output height")
+    parser.add_argument("--quality", type=int, help="default encoder quality (1-100)")
+    parser.add_argument("--fit", choices=("stretch", "fit", "cover", "crop"),
+                        help="how to handle a different aspect ratio (default stretch)")
+    parser.add_argument("--resample", help="resampling filter, e.g. lanczos, bicubic, box")
+    parser.add_argument("--model", help="model to generate with")
+    parser.add_argument("--fallback-models", help="comma-separated models to fall back to, in order")
+    parser.add_argument("--latency-slo", type=float,
+                        help="seconds; models slower than this are passed over for the fallbacks")
+    parser.add_argument("--journal", help="checkpoint journal path; rerunning with it resumes the batch")
+    parser.add_argument("--no-resume", action="store_true", help="regenerate images the journal marks completed")
+    parser.add_argument("--no-cache", action="store_true", help="disable the on-disk result cache")
+    parser.add_argument("--dedupe-index", help="perceptual-hash index to check new images against and add them to")
+    parser.add_argument("--dedupe", choices=("flag", "skip"), default="flag",
+                        help="with --dedupe-index: flag near-duplicates, or delete them and reuse the existing image")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="save every API response to a cassette directory")
+    cassette.add_argument("--replay", metavar="CASSETTE",
+                          help="answer API calls from a cassette directory instead of the network")
+    parser.add_argument("--replay-latency", type=float,
+                        help="with --replay: seconds per response instead of the recorded timing")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="with --replay: multiply response timing, 0 for none (default 1)")
+    parser.add_argument("--env-file", default=".env", help="file to load GEMINI_API_KEY / GEMINI_API_KEYS from")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every SDK attempt")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    return parser.parse_args(argv)
+
+
+def _build_config(args: argparse.Namespace) -> Config:
+    try:
+        config = Config.from_env(args.env_file)
+    except ValueError as e:
+        if not args.replay:
+            raise SystemExit(str(e))
+        # Replayed requests never reach the API, so no key is needed
+        config = Config(api=APIConfig(key="replay"))
+
+    if args.record:
+        config.transport.mode = "record"
+        config.transport.cassette = args.record
+    elif args.replay:
+        config.transport.mode = "replay"
+        config.transport.cassette = args.replay
+        config.transport.latency = args.replay_latency
+        config.transport.latency_scale = args.latency_scale
+
+    config.logging_enabled = args.verbose
+    config.cache_enabled = config.cache_enabled and not args.no_cache
+    if args.output_dir:
+        config.output.base_dir = args.output_dir
+    if args.formats:
+        config.output.format = args.formats.split(",")[0].strip()
+    if args.width:
+        config.output.width = args.width
+    if args.height:
+        config.output.height = args.height
+    if args.quality:
+        config.output.quality = args.quality
+    if args.fit:
+        config.output.fit = args.fit
+    if args.resample:
+        config.output.resample = args.resample
+    if args.model:
+        config.api.model = args.model
+    if args.fallback_models:
+        config.routing.fallback_models = [m.strip() for m in args.fallback_models.split(",") if m.strip()]
+    if args.latency_slo:
+        config.routing.latency_slo = args.latency_slo
+    if args.rate_limit:
+        config.rate_limit.requests_per_minute = args.rate_limit
+    if args.burst:
+        config.rate_limit.burst = args.burst
+    if args.dedupe_index:
+        config.dedup.index_path = args.dedupe_index
+        config.dedup.policy = args.dedupe
+    try:
+        config.validate()
+    except ValueError as e:
+        raise SystemExit(str(e))
+    return config
+
+
+def _print_summary(results: List[GenerationResult], elapsed: float):
+    succeeded = [r for r in results if r.success]
+    cached = sum(1 for r in succeeded if (r.metadata or {}).get("cache") == "hit")
+    resumed = sum(1 for r in succeeded if (r.metadata or {}).get("resumed"))
+    duplicates = sum(1 for r in succeeded if (r.metadata or {}).get("duplicate_of"))
+    models = Counter((r.metadata or {}).get("model") for r in succeeded if (r.metadata or {}).get("model"))
+    durations = sorted(r.duration_ms or 0 for r in results)
+    output_bytes = sum((r.metadata or {}).get("bytes", {}).get("output", 0) for r in succeeded)
+
+    print("=" * 60)
+    print(f"📊 {len(succeeded)}/{len(results)} succeeded, {len(results) - len(succeeded)} failed "
+          f"({cached} from cache, {resumed} resumed, {duplicates} near-duplicates)")
+    print(f"⏱️  {elapsed:.1f}s wall clock, {len(results) / elapsed if elapsed else 0:.2f} images/s")
+    if durations:
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        print(f"   per image: mean {sum(durations) / len(durations):.0f}ms, p95 {p95}ms")
+    print(f"💾 {output_bytes / 1024 / 1024:.1f} MiB written")
+    if len(models) > 1:
+        print("🤖 " + ", ".join(f"{count} from {model}" for model, count in models.most_common()))
+
+
+async def run(args: argparse.Namespace) -> int:
+    # Imported here so --help and argument errors don't wait on aiohttp
+    from .core import ImageGenerator
+
+    config = _build_config(args)
+    formats = [f.strip() for f in (args.formats or config.output.format).split(",") if f.strip()]
+    images = (
+        _to_prompt(record, index, formats, config)
+        for index, record in enumerate(_iter_records(args.manifest))
+    )
+    batch = BatchConfig(
+        images=images,
+        output_dir=config.output.base_dir,
+        parallel=True,
+        max_workers=args.concurrency,
+        adaptive_concurrency=args.adaptive,
+        adaptive_max_workers=args.max_concurrency,
+        journal_path=args.journal,
+        resume=not args.no_resume,
+        memory_budget_bytes=int(args.memory_budget * 1024 * 1024) if args.memory_budget else None
+    )
+
+    results: List[GenerationResult] = []
+    start = time.time()
+    async with ImageGenerator(config) as generator:
+        async for result in generator.generate_batch_iter(batch):
+            results.append(result)
+            if not args.quiet:
+                status = "✅" if result.success else f"❌ {result.error}"
+                print(f"[{len(results)}] {result.filename} {status}")
+    _print_summary(results, time.time() - start)
+    if generator.memory_budget:
+        budget = generator.memory_budget.stats()
+        print(f"🧠 peak {budget['peak'] / 1024 / 1024:.1f} of {budget['max_bytes'] / 1024 / 1024:.0f} MiB "
+              f"memory budget, {budget['waits']} admissions waited")
+    if len(generator.key_pool.keys) > 1:
+        for key in generator.key_pool.stats():
+            state = "ok" if key["healthy"] else f"sidelined {key['sidelined_for']:.0f}s"
+            print(f"🔑 {key['key']}: {key['requests']} requests, {key['failures']} rejected/throttled, {state}")
+    return 0 if all(r.success for r in results) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Console entry point"""
+    args = _parse_args(argv)
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with the same --journal to resume")
+        return 130
@@ -0,0 +1,226 @@
+"""Adaptive (AIMD) concurrency control and memory admission for batch generation"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .errors import APIError
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit that grows additively and shrinks multiplicatively.
+
+    Used in place of a fixed ``asyncio.Semaphore``. Every API attempt
+    reports its latency and outcome through ``record``. While the error rate
+    and p95 latency over the recent window stay healthy, the limit grows by
+    roughly one slot per ``limit`` successes. A 429, a 5xx, a timeout or a
+    p95 that drifts past ``latency_tolerance`` times the baseline p95 cuts
+    the limit by ``decrease_factor``, at most once per ``cooldown_s``.
+
+    The baseline drops to any faster p95 at once and otherwise moves
+    ``baseline_decay`` of the way toward each new one, so a lasting change
+    in service latency becomes the new normal instead of pinning the limit
+    at ``min_limit``.
+    """
+
+    def __init__(
+        self,
+        initial: int = 3,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        window: int = 20,
+        decrease_factor: float = 0.5,
+        max_error_rate: float = 0.1,
+        latency_tolerance: float = 2.0,
+        cooldown_s: float = 2.0,
+        baseline_decay: float = 0.05
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Concurrency limits must satisfy 1 <= min_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.max_error_rate = max_error_rate
+        self.latency_tolerance = latency_tolerance
+        self.cooldown_s = cooldown_s
+        self.baseline_decay = baseline_decay
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._latencies: deque = deque(maxlen=window)
+        self._errors: deque = deque(maxlen=window)
+        self._baseline_p95: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def __aenter__(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify_all()
+        return False
+
+    @staticmethod
+    def _is_congestion(error: BaseException) -> bool:
+        if isinstance(error, APIError):
+            return error.is_throttling
+        return isinstance(error, (asyncio.TimeoutError, TimeoutError))
+
+    def _p95(self) -> Optional[float]:
+        if len(self._latencies) < self._latencies.maxlen // 2:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record(self, latency_s: float, error: Optional[BaseException] = None):
+        """Feed back the latency and outcome of one API attempt"""
+        congested = error is not None and self._is_congestion(error)
+        self._errors.append(congested)
+        if error is None:
+            self._latencies.append(latency_s)
+
+        if congested:
+            self._decrease()
+            return
+
+        p95 = self._p95()
+        if p95 is not None:
+            baseline = self._baseline_p95
+            if baseline is None or p95 < baseline:
+                self._baseline_p95 = p95
+            else:
+                self._baseline_p95 = baseline + self.baseline_decay * (p95 - baseline)
+            if baseline is not None and p95 > baseline * self.latency_tolerance:
+                self._decrease()
+                return
+
+        error_rate = sum(self._errors) / len(self._errors)
+        if error is None and error_rate <= self.max_error_rate:
+            # Waiters re-check the grown limit when this attempt's slot is released
+            previous = self.limit
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            if self.limit > previous:
+                self.increases += 1
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_s:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        self._latencies.clear()
+        self.decreases += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current limit and controller counters, for metrics"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "p95_ms": None if self._p95() is None else int(self._p95() * 1000),
+            "baseline_p95_ms": None if self._baseline_p95 is None else int(self._baseline_p95 * 1000),
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
+
+
+class MemoryBudget:
+    """Admission control by the bytes each in-flight image is expected to hold.
+
+    acquire() waits, first come first served, until a reservation fits
+    under max_bytes. A reservation bigger than the whole budget is admitted
+    once nothing else is held, so an oversized image still runs, alone.
+    resize() corrects a held reservation once real sizes are known without
+    waiting; an overshoot only holds back later acquires. peak is the
+    largest total ever reserved.
+    """
+
+    def __init__(self, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError("Memory budget must be positive")
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def _fits(self, nbytes: int) -> bool:
+        return self.in_use == 0 or self.in_use + nbytes <= self.max_bytes
+
+    def _add(self, nbytes: int):
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+
+    def _wake(self):
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if not future.done():
+                if not self._fits(nbytes):
+                    return
+                self._add(nbytes)
+                future.set_result(None)
+            self._waiters.popleft()
+
+    async def acquire(self, nbytes: int) -> int:
+        """Reserve nbytes, waiting while they would exceed the budget; returns nbytes"""
+        if not self._waiters and self._fits(nbytes):
+            self._add(nbytes)
+            return nbytes
+
+        self.waits += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((nbytes, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled
+                self.release(nbytes)
+            else:
+                # Drop our place in the queue, which may unblock those behind it
+                self._wake()
+            raise
+        return nbytes
+
+    def resize(self, held: int, nbytes: int) -> int:
+        """Change a held reservation to nbytes immediately; returns nbytes"""
+        self._add(nbytes - held)
+        if nbytes < held:
+            self._wake()
+        return nbytes
+
+    def release(self, nbytes: int):
+        self.in_use -= nbytes
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current and peak reserved bytes, for metrics and reports"""
+        return {
+            "max_bytes": self.max_bytes,
+            "in_use": self.in_use,
+            "peak": self.peak,
+            "waiting": sum(1 for _, future in self._waiters if not future.done()),
+            "waits": self.waits
+        }
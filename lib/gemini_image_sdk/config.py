@@ -1,20 +1,29 @@
 """Configuration management for Gemini Image SDK"""
 
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dataclasses import dataclass, field
 
 
 @dataclass
 class APIConfig:
     """API configuration"""
-    key: str
+    key: str = ""
+    # More keys to spread requests over; each gets its own rate_limit quota
+    keys: List[str] = field(default_factory=list)
+    key_cooldown: float = 30.0  # seconds a pooled key sits out after a 429, doubling on repeats
+    max_key_cooldown: float = 600.0
+    auth_cooldown: float = 600.0  # seconds a pooled key sits out after a 401/403
     base_url: str = "https://openrouter.ai/api/v1"
     model: str = "google/gemini-2.5-flash-image-preview"
     headers: Dict[str, str] = field(default_factory=lambda: {
         "HTTP-Referer": "https://github.com/matthewtrundle/CLI-Gemini-image-generator-SDK",
         "X-Title": "Gemini Image Generator SDK"
     })
+    
+    def all_keys(self) -> List[str]:
+        """key followed by keys, without blanks or repeats"""
+        return list(dict.fromkeys(k for k in [self.key, *self.keys] if k))
 
 
 @dataclass
@@ -25,15 +34,94 @@ class OutputConfig:
     width: int = 1792
     height: int = 1024
     quality: int = 90
+    fit: str = "stretch"  # "stretch", "fit", "cover" or "crop"
+    resample: str = "lanczos"  # nearest, box, bilinear, hamming, bicubic or lanczos
 
 
 @dataclass
 class RateLimitConfig:
     """Rate limiting configuration"""
     max_retries: int = 3
-    retry_delay_ms: int = 5000
+    retry_delay_ms: int = 5000  # first retry delay, grown by backoff_multiplier
+    backoff_multiplier: float = 2.0
+    max_retry_delay_ms: int = 60000
+    jitter: bool = True
     delay_ms: int = 2000
     requests_per_minute: int = 30
+    burst: int = 1
+    shared_state_file: Optional[str] = None
+
+
+@dataclass
+class HTTPConfig:
+    """HTTP connection pool configuration"""
+    connection_limit: int = 100
+    connection_limit_per_host: int = 10
+    keepalive_timeout: float = 30.0
+    dns_cache_ttl: int = 300
+    warmup: bool = False
+    connect_timeout: Optional[float] = 10.0
+    read_timeout: Optional[float] = 60.0  # max gap between received chunks
+    request_timeout: Optional[float] = 180.0  # one attempt, start to last byte
+    image_deadline: Optional[float] = 600.0  # all attempts for one image, rate limit waits included
+    stream_chunk_size: int = 64 * 1024
+    spool_max_bytes: int = 8 * 1024 * 1024  # decoded images above this go to a temp file
+
+
+@dataclass
+class ProcessingConfig:
+    """Image post-processing (decode/resize/encode) configuration"""
+    executor: str = "thread"  # "thread", "process" or "inline"
+    max_workers: Optional[int] = None  # defaults to the CPU count
+    # Opt-in: shrink downscales of 2 * reducing_gap or more with Image.reduce (and JPEG draft
+    # decoding) first; faster for thumbnails, slightly different pixels. None resizes exactly
+    reducing_gap: Optional[float] = None
+
+
+@dataclass
+class TransportConfig:
+    """Record/replay of API traffic for offline, reproducible runs"""
+    mode: str = "live"  # "live", "record" (live, saving responses) or "replay" (no network)
+    cassette: str = "./.cache/gemini_cassette"
+    latency: Optional[float] = None  # replay: seconds per response; None replays the recorded timing
+    latency_scale: float = 1.0  # replay: multiplies the latency; 0 answers instantly
+
+
+@dataclass
+class DedupConfig:
+    """Perceptual-hash duplicate detection configuration"""
+    index_path: Optional[str] = None  # index every image written here; None disables detection
+    policy: str = "flag"  # "flag" marks duplicates in metadata, "skip" also deletes the new files
+    max_distance: int = 5  # Hamming distance between hashes counted as a duplicate
+    hash_size: int = 8  # hashes are hash_size**2 bits
+
+
+@dataclass
+class RoutingConfig:
+    """Fallback routing from api.model to other models"""
+    fallback_models: List[str] = field(default_factory=list)  # tried after api.model, in order
+    latency_slo: Optional[float] = None  # seconds; slower attempts count as misses
+    window: int = 20  # recent attempts per model the statistics cover
+    failure_threshold: int = 3  # consecutive errors or SLO misses that demote a model
+    max_error_rate: float = 0.5  # models above this over their window are passed over
+    cooldown: float = 60.0  # seconds a demoted model is skipped
+    hedge_chat: bool = True  # agent chat races the next model once latency_slo passes
+
+
+@dataclass
+class EnhancerConfig:
+    """Text-model prompt enhancement configuration"""
+    enabled: bool = False  # ImageGeneratorAgent uses static enhancements unless set
+    model: str = "google/gemini-flash-1.5"
+    system_prompt: str = "You are an expert at creating detailed, artistic image generation prompts."
+    temperature: float = 0.8
+    max_tokens: int = 500
+    requests_per_minute: int = 60
+    burst: int = 5
+    max_concurrency: int = 4
+    cache_enabled: bool = True
+    cache_path: str = "./.cache/gemini_prompts.jsonl"
+    fallback_on_error: bool = True  # use the description unchanged if enhancement fails
 
 
 @dataclass
@@ -42,9 +130,18 @@ class Config:
     api: APIConfig
     output: OutputConfig = field(default_factory=OutputConfig)
     rate_limit: RateLimitConfig = field(default_factory=RateLimitConfig)
+    processing: ProcessingConfig = field(default_factory=ProcessingConfig)
+    http: HTTPConfig = field(default_factory=HTTPConfig)
+    enhancer: EnhancerConfig = field(default_factory=EnhancerConfig)
+    dedup: DedupConfig = field(default_factory=DedupConfig)
+    routing: RoutingConfig = field(default_factory=RoutingConfig)
+    transport: TransportConfig = field(default_factory=TransportConfig)
     logging_enabled: bool = True
     cache_enabled: bool = True
+    # Share one API call between concurrent requests for the same prompt and outputs
+    coalesce_enabled: bool = True
     cache_dir: str = "./.cache/gemini_images"
+    cache_max_bytes: int = 512 * 1024 * 1024
     
     @classmethod
     def from_env(cls, env_file: Optional[str] = None) -> 'Config':
@@ -53,12 +150,14 @@ class Config:
             from dotenv import load_dotenv
             load_dotenv(env_file)
         
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
+        api_key = os.getenv("GEMINI_API_KEY", "")
+        # Comma-separated pool, e.g. one key per account
+        api_keys = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()]
+        if not api_key and not api_keys:
+            raise ValueError("GEMINI_API_KEY or GEMINI_API_KEYS environment variable is required")
         
         return cls(
-            api=APIConfig(key=api_key),
+            api=APIConfig(key=api_key, keys=api_keys),
             output=OutputConfig(
                 base_dir=os.getenv("OUTPUT_DIR", "./generated"),
                 quality=int(os.getenv("IMAGE_QUALITY", "90"))
@@ -68,8 +167,32 @@ class Config:
     
     def validate(self) -> bool:
         """Validate configuration"""
-        if not self.api.key:
+        if not self.api.all_keys():
             raise ValueError("API key is required")
+        if self.api.key_cooldown < 0 or self.api.auth_cooldown < 0:
+            raise ValueError("Key cooldowns must not be negative")
         if self.output.quality < 1 or self.output.quality > 100:
             raise ValueError("Image quality must be between 1 and 100")
+        if self.rate_limit.requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        if self.output.fit not in ("stretch", "fit", "cover", "crop"):
+            raise ValueError("Output fit must be 'stretch', 'fit', 'cover' or 'crop'")
+        if self.output.resample not in ("nearest", "box", "bilinear", "hamming", "bicubic", "lanczos"):
+            raise ValueError(f"Unknown resampling filter: {self.output.resample}")
+        if self.processing.executor not in ("thread", "process", "inline"):
+            raise ValueError("Processing executor must be 'thread', 'process' or 'inline'")
+        if self.enhancer.requests_per_minute <= 0 or self.enhancer.max_concurrency < 1:
+            raise ValueError("Enhancer rate and concurrency limits must be positive")
+        if self.routing.latency_slo is not None and self.routing.latency_slo <= 0:
+            raise ValueError("Routing latency SLO must be positive")
+        if self.routing.window < 1 or self.routing.failure_threshold < 1:
+            raise ValueError("Routing window and failure threshold must be at least 1")
+        if self.transport.mode not in ("live", "record", "replay"):
+            raise ValueError("Transport mode must be 'live', 'record' or 'replay'")
+        if self.transport.latency_scale < 0 or (self.transport.latency or 0) < 0:
+            raise ValueError("Replay latency must not be negative")
+        if self.dedup.policy not in ("flag", "skip"):
+            raise ValueError("Dedup policy must be 'flag' or 'skip'")
+        if self.cache_max_bytes < 0:
+            raise ValueError("Cache size limit must not be negative")
         return True
\ No newline at end of file
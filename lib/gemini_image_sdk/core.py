@@ -1,205 +1,1100 @@
 """Core image generation functionality"""
 
-import base64
+import os
 import json
 import time
 import asyncio
+import random
+import shutil
+import tempfile
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-import aiohttp
-from PIL import Image
-from io import BytesIO
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    Union
+)
 
+from .cache import ImageCache
+from .concurrency import AdaptiveConcurrencyLimiter, MemoryBudget
 from .config import Config
-from .types import GenerationResult, ImagePrompt, BatchConfig
+from .errors import (
+    APIError,
+    AuthenticationError,
+    GeminiImageError,
+    NoImageDataError,
+    RateLimitError,
+    RequestTimeoutError,
+    api_error,
+    is_retryable,
+    parse_retry_after
+)
+from .imaging import OutputSpec, image_size, process_image, render_image_timed
+from .journal import BatchJournal
+from .keys import APIKey, KeyPool
+from .metrics import MetricsRegistry, PhaseTimings
+from .phash import PerceptualIndex, hash_file
+from .ratelimit import RateLimiter
+from .routing import ModelRouter
+from .streaming import DataURLExtractor
+from .transport import Transport, make_transport
+from .types import GenerationResult, ImagePrompt, BatchConfig, Rendition
+from .utils import aenumerate
+
+# aiohttp is imported when the first session is created, keeping the SDK cheap to import
+if TYPE_CHECKING:
+    import aiohttp
 
 
 class ImageGenerator:
     """Core image generation class"""
     
-    def __init__(self, config: Config):
+    def __init__(
+        self,
+        config: Config,
+        rate_limiter: Optional[RateLimiter] = None,
+        executor: Optional[Executor] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        transport: Optional[Transport] = None
+    ):
         self.config = config
         self.config.validate()
-        self._session: Optional[aiohttp.ClientSession] = None
-        self._request_times: List[float] = []
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._session_refs = 0
+        # Every API key with its own quota; a given rate_limiter is the quota of a single
+        # key, or an overall cap across several
+        self.key_pool = KeyPool.from_config(config.api, config.rate_limit, rate_limiter)
+        self.rate_limiter = rate_limiter or self.key_pool.keys[0].limiter
+        # api.model and its fallbacks, with rolling latency and error statistics
+        self.router = ModelRouter.from_config(config)
+        # Live HTTP, or recording to / replaying from a cassette per config.transport
+        self.transport = transport or make_transport(config.transport)
+        self.metrics = metrics or MetricsRegistry()
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._cpu_semaphore: Optional[asyncio.Semaphore] = None
+        self._cpu_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Controller of the most recent adaptive batch; its .limit is the live concurrency
+        self.concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+        # (pixels, decoded bytes) of the largest image seen; Gemini's 1024x1024 PNGs until then
+        self._largest_source: Tuple[int, int] = (1024 * 1024, 2 * 1024 * 1024)
+        # Budget of the most recent batch with memory_budget_bytes; see MemoryBudget.stats()
+        self.memory_budget: Optional[MemoryBudget] = None
+        # Leader futures of in-flight requests, keyed by _flight_key
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+        self.cache: Optional[ImageCache] = None
+        if config.cache_enabled:
+            self.cache = ImageCache(config.cache_dir, config.cache_max_bytes)
+        self.phash_index: Optional[PerceptualIndex] = None
+        if config.dedup.index_path:
+            self.phash_index = PerceptualIndex(config.dedup.index_path, config.dedup.hash_size)
     
     async def __aenter__(self):
-        """Async context manager entry"""
-        self._session = aiohttp.ClientSession()
+        """Async context manager entry.
+        
+        The session is reference counted: nested or repeated entries share
+        one pooled session, which is closed when the last user exits.
+        """
+        self._session_refs += 1
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            if self.config.http.warmup and self.transport.live:
+                await self._warm_up()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self._session:
-            await self._session.close()
+        self._session_refs = max(0, self._session_refs - 1)
+        if self._session_refs == 0 and self._session:
+            # Detach before awaiting, so a caller entering meanwhile opens a fresh session
+            session, self._session = self._session, None
+            await session.close()
+    
+    def _create_session(self) -> "aiohttp.ClientSession":
+        """Create a session with a tuned, keep-alive connection pool"""
+        import aiohttp
+        
+        http = self.config.http
+        connector = aiohttp.TCPConnector(
+            limit=http.connection_limit,
+            limit_per_host=http.connection_limit_per_host,
+            keepalive_timeout=http.keepalive_timeout,
+            ttl_dns_cache=http.dns_cache_ttl,
+            use_dns_cache=True
+        )
+        return aiohttp.ClientSession(connector=connector)
     
-    async def _check_rate_limit(self):
-        """Check and enforce rate limiting"""
-        now = time.time()
-        self._request_times = [t for t in self._request_times if now - t < 60]
+    async def _warm_up(self):
+        """Open a connection to the API host so the first request skips the handshake"""
+        import aiohttp
         
-        if len(self._request_times) >= self.config.rate_limit.requests_per_minute:
-            sleep_time = 60 - (now - self._request_times[0])
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)
+        try:
+            async with self._session.head(
+                self.config.api.base_url,
+                timeout=aiohttp.ClientTimeout(total=5)
+            ):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if self.config.logging_enabled:
+                print(f"Connection warm-up failed: {e}")
+    
+    async def close(self):
+        """Close the HTTP session and any post-processing pool the generator owns"""
+        self._session_refs = 0
+        if self._session:
+            session, self._session = self._session, None
+            await session.close()
+        if self._owns_executor and self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    def _request_timeout(self, deadline: Optional[float]) -> "aiohttp.ClientTimeout":
+        """Per-attempt timeout, shortened to whatever is left of the image deadline"""
+        import aiohttp
         
-        self._request_times.append(now)
+        http = self.config.http
+        total = http.request_timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RequestTimeoutError(
+                    f"Image deadline of {http.image_deadline}s exceeded"
+                )
+            total = remaining if total is None else min(total, remaining)
+        return aiohttp.ClientTimeout(
+            total=total,
+            connect=http.connect_timeout,
+            sock_read=http.read_timeout
+        )
+    
+    def _image_request(self, prompt: str, model: str) -> Tuple[str, Dict[str, Any]]:
+        """URL and JSON payload of an image request; together they identify it in a cassette"""
+        return f"{self.config.api.base_url}/chat/completions", {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}]
+        }
     
-    async def _call_api(self, prompt: str) -> Optional[str]:
-        """Call the Gemini API"""
-        await self._check_rate_limit()
+    async def _call_api(
+        self,
+        prompt: str,
+        deadline: Optional[float] = None,
+        timings: Optional[PhaseTimings] = None,
+        model: Optional[str] = None
+    ) -> BinaryIO:
+        """Call the Gemini API and return the decoded image as a binary file object.
         
-        if not self._session:
-            self._session = aiohttp.ClientSession()
+        The response body is streamed and its base64 image is decoded chunk
+        by chunk, spooling to a temp file once it outgrows memory. deadline
+        is a time.monotonic() value the request must finish by. Waiting for
+        a rate limit token counts against the deadline but not against the
+        per-attempt timeouts, which start once the token is granted.
+        Each call goes out on the pooled key with the most spare capacity.
+        model defaults to config.api.model; the outcome feeds the router.
+        """
+        timings = timings if timings is not None else PhaseTimings()
+        model = model or self.config.api.model
+        api_key, waited = await self.key_pool.acquire()
+        timings.add("rate_limit_wait", waited)
+        network_start = time.perf_counter()
+        parse_time = 0.0
+        error: Optional[BaseException] = None
         
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.config.api.key}",
+            "Authorization": f"Bearer {api_key.key}",
             **self.config.api.headers
         }
         
-        payload = {
-            "model": self.config.api.model,
-            "messages": [{"role": "user", "content": prompt}]
-        }
+        url, payload = self._image_request(prompt, model)
         
-        async with self._session.post(
-            f"{self.config.api.base_url}/chat/completions",
-            headers=headers,
-            json=payload
-        ) as response:
-            if response.status != 200:
-                error_text = await response.text()
-                raise Exception(f"API Error ({response.status}): {error_text}")
-            
-            data = await response.json()
-            message = data.get("choices", [{}])[0].get("message", {})
-            
-            if images := message.get("images"):
-                image_data = images[0].get("image_url", {}).get("url", "")
-                if image_data.startswith("data:image"):
-                    return image_data
-            
-            raise Exception("No image data in response")
+        try:
+            async with self, self.transport.post(
+                self._session,
+                url,
+                headers,
+                payload,
+                self._request_timeout(deadline)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise api_error(
+                        response.status,
+                        error_text,
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
+                
+                sink = tempfile.SpooledTemporaryFile(max_size=self.config.http.spool_max_bytes)
+                try:
+                    extractor = DataURLExtractor(sink)
+                    async for chunk in response.iter_chunked(self.config.http.stream_chunk_size):
+                        parse_start = time.perf_counter()
+                        extractor.feed(chunk)
+                        parse_time += time.perf_counter() - parse_start
+                    parse_start = time.perf_counter()
+                    extractor.close()
+                    parse_time += time.perf_counter() - parse_start
+                except BaseException:
+                    sink.close()
+                    raise
+                timings.add_bytes("response", extractor.response_bytes)
+                timings.add_bytes("decoded", extractor.decoded_bytes)
+                return sink
+        except RequestTimeoutError as e:
+            # Our own deadline check; already the right type and message
+            error = e
+            raise
+        except asyncio.TimeoutError as e:
+            error = RequestTimeoutError(f"Request timed out: {str(e) or 'time limit reached'}")
+            raise error from e
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - network_start
+            timings.add("network", elapsed - parse_time)
+            timings.add("parse_decode", parse_time)
+            self._release_key(api_key, error)
+            self.router.record(model, elapsed, error)
     
-    async def generate_with_retry(self, prompt: str) -> Optional[str]:
-        """Generate image with retry logic"""
+    def _release_key(self, api_key: APIKey, error: Optional[BaseException]):
+        """Hand a key back to the pool, counting its use and any sidelining"""
+        if self.key_pool.release(api_key, error):
+            self.metrics.counter(
+                "key_sidelined_total", "Times a pooled API key was benched after a 401/403/429"
+            ).inc(key=api_key.name)
+            if self.config.logging_enabled:
+                print(f"API key {api_key.name} sidelined after: {error}")
+        if len(self.key_pool.keys) > 1:
+            self.metrics.counter("key_requests_total", "API attempts per pooled key").inc(key=api_key.name)
+            self.metrics.gauge("keys_healthy", "Pooled API keys not sidelined").set(
+                self.key_pool.healthy_count()
+            )
+    
+    def _retry_delay(self, attempt: int, error: BaseException) -> float:
+        """Exponential backoff with jitter before the given attempt, honoring Retry-After"""
+        policy = self.config.rate_limit
+        delay = min(
+            policy.max_retry_delay_ms,
+            policy.retry_delay_ms * policy.backoff_multiplier ** (attempt - 2)
+        ) / 1000
+        if policy.jitter:
+            delay = random.uniform(delay / 2, delay)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+    
+    async def generate_with_retry(
+        self,
+        prompt: str,
+        on_attempt: Optional[Callable[[float, Optional[BaseException]], None]] = None,
+        timings: Optional[PhaseTimings] = None
+    ) -> BinaryIO:
+        """Generate image with retry logic.
+        
+        Retries only errors that can succeed on a repeat (not 400/401-style
+        client errors), backing off exponentially with jitter and waiting at
+        least as long as a 429's Retry-After. When a 401/403/429 sidelines
+        one of several pooled keys, the retry goes straight to another key.
+        All attempts together must finish within config.http.image_deadline,
+        counted from the first attempt: rate limit waits and backoff count
+        against it, queueing for a batch concurrency slot does not.
+        
+        on_attempt, if given, is called with the latency in seconds and the
+        error (or None) of every API attempt.
+        """
+        image_data, _ = await self._generate_routed(prompt, on_attempt, timings)
+        return image_data
+    
+    async def _generate_routed(
+        self,
+        prompt: str,
+        on_attempt: Optional[Callable[[float, Optional[BaseException]], None]] = None,
+        timings: Optional[PhaseTimings] = None,
+        hedge: bool = False
+    ) -> Tuple[BinaryIO, str]:
+        """generate_with_retry that also returns the model that produced the image.
+        
+        Each attempt goes to the router's preferred model; a retry avoids
+        the model(s) whose failure caused it.
+        """
         last_error = None
+        avoid: List[str] = []
+        image_deadline = self.config.http.image_deadline
+        deadline = time.monotonic() + image_deadline if image_deadline else None
         
         for attempt in range(1, self.config.rate_limit.max_retries + 1):
+            if attempt > 1:
+                # A throttled or rejected key can be swapped for a ready one right away
+                if self.key_pool.can_failover(last_error):
+                    delay = 0.0
+                else:
+                    delay = self._retry_delay(attempt, last_error)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    break
+                if self.config.logging_enabled:
+                    print(f"Retrying in {delay:.1f}s")
+                self.metrics.counter("retries_total", "API attempts after the first").inc()
+                await asyncio.sleep(delay)
+                if timings is not None:
+                    timings.add("retry_backoff", delay)
+            
+            attempt_start = time.monotonic()
+            tried: List[str] = []
             try:
-                if attempt > 1:
-                    await asyncio.sleep(self.config.rate_limit.retry_delay_ms / 1000)
-                
-                return await self._call_api(prompt)
+                image_data, model = await self._attempt(prompt, deadline, timings, hedge, avoid, tried)
+                self._count_request(None)
+                if on_attempt:
+                    on_attempt(time.monotonic() - attempt_start, None)
+                return image_data, model
             except Exception as e:
                 last_error = e
+                self._count_request(e)
+                if on_attempt:
+                    on_attempt(time.monotonic() - attempt_start, e)
                 if self.config.logging_enabled:
-                    print(f"Attempt {attempt} failed: {e}")
+                    print(f"Attempt {attempt} on {', '.join(tried)} failed: {e}")
+                if not is_retryable(e) and not self.key_pool.can_failover(e):
+                    break
+                if not isinstance(e, AuthenticationError):
+                    avoid = tried
         
-        raise last_error or Exception("Failed to generate image")
+        raise last_error or GeminiImageError("Failed to generate image")
     
-    def _save_image(self, base64_data: str, output_path: str) -> str:
-        """Save base64 image data to file"""
-        # Remove data URL prefix
-        if "," in base64_data:
-            base64_data = base64_data.split(",")[1]
+    async def _attempt(
+        self,
+        prompt: str,
+        deadline: Optional[float],
+        timings: Optional[PhaseTimings],
+        hedge: bool,
+        avoid: List[str],
+        tried: List[str]
+    ) -> Tuple[BinaryIO, str]:
+        """One API attempt on the router's pick, adding the models used to tried.
         
-        # Decode base64
-        image_data = base64.b64decode(base64_data)
-        image = Image.open(BytesIO(image_data))
+        With hedge and a latency SLO, a call still running when the SLO
+        passes is raced against the next model. The first success wins and
+        the other call is cancelled.
+        """
+        route = self.router.pick(avoid)
+        tried.append(route.model)
+        slo = self.router.latency_slo
+        if not hedge or slo is None or len(self.router.routes) < 2:
+            return await self._call_api(prompt, deadline, timings, route.model), route.model
         
-        # Resize if needed
-        if image.size != (self.config.output.width, self.config.output.height):
-            image = image.resize(
-                (self.config.output.width, self.config.output.height),
-                Image.Resampling.LANCZOS
-            )
+        racers = {asyncio.ensure_future(self._call_api(prompt, deadline, timings, route.model)): route.model}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(racers, timeout=slo)
+            if not done:
+                backup = self.router.pick([*avoid, route.model])
+                if backup.model != route.model:
+                    tried.append(backup.model)
+                    racers[asyncio.ensure_future(
+                        self._call_api(prompt, deadline, timings, backup.model)
+                    )] = backup.model
+            
+            pending = set(racers)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = task.exception()
+                if winner is not None:
+                    break
+            if winner is None:
+                raise error
+            if len(racers) > 1:
+                self.metrics.counter("hedged_total", "Attempts raced against a fallback model").inc(
+                    winner="primary" if racers[winner] == route.model else "fallback"
+                )
+            return winner.result(), racers[winner]
+        finally:
+            for task in racers:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    task.result().close()
+    
+    def _count_request(self, error: Optional[BaseException]):
+        """Count one API attempt by outcome"""
+        if error is None:
+            outcome = "ok"
+        elif isinstance(error, RateLimitError):
+            outcome = "429"
+            self.metrics.counter("rate_limited_total", "429 responses from the API").inc()
+        elif isinstance(error, APIError):
+            outcome = f"{error.status // 100}xx"
+        elif isinstance(error, TimeoutError):
+            outcome = "timeout"
+        else:
+            outcome = "error"
+        self.metrics.counter("requests_total", "API attempts by outcome").inc(outcome=outcome)
+    
+    def _observe(self, result: GenerationResult, timings: PhaseTimings):
+        """Record a finished generation's phases and bytes in the metrics registry"""
+        self.metrics.counter("generations_total", "Images generated by outcome").inc(
+            outcome="success" if result.success else "failure"
+        )
+        phase_seconds = self.metrics.histogram(
+            "phase_seconds", "Time spent per generation phase"
+        )
+        for phase, seconds in timings.phases.items():
+            phase_seconds.observe(seconds, phase=phase)
+        byte_counter = self.metrics.counter("bytes_total", "Bytes handled by kind")
+        for kind, count in timings.bytes.items():
+            byte_counter.inc(count, kind=kind)
+        if result.duration_ms is not None:
+            self.metrics.histogram(
+                "generation_seconds", "End-to-end time per generate_single call"
+            ).observe(result.duration_ms / 1000)
+    
+    @property
+    def cpu_workers(self) -> int:
+        """Number of images that may be post-processed at once"""
+        return self.config.processing.max_workers or os.cpu_count() or 1
+    
+    def _get_executor(self) -> Optional[Executor]:
+        """Return the post-processing pool, creating it on first use"""
+        if self._executor is None and self.config.processing.executor != "inline":
+            if self.config.processing.executor == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.cpu_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.cpu_workers,
+                    thread_name_prefix="gemini-image"
+                )
+        return self._executor
+    
+    def _get_cpu_semaphore(self) -> asyncio.Semaphore:
+        """CPU stage concurrency limit, bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._cpu_semaphore is None or self._cpu_semaphore_loop is not loop:
+            self._cpu_semaphore = asyncio.Semaphore(self.cpu_workers)
+            self._cpu_semaphore_loop = loop
+        return self._cpu_semaphore
+    
+    def _save_image(self, image_data: Union[str, bytes, BinaryIO], output_path: str) -> str:
+        """Save a base64 data URL, encoded image bytes or image file object to file"""
+        return process_image(
+            image_data,
+            output_path,
+            self.config.output.width,
+            self.config.output.height,
+            self.config.output.format,
+            self.config.output.quality,
+            self.config.output.fit,
+            self.config.output.resample,
+            self.config.processing.reducing_gap
+        )
+    
+    def _output_specs(self, image: ImagePrompt, output_path: str) -> List[OutputSpec]:
+        """Resolve the primary output and any renditions of a prompt into files to write"""
+        output = self.config.output
+        quality = image.quality or output.quality
+        fit = image.fit or output.fit
+        resample = image.resample or output.resample
+        specs = [OutputSpec(
+            output_path,
+            image.width or output.width,
+            image.height or output.height,
+            image.format or output.format,
+            quality,
+            fit,
+            resample
+        )]
         
-        # Ensure output directory exists
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        base = Path(output_path)
+        for rendition in image.renditions or []:
+            suffix = rendition.suffix if rendition.suffix is not None else f"-{rendition.width}w"
+            extension = "jpg" if rendition.format == "jpeg" else rendition.format
+            specs.append(OutputSpec(
+                str(base.with_name(f"{base.stem}{suffix}.{extension}")),
+                rendition.width,
+                rendition.height,
+                rendition.format,
+                rendition.quality or quality,
+                rendition.fit or fit,
+                rendition.resample or resample
+            ))
+        return specs
+    
+    async def _save_image_async(
+        self,
+        image_data: BinaryIO,
+        outputs: List[OutputSpec],
+        timings: Optional[PhaseTimings] = None
+    ) -> Tuple[List[str], Optional[int]]:
+        """Decode once and write every output on the post-processing pool.
         
-        # Save as WebP or specified format
-        if self.config.output.format == "webp":
-            image.save(output_path, "WEBP", quality=self.config.output.quality)
+        Returns the paths written and, when the perceptual index is enabled,
+        the dhash of the decoded image.
+        """
+        timings = timings if timings is not None else PhaseTimings()
+        hash_size = self.config.dedup.hash_size if self.phash_index is not None else 0
+        reducing_gap = self.config.processing.reducing_gap
+        executor = self._get_executor()
+        if executor is None:
+            paths, worker_timings, image_hash = render_image_timed(
+                image_data, outputs, hash_size, reducing_gap
+            )
         else:
-            image.save(output_path, quality=self.config.output.quality)
-        
-        return output_path
+            if isinstance(executor, ProcessPoolExecutor):
+                # File objects cannot cross process boundaries
+                image_data = image_data.read()
+            
+            queued = time.perf_counter()
+            async with self._get_cpu_semaphore():
+                timings.add("cpu_queue_wait", time.perf_counter() - queued)
+                paths, worker_timings, image_hash = await asyncio.get_running_loop().run_in_executor(
+                    executor,
+                    render_image_timed,
+                    image_data,
+                    outputs,
+                    hash_size,
+                    reducing_gap
+                )
+        for phase, seconds in worker_timings.phases.items():
+            timings.add(phase, seconds)
+        for kind, count in worker_timings.bytes.items():
+            timings.add_bytes(kind, count)
+        return paths, image_hash
     
     async def generate_single(
         self,
         prompt: str,
         filename: str,
-        output_dir: Optional[str] = None
+        output_dir: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        format: Optional[str] = None,
+        quality: Optional[int] = None,
+        renditions: Optional[List[Rendition]] = None,
+        hedge: bool = False
+    ) -> GenerationResult:
+        """Generate a single image.
+        
+        width, height, format and quality override config.output for this
+        call only. Each rendition is written next to the main file from the
+        same decoded image, so one API call can feed a whole srcset. hedge
+        trades quota for tail latency; see ImagePrompt.hedge.
+        """
+        image = ImagePrompt(
+            id=filename,
+            prompt=prompt,
+            filename=filename,
+            width=width,
+            height=height,
+            format=format,
+            quality=quality,
+            renditions=renditions,
+            hedge=hedge
+        )
+        return await self._generate(image, output_dir)
+    
+    async def _generate(
+        self,
+        image: ImagePrompt,
+        output_dir: Optional[str] = None,
+        network_limit: Optional[Any] = None,
+        memory_budget: Optional[MemoryBudget] = None
     ) -> GenerationResult:
-        """Generate a single image"""
+        """Generate a single image as a network stage followed by a CPU stage.
+        
+        network_limit (a semaphore or AdaptiveConcurrencyLimiter) only bounds
+        the API call, so a batch keeps requests streaming while earlier
+        images are still being post-processed. memory_budget, if given,
+        admits the image only once its estimated bytes fit.
+        """
         start_time = time.time()
+        prompt = image.prompt
+        filename = image.filename
+        timings = PhaseTimings()
         
         try:
-            if self.config.logging_enabled:
-                print(f"Generating: {filename}")
-            
-            image_data = await self.generate_with_retry(prompt)
-            
-            if not image_data:
-                raise Exception("No image data received")
-            
-            output_dir = output_dir or self.config.output.base_dir
-            output_path = str(Path(output_dir) / filename)
-            
-            self._save_image(image_data, output_path)
-            
-            duration_ms = int((time.time() - start_time) * 1000)
-            
-            return GenerationResult(
-                success=True,
-                id=filename,
-                filename=filename,
-                path=output_path,
-                duration_ms=duration_ms
-            )
+            result = await self._generate_stages(image, output_dir, network_limit, memory_budget, timings)
         except Exception as e:
-            return GenerationResult(
+            result = GenerationResult(
                 success=False,
                 id=filename,
                 filename=filename,
                 error=str(e),
-                duration_ms=int((time.time() - start_time) * 1000)
+                metadata=timings.as_metadata()
             )
+        
+        result.duration_ms = int((time.time() - start_time) * 1000)
+        self._observe(result, timings)
+        return result
     
-    async def generate_batch(self, batch_config: BatchConfig) -> List[GenerationResult]:
-        """Generate multiple images from batch configuration"""
-        results = []
+    async def _generate_stages(
+        self,
+        image: ImagePrompt,
+        output_dir: Optional[str],
+        network_limit: Optional[Any],
+        memory_budget: Optional[MemoryBudget],
+        timings: PhaseTimings
+    ) -> GenerationResult:
+        prompt = image.prompt
+        filename = image.filename
+        output_dir = image.dir or output_dir or self.config.output.base_dir
+        output_path = str(Path(output_dir) / filename)
+        outputs = self._output_specs(image, output_path)
+        metadata: Dict[str, Any] = {}
+        if image.renditions:
+            metadata["renditions"] = [spec.path for spec in outputs[1:]]
         
-        if batch_config.parallel:
-            # Parallel generation with limited workers
-            semaphore = asyncio.Semaphore(batch_config.max_workers)
-            
-            async def generate_with_semaphore(image: ImagePrompt):
-                async with semaphore:
-                    return await self.generate_single(
-                        image.prompt,
-                        image.filename,
-                        batch_config.output_dir
+        if self.cache:
+            # An image from any candidate model will do, the preferred one first
+            models = self.router.models
+            candidates = [
+                list(zip(self._cache_keys(model, prompt, outputs), (spec.path for spec in outputs)))
+                for model in models
+            ]
+            with timings.phase("cache_lookup"):
+                chosen = await asyncio.get_running_loop().run_in_executor(
+                    None, self.cache.get_first, candidates
+                )
+            hit = models[chosen] if chosen is not None else None
+            if hit:
+                if self.config.logging_enabled:
+                    print(f"Cache hit: {filename}")
+                self.metrics.counter("cache_hits_total", "Generations served from the cache").inc()
+                metadata["cache"] = "hit"
+                return await self._finish_cache_hit(filename, outputs, output_path, hit, metadata, timings)
+            self.metrics.counter("cache_misses_total", "Generations not found in the cache").inc()
+            metadata["cache"] = "miss"
+        
+        async def produce() -> Tuple[List[str], Tuple[Optional[int], str, Dict[str, Any]]]:
+            image_hash, model = await self._produce(
+                prompt, filename, outputs, network_limit, memory_budget, image.hedge, timings
+            )
+            # Indexed before coalesced followers are released, and only once for all of them
+            dedup = self._index_output(outputs, image_hash) if image_hash is not None else {}
+            paths = [] if dedup.get("skipped") else [spec.path for spec in outputs]
+            if self.cache and paths:
+                # After the dedup decision, so a skipped duplicate is never restored from the cache
+                with timings.phase("cache_store"):
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self._cache_store, model, prompt, outputs
+                    )
+            return paths, (image_hash, model, dedup)
+        
+        if self.config.coalesce_enabled:
+            key = self._flight_key(prompt, outputs)
+            coalesced, (image_hash, model, dedup) = await self._single_flight(key, outputs, produce, timings)
+            if coalesced:
+                if self.config.logging_enabled:
+                    print(f"Coalesced with in-flight request: {filename}")
+                metadata["coalesced"] = True
+                if image_hash is not None and not dedup.get("skipped"):
+                    # A copy of the leader's image, not a near-duplicate of it
+                    self.phash_index.add(outputs[0].path, image_hash)
+        else:
+            _, (image_hash, model, dedup) = await produce()
+        metadata["model"] = model
+        return self._finish(filename, output_path, metadata, dedup, timings)
+    
+    async def _finish_cache_hit(
+        self,
+        filename: str,
+        outputs: List[OutputSpec],
+        output_path: str,
+        model: str,
+        metadata: Dict[str, Any],
+        timings: PhaseTimings
+    ) -> GenerationResult:
+        """Result for outputs restored from the cache, indexed like freshly generated ones"""
+        metadata["model"] = model
+        dedup: Dict[str, Any] = {}
+        if self.phash_index is not None:
+            image_hash = await asyncio.get_running_loop().run_in_executor(
+                None, hash_file, outputs[0].path, self.config.dedup.hash_size
+            )
+            dedup = self._index_output(outputs, image_hash)
+        return self._finish(filename, output_path, metadata, dedup, timings)
+    
+    def _finish(
+        self,
+        filename: str,
+        output_path: str,
+        metadata: Dict[str, Any],
+        dedup: Dict[str, Any],
+        timings: PhaseTimings
+    ) -> GenerationResult:
+        """Successful result, with the indexed original standing in for a skipped duplicate"""
+        metadata.update(dedup)
+        if dedup.get("skipped"):
+            output_path = dedup["duplicate_of"]
+            metadata.pop("renditions", None)
+        
+        metadata.update(timings.as_metadata())
+        return GenerationResult(
+            success=True,
+            id=filename,
+            filename=filename,
+            path=output_path,
+            metadata=metadata
+        )
+    
+    async def _produce(
+        self,
+        prompt: str,
+        filename: str,
+        outputs: List[OutputSpec],
+        network_limit: Optional[Any],
+        memory_budget: Optional[MemoryBudget],
+        hedge: bool,
+        timings: PhaseTimings
+    ) -> Tuple[Optional[int], str]:
+        """Call the API for one image and write all of its outputs.
+        
+        Returns the image's dhash (if indexing) and the model that produced it.
+        """
+        if self.config.logging_enabled:
+            print(f"Generating: {filename}")
+        
+        # Admit before taking a network slot, so an image waiting on memory doesn't hold one
+        held = 0
+        if memory_budget is not None:
+            queued = time.perf_counter()
+            held = await memory_budget.acquire(self._memory_estimate(outputs))
+            timings.add("memory_wait", time.perf_counter() - queued)
+        
+        try:
+            if network_limit:
+                queued = time.perf_counter()
+                async with network_limit:
+                    timings.add("queue_wait", time.perf_counter() - queued)
+                    image_data, model = await self._generate_routed(
+                        prompt,
+                        on_attempt=getattr(network_limit, "record", None),
+                        timings=timings,
+                        hedge=hedge
                     )
+                if isinstance(network_limit, AdaptiveConcurrencyLimiter):
+                    self.metrics.gauge(
+                        "concurrency_limit", "Current adaptive batch concurrency limit"
+                    ).set(network_limit.limit)
+            else:
+                image_data, model = await self._generate_routed(prompt, timings=timings, hedge=hedge)
+            
+            if not image_data:
+                raise NoImageDataError("No image data received")
             
-            tasks = [generate_with_semaphore(img) for img in batch_config.images]
-            results = await asyncio.gather(*tasks)
+            try:
+                if memory_budget is not None:
+                    # Swap the estimate for one based on the real response
+                    held = memory_budget.resize(
+                        held,
+                        self._memory_estimate(outputs, image_data, timings.bytes.get("decoded"))
+                    )
+                _, image_hash = await self._save_image_async(image_data, outputs, timings)
+            finally:
+                image_data.close()
+        finally:
+            if memory_budget is not None:
+                memory_budget.release(held)
+                self.metrics.gauge(
+                    "memory_budget_peak_bytes", "Most bytes reserved at once by in-flight images"
+                ).set(memory_budget.peak)
+        return image_hash, model
+    
+    def _cache_store(self, model: str, prompt: str, outputs: List[OutputSpec]):
+        """Store every written output under its cache key"""
+        for key, spec in zip(self._cache_keys(model, prompt, outputs), outputs):
+            self.cache.put(key, spec.path)
+    
+    def _cache_keys(self, model: str, prompt: str, outputs: List[OutputSpec]) -> List[str]:
+        return [
+            ImageCache.make_key(
+                model,
+                prompt,
+                spec.width,
+                spec.height or 0,
+                spec.format,
+                spec.quality,
+                spec.fit,
+                spec.resample,
+                self.config.processing.reducing_gap
+            )
+            for spec in outputs
+        ]
+    
+    def _memory_estimate(
+        self,
+        outputs: List[OutputSpec],
+        image_data: Optional[BinaryIO] = None,
+        decoded_bytes: Optional[int] = None
+    ) -> int:
+        """Bytes one image holds from response to encode: spooled data, source raster, outputs.
+        
+        Before the response arrives, the largest source seen so far stands in.
+        """
+        source_pixels, source_bytes = self._largest_source
+        if image_data is not None:
+            try:
+                width, height = image_size(image_data)
+                source_pixels = width * height
+            except OSError:
+                pass
+            if decoded_bytes is not None:
+                source_bytes = decoded_bytes
+            self._largest_source = (
+                max(self._largest_source[0], source_pixels),
+                max(self._largest_source[1], source_bytes)
+            )
+        spooled = min(source_bytes, self.config.http.spool_max_bytes)
+        output_pixels = sum(spec.width * (spec.height or spec.width) for spec in outputs)
+        # RGBA source raster, plus each output's raster and encode buffer
+        return spooled + 4 * source_pixels + 5 * output_pixels
+    
+    def _index_output(self, outputs: List[OutputSpec], image_hash: int) -> Dict[str, Any]:
+        """Check a new image against the perceptual index and add it; returns metadata to report.
+        
+        A near-duplicate of an indexed image is flagged as duplicate_of.
+        With the "skip" policy the new files are also deleted and marked
+        skipped, and the existing image stands in for them.
+        """
+        dedup = self.config.dedup
+        main_path = outputs[0].path
+        matches = self.phash_index.query(image_hash, dedup.max_distance, limit=1, exclude=main_path)
+        if not matches:
+            self.phash_index.add(main_path, image_hash)
+            return {}
+        
+        existing, distance = matches[0]
+        metadata: Dict[str, Any] = {"duplicate_of": existing, "duplicate_distance": distance}
+        self.metrics.counter(
+            "duplicates_total", "Generated images matching an indexed image"
+        ).inc(policy=dedup.policy)
+        if self.config.logging_enabled:
+            print(f"Near-duplicate of {existing} (distance {distance}): {main_path}")
+        
+        if dedup.policy != "skip":
+            self.phash_index.add(main_path, image_hash)
+            return metadata
+        
+        for spec in outputs:
+            try:
+                os.remove(spec.path)
+            except FileNotFoundError:
+                pass
+        metadata["skipped"] = "duplicate"
+        return metadata
+    
+    def _flight_key(self, prompt: str, outputs: List[OutputSpec]) -> Tuple:
+        """Identity of a request for coalescing: everything but the output paths"""
+        return (
+            self.config.api.model,
+            prompt,
+            tuple(spec._replace(path="") for spec in outputs)
+        )
+    
+    async def _single_flight(
+        self,
+        key: Tuple,
+        outputs: List[OutputSpec],
+        produce: Callable[[], Any],
+        timings: PhaseTimings
+    ) -> Tuple[bool, Any]:
+        """Run produce() unless an identical request is already in flight.
+        
+        produce() returns the paths of the files it wrote and a value.
+        Followers wait for the leader and then hard-link (or copy) those
+        files to their own output paths, so N concurrent duplicates cost
+        one API call and one decode. Returns whether this call was a
+        follower, and the value.
+        """
+        while True:
+            leader = self._in_flight.get(key)
+            if leader is None:
+                break
+            try:
+                with timings.phase("coalesced_wait"):
+                    leader_paths, value = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if leader.cancelled():
+                    # The leader was cancelled, not us: take over the request
+                    continue
+                raise
+            with timings.phase("write"):
+                for source, spec in zip(leader_paths, outputs):
+                    _link_or_copy(source, spec.path)
+                    timings.add_bytes("output", os.path.getsize(spec.path))
+            self.metrics.counter(
+                "coalesced_total", "Generations served by an identical in-flight request"
+            ).inc()
+            return True, value
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            paths, value = await produce()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so there is no warning when nobody was waiting
+            future.exception()
+            raise
         else:
-            # Sequential generation with delays
-            for i, image in enumerate(batch_config.images):
-                result = await self.generate_single(
-                    image.prompt,
-                    image.filename,
-                    batch_config.output_dir
-                )
-                results.append(result)
+            future.set_result((paths, value))
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        return False, value
+    
+    async def generate_batch(self, batch_config: BatchConfig) -> List[GenerationResult]:
+        """Generate multiple images from batch configuration"""
+        results: Dict[int, GenerationResult] = {}
+        async for index, result in self._iter_batch(batch_config):
+            results[index] = result
+        return [results[i] for i in range(len(results))]
+    
+    async def generate_batch_iter(
+        self,
+        batch_config: BatchConfig,
+        max_in_flight: Optional[int] = None
+    ) -> AsyncIterator[GenerationResult]:
+        """Yield each GenerationResult as soon as it completes.
+        
+        batch_config.images may be any iterable or async iterable; it is
+        consumed lazily. At most max_in_flight images (default twice the
+        most API calls the batch may run at once, adaptive_max_workers when
+        adaptive) are dispatched but not yet consumed, so a slow consumer
+        holds back new dispatches. Closing the iterator early, e.g. by
+        breaking out of ``async with contextlib.aclosing(...)``, cancels the
+        outstanding work.
+        """
+        if max_in_flight is None:
+            workers = batch_config.max_workers
+            if batch_config.adaptive_concurrency:
+                # Leave room for every slot the controller may grow to
+                workers = max(workers, batch_config.adaptive_max_workers)
+            max_in_flight = max(2, workers * 2)
+        batch = self._iter_batch(batch_config, max_in_flight)
+        try:
+            async for _, result in batch:
+                yield result
+        finally:
+            await batch.aclose()
+    
+    def _network_limit(self, batch_config: BatchConfig) -> Any:
+        """Concurrency limit for a parallel batch's API calls"""
+        if batch_config.adaptive_concurrency:
+            limiter = AdaptiveConcurrencyLimiter(
+                initial=batch_config.max_workers,
+                min_limit=batch_config.min_workers,
+                max_limit=max(batch_config.adaptive_max_workers, batch_config.max_workers)
+            )
+            self.concurrency_limiter = limiter
+            return limiter
+        return asyncio.Semaphore(batch_config.max_workers)
+    
+    async def _iter_batch(
+        self,
+        batch_config: BatchConfig,
+        max_in_flight: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, GenerationResult]]:
+        """Run a batch, yielding (index, result) pairs in completion order"""
+        journal = BatchJournal(batch_config.journal_path) if batch_config.journal_path else None
+        network_limit = self._network_limit(batch_config) if batch_config.parallel else None
+        memory_budget = None
+        if batch_config.parallel and batch_config.memory_budget_bytes:
+            memory_budget = self.memory_budget = MemoryBudget(batch_config.memory_budget_bytes)
+        resumed = 0
+        
+        async def run(image: ImagePrompt) -> GenerationResult:
+            result = await self._generate(image, batch_config.output_dir, network_limit, memory_budget)
+            if journal:
+                # Checksums and fsync block, so keep them off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, journal.record, image.id, result)
+            return result
+        
+        async with self:
+            tasks: Dict[asyncio.Task, int] = {}
+            started = False
+            try:
+                async for index, image in aenumerate(batch_config.images):
+                    # Skip images a previous run already completed and whose files still verify
+                    record = None
+                    if journal and batch_config.resume:
+                        record = await asyncio.get_running_loop().run_in_executor(
+                            None, journal.completed, image.id
+                        )
+                    if record:
+                        resumed += 1
+                        yield index, self._resumed_result(image, record)
+                        continue
+                    
+                    if not batch_config.parallel:
+                        # Sequential generation with delays
+                        if started:
+                            await asyncio.sleep(batch_config.delay_ms / 1000)
+                        started = True
+                        yield index, await run(image)
+                        continue
+                    
+                    # Parallel generation: network_limit bounds in-flight API calls,
+                    # post-processing is bounded separately by the CPU pool
+                    tasks[asyncio.ensure_future(run(image))] = index
+                    while max_in_flight and len(tasks) >= max_in_flight:
+                        async for item in self._drain(tasks, wait_all=False):
+                            yield item
                 
-                if i < len(batch_config.images) - 1:
-                    await asyncio.sleep(batch_config.delay_ms / 1000)
+                async for item in self._drain(tasks, wait_all=True):
+                    yield item
+            finally:
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
         
-        return results
+        if journal and self.config.logging_enabled and resumed:
+            print(f"Resumed batch: {resumed} already completed")
+    
+    @staticmethod
+    async def _drain(
+        tasks: Dict[asyncio.Task, int],
+        wait_all: bool
+    ) -> AsyncIterator[Tuple[int, GenerationResult]]:
+        """Yield finished tasks' results, waiting for one (or all) to complete"""
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = tasks.pop(task)
+                yield index, task.result()
+            if not wait_all:
+                return
+    
+    @staticmethod
+    def _resumed_result(image: ImagePrompt, record: Dict[str, Any]) -> GenerationResult:
+        """Rebuild the result of an image completed by an earlier run from its journal record"""
+        outputs = record["outputs"]
+        metadata: Dict[str, Any] = {"resumed": True}
+        if len(outputs) > 1:
+            metadata["renditions"] = [output["path"] for output in outputs[1:]]
+        return GenerationResult(
+            success=True,
+            id=image.filename,
+            filename=image.filename,
+            path=outputs[0]["path"],
+            metadata=metadata,
+            duration_ms=0
+        )
     
     def generate(self, prompt: str, filename: str, output_dir: Optional[str] = None) -> GenerationResult:
         """Synchronous wrapper for single image generation"""
@@ -207,4 +1102,17 @@ class ImageGenerator:
     
     def generate_batch_sync(self, batch_config: BatchConfig) -> List[GenerationResult]:
         """Synchronous wrapper for batch generation"""
-        return asyncio.run(self.generate_batch(batch_config))
\ No newline at end of file
+        return asyncio.run(self.generate_batch(batch_config))
+
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link source to destination, copying when the filesystem can't link"""
+    if os.path.abspath(source) == os.path.abspath(destination):
+        return
+    Path(destination).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
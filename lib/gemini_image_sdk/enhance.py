@@ -0,0 +1,219 @@
+"""Prompt enhancement through a text model, memoized on disk"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from dataclasses import replace
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Deque, Dict, Iterable, Optional, Union
+
+from .config import EnhancerConfig
+from .core import ImageGenerator
+from .errors import (
+    GeminiImageError,
+    RequestTimeoutError,
+    ResponseFormatError,
+    api_error,
+    is_retryable,
+    parse_retry_after
+)
+from .ratelimit import RateLimiter
+from .types import ImagePrompt
+from .utils import aenumerate
+
+PROMPT_TEMPLATE = """Create a detailed image generation prompt for: {description}
+{style}
+Return only the enhanced prompt, no explanations."""
+
+
+class PromptCache:
+    """JSON-lines store of enhanced prompts; the latest line for a key wins"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[Dict[str, str]] = None
+
+    def _load(self) -> Dict[str, str]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if isinstance(record, dict) and "key" in record and "prompt" in record:
+                            self._entries[record["key"]] = record["prompt"]
+        return self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        return self._load().get(key)
+
+    def put(self, key: str, prompt: str):
+        self._load()[key] = prompt
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "prompt": prompt, "timestamp": time.time()}) + "\n")
+
+
+class PromptEnhancer:
+    """Rewrite short descriptions into detailed image prompts with a text model.
+
+    Requests go through the generator's pooled HTTP session and key pool,
+    so they count against each key's quota and health like image calls,
+    and are further capped by the enhancer's own rate limiter and
+    concurrency limit. Results are memoized on disk by model, description
+    and style.
+    """
+
+    def __init__(self, generator: ImageGenerator, config: Optional[EnhancerConfig] = None):
+        self.generator = generator
+        self.config = config or generator.config.enhancer
+        self.rate_limiter = RateLimiter(self.config.requests_per_minute, self.config.burst)
+        self.cache = PromptCache(self.config.cache_path) if self.config.cache_enabled else None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def cache_key(self, description: str, style: Optional[str] = None) -> str:
+        key_data = json.dumps(
+            [self.config.model, self.config.system_prompt, PROMPT_TEMPLATE, description, style or ""]
+        )
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    async def enhance(self, description: str, style: Optional[str] = None) -> str:
+        """Return an enhanced prompt for description, from the cache when possible"""
+        key = self.cache_key(description, style)
+        counter = self.generator.metrics.counter("enhancements_total", "Prompt enhancements by outcome")
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            counter.inc(outcome="cache_hit")
+            return cached
+
+        try:
+            async with self._get_semaphore():
+                enhanced = await self._enhance_with_retry(description, style)
+        except Exception as e:
+            if not self.config.fallback_on_error:
+                raise
+            if self.generator.config.logging_enabled:
+                print(f"Prompt enhancement failed, using the description as is: {e}")
+            counter.inc(outcome="fallback")
+            return description
+
+        counter.inc(outcome="ok")
+        if self.cache:
+            self.cache.put(key, enhanced)
+        return enhanced
+
+    async def _enhance_with_retry(self, description: str, style: Optional[str]) -> str:
+        generator = self.generator
+        last_error = None
+        for attempt in range(1, generator.config.rate_limit.max_retries + 1):
+            if attempt > 1 and not generator.key_pool.can_failover(last_error):
+                await asyncio.sleep(generator._retry_delay(attempt, last_error))
+            try:
+                return await self._call_text_model(description, style)
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e) and not generator.key_pool.can_failover(e):
+                    break
+        raise last_error or GeminiImageError("Failed to enhance prompt")
+
+    async def _call_text_model(self, description: str, style: Optional[str]) -> str:
+        generator = self.generator
+        await self.rate_limiter.acquire()
+        api_key, _ = await generator.key_pool.acquire()
+        api = generator.config.api
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key.key}",
+            **api.headers
+        }
+        payload = {
+            "model": self.config.model,
+            "messages": [
+                {"role": "system", "content": self.config.system_prompt},
+                {"role": "user", "content": PROMPT_TEMPLATE.format(
+                    description=description,
+                    style=f"\nStyle requirements:\n{style}\n" if style else ""
+                )}
+            ],
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens
+        }
+
+        error: Optional[BaseException] = None
+        try:
+            async with generator, generator.transport.post(
+                generator._session,
+                f"{api.base_url}/chat/completions",
+                headers,
+                payload,
+                generator._request_timeout(None)
+            ) as response:
+                if response.status != 200:
+                    raise api_error(
+                        response.status,
+                        await response.text(),
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
+                data = json.loads(await response.read())
+        except asyncio.TimeoutError as e:
+            error = RequestTimeoutError(f"Enhancement timed out: {str(e) or 'time limit reached'}")
+            raise error from e
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            generator._release_key(api_key, error)
+
+        try:
+            content = data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise ResponseFormatError("No text in enhancement response")
+        if not isinstance(content, str) or not content.strip():
+            raise ResponseFormatError("Empty enhancement response")
+        return content.strip()
+
+    async def enhance_prompts(
+        self,
+        images: Union[Iterable[ImagePrompt], AsyncIterable[ImagePrompt]],
+        style: Optional[str] = None,
+        lookahead: Optional[int] = None
+    ) -> AsyncIterator[ImagePrompt]:
+        """Yield copies of images with enhanced prompts, in order.
+
+        Up to lookahead prompts (default max_concurrency) are enhanced ahead
+        of the consumer, so passing this as BatchConfig.images to
+        generate_batch_iter overlaps enhancing later prompts with rendering
+        earlier images. The original text is kept in metadata["description"].
+        """
+        lookahead = max(1, lookahead or self.config.max_concurrency)
+        pending: Deque["asyncio.Future[ImagePrompt]"] = deque()
+
+        async def enhance_one(image: ImagePrompt) -> ImagePrompt:
+            enhanced = await self.enhance(image.prompt, style)
+            metadata = dict(image.metadata or {}, description=image.prompt)
+            return replace(image, prompt=enhanced, metadata=metadata)
+
+        try:
+            async for _, image in aenumerate(images):
+                pending.append(asyncio.ensure_future(enhance_one(image)))
+                if len(pending) >= lookahead:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
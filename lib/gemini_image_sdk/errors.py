@@ -0,0 +1,97 @@
+"""Exception types raised by the Gemini Image SDK"""
+
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class GeminiImageError(Exception):
+    """Base class for SDK errors"""
+
+    retryable = True
+
+
+class APIError(GeminiImageError):
+    """Non-200 response from the image API"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"API Error ({status}): {message}")
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+    @property
+    def is_throttling(self) -> bool:
+        """True for responses that signal upstream overload (429 or 5xx)"""
+        return self.status == 429 or self.status >= 500
+
+
+class RateLimitError(APIError):
+    """429 Too Many Requests; retry_after holds the server's requested delay"""
+
+
+class ServerError(APIError):
+    """5xx response; worth retrying"""
+
+
+class ClientError(APIError):
+    """4xx response that will fail the same way if repeated"""
+
+    retryable = False
+
+
+class AuthenticationError(ClientError):
+    """401/403 response: the API key is missing, invalid or not allowed"""
+
+
+class RequestTimeoutError(GeminiImageError, TimeoutError):
+    """Connect/read timeout on one attempt, or the per-image deadline ran out"""
+
+
+class NoImageDataError(GeminiImageError):
+    """The API answered without an image (e.g. text-only reply); may succeed on retry"""
+
+
+class ResponseFormatError(GeminiImageError):
+    """The response body was not the JSON/data URL shape we expect"""
+
+
+class CassetteMissError(GeminiImageError):
+    """Replay mode found no recorded response for a request"""
+
+    retryable = False
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def api_error(status: int, message: str, retry_after: Optional[float] = None) -> APIError:
+    """Build the APIError subclass matching an HTTP status"""
+    if status == 429:
+        return RateLimitError(status, message, retry_after)
+    if status >= 500:
+        return ServerError(status, message, retry_after)
+    if status in (401, 403):
+        return AuthenticationError(status, message, retry_after)
+    if status == 408:
+        # Request Timeout is transient even though it is a 4xx
+        return APIError(status, message, retry_after)
+    if 400 <= status < 500:
+        return ClientError(status, message, retry_after)
+    return APIError(status, message, retry_after)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether repeating the request could succeed"""
+    return getattr(error, "retryable", True)
@@ -0,0 +1,239 @@
+"""Image post-processing that runs off the event loop"""
+
+import base64
+import os
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, List, NamedTuple, Optional, Tuple, Union
+
+from .metrics import PhaseTimings
+
+# Pillow is imported inside the functions that touch images, keeping the SDK cheap to import
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def decode_data_url(base64_data: str) -> bytes:
+    """Decode a base64 payload, with or without its data URL prefix"""
+    if "," in base64_data:
+        base64_data = base64_data.split(",", 1)[1]
+    return base64.b64decode(base64_data)
+
+
+def open_image(image_data: Union[str, bytes, BinaryIO]) -> "Image.Image":
+    """Open a data URL / base64 string, raw encoded bytes or a binary file object"""
+    from PIL import Image
+
+    if isinstance(image_data, str):
+        return Image.open(BytesIO(decode_data_url(image_data)))
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        return Image.open(BytesIO(image_data))
+    return Image.open(image_data)
+
+
+def image_size(image_file: BinaryIO) -> Tuple[int, int]:
+    """Width and height from an image file's header, leaving the file at its start"""
+    from PIL import Image
+
+    try:
+        with Image.open(image_file) as image:
+            return image.size
+    finally:
+        image_file.seek(0)
+
+
+class OutputSpec(NamedTuple):
+    """One file to write from a decoded image; height None keeps the aspect ratio"""
+    path: str
+    width: int
+    height: Optional[int]
+    format: str
+    quality: int
+    fit: str = "stretch"  # see resize_image
+    resample: str = "lanczos"
+
+
+# Image.Resampling members, lowercased
+RESAMPLE_FILTERS = ("nearest", "box", "bilinear", "hamming", "bicubic", "lanczos")
+
+FIT_MODES = ("stretch", "fit", "cover", "crop")
+
+
+def resize_image(
+    image: "Image.Image",
+    width: int,
+    height: Optional[int],
+    fit: str = "stretch",
+    resample: str = "lanczos",
+    reducing_gap: Optional[float] = None
+) -> "Image.Image":
+    """Scale image to a width x height box.
+
+    stretch: exactly width x height, ignoring the aspect ratio
+    fit:     as large as fits inside the box, aspect ratio kept
+    cover:   fills the box, center-cropping the overflow
+    crop:    a width x height center cut at full resolution (cover if too small)
+
+    A height of None keeps the aspect ratio at the given width. With
+    reducing_gap, downscales by 2 * reducing_gap or more first shrink by an
+    integer factor with Image.reduce, which is much faster and nearly as
+    sharp. Smaller scale changes resize exactly; reduce gains nothing there.
+    """
+    src_width, src_height = image.size
+    if height is None:
+        height = max(1, round(src_height * width / src_width))
+        fit = "stretch"
+    if fit not in FIT_MODES:
+        raise ValueError(f"Unknown fit mode {fit!r}; expected one of {', '.join(FIT_MODES)}")
+    if resample not in RESAMPLE_FILTERS:
+        raise ValueError(f"Unknown resampling filter {resample!r}; expected one of {', '.join(RESAMPLE_FILTERS)}")
+
+    box = None
+    size = (width, height)
+    if fit == "crop" and src_width >= width and src_height >= height:
+        left = (src_width - width) // 2
+        top = (src_height - height) // 2
+        return image.crop((left, top, left + width, top + height))
+    if fit == "fit":
+        scale = min(width / src_width, height / src_height)
+        size = (max(1, round(src_width * scale)), max(1, round(src_height * scale)))
+    elif fit in ("cover", "crop"):
+        scale = max(width / src_width, height / src_height)
+        crop_width, crop_height = width / scale, height / scale
+        left = (src_width - crop_width) / 2
+        top = (src_height - crop_height) / 2
+        box = (left, top, left + crop_width, top + crop_height)
+
+    if size == image.size and (box is None or box == (0, 0, src_width, src_height)):
+        return image
+    if reducing_gap is not None:
+        box_width, box_height = (box[2] - box[0], box[3] - box[1]) if box else image.size
+        if min(box_width / size[0], box_height / size[1]) < 2 * reducing_gap:
+            reducing_gap = None
+    from PIL import Image
+
+    return image.resize(size, Image.Resampling[resample.upper()], box=box, reducing_gap=reducing_gap)
+
+
+def _draft_size(outputs: List[OutputSpec], reducing_gap: float) -> Optional[Tuple[int, int]]:
+    """Smallest decode size every output can still be rendered from, or None for full size.
+
+    Like Image.thumbnail, it keeps reducing_gap times the output size for the final resize.
+    """
+    if any(spec.fit == "crop" for spec in outputs):
+        return None
+    return (
+        int(max(spec.width for spec in outputs) * reducing_gap),
+        int(max(spec.height or 1 for spec in outputs) * reducing_gap)
+    )
+
+
+# Pillow format names; anything else is inferred from the file extension
+_PIL_FORMATS = {
+    "webp": "WEBP",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+    "png": "PNG",
+    "avif": "AVIF"
+}
+
+
+def _save(image: "Image.Image", spec: OutputSpec, timings: PhaseTimings):
+    pil_format = _PIL_FORMATS.get(spec.format.lower())
+    if pil_format is None:
+        from PIL import Image
+        pil_format = Image.registered_extensions().get(Path(spec.path).suffix.lower())
+
+    # Encode in memory first so encode and disk write are timed separately
+    with timings.phase("encode"):
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, pil_format, quality=spec.quality)
+
+    with timings.phase("write"):
+        # Ensure output directory exists
+        Path(spec.path).parent.mkdir(parents=True, exist_ok=True)
+        # Replace rather than truncate, so files hard-linked to this path keep their content
+        tmp_path = f"{spec.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getbuffer())
+        os.replace(tmp_path, spec.path)
+    timings.add_bytes("output", buffer.tell())
+
+
+def render_image(
+    image_data: Union[str, bytes, BinaryIO],
+    outputs: List[OutputSpec],
+    timings: Optional[PhaseTimings] = None,
+    reducing_gap: Optional[float] = None
+) -> List[str]:
+    """Decode an image once and write every requested output from it.
+
+    Module-level and argument-only so it can be shipped to a process pool.
+    """
+    timings = timings if timings is not None else PhaseTimings()
+    return _render(image_data, outputs, timings, 0, reducing_gap)[0]
+
+
+def _render(
+    image_data: Union[str, bytes, BinaryIO],
+    outputs: List[OutputSpec],
+    timings: PhaseTimings,
+    hash_size: int,
+    reducing_gap: Optional[float]
+) -> Tuple[List[str], Optional[int]]:
+    with timings.phase("decode"):
+        image = open_image(image_data)
+        draft_size = _draft_size(outputs, reducing_gap) if reducing_gap is not None else None
+        if draft_size and image.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when outputs are small enough
+            image.draft(image.mode, draft_size)
+        image.load()
+
+    image_hash = None
+    if hash_size:
+        from .phash import dhash
+        with timings.phase("phash"):
+            image_hash = dhash(image, hash_size)
+
+    paths = []
+    for spec in outputs:
+        with timings.phase("resize"):
+            resized = resize_image(image, spec.width, spec.height, spec.fit, spec.resample, reducing_gap)
+        _save(resized, spec, timings)
+        paths.append(spec.path)
+
+    return paths, image_hash
+
+
+def render_image_timed(
+    image_data: Union[str, bytes, BinaryIO],
+    outputs: List[OutputSpec],
+    hash_size: int = 0,
+    reducing_gap: Optional[float] = None
+) -> Tuple[List[str], PhaseTimings, Optional[int]]:
+    """render_image that also returns its timings and, if hash_size is set, the image's dhash"""
+    timings = PhaseTimings()
+    paths, image_hash = _render(image_data, outputs, timings, hash_size, reducing_gap)
+    return paths, timings, image_hash
+
+
+def process_image(
+    image_data: Union[str, bytes, BinaryIO],
+    output_path: str,
+    width: int,
+    height: int,
+    format: str = "webp",
+    quality: int = 90,
+    fit: str = "stretch",
+    resample: str = "lanczos",
+    reducing_gap: Optional[float] = None
+) -> str:
+    """Decode, resize and encode an image to a single output_path"""
+    return render_image(
+        image_data,
+        [OutputSpec(output_path, width, height, format, quality, fit, resample)],
+        reducing_gap=reducing_gap
+    )[0]
@@ -0,0 +1,106 @@
+"""Append-only checkpoint journal for resumable batch runs"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .types import GenerationResult, GenerationStatus
+from .utils import append_lines
+
+
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BatchJournal:
+    """JSON-lines journal recording the outcome of each ImagePrompt in a batch.
+
+    Each line is one record; the latest record for an id wins. Records are
+    flushed and fsynced as they are written, so a crash loses at most the
+    image that was in progress. A truncated final line is ignored on load
+    and ended before the next record is appended.
+    Methods are thread-safe, so a batch can hash and fsync in an executor
+    instead of on the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latest record for each image id"""
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is not None:
+            return self._entries
+
+        entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and "id" in record:
+                        entries[record["id"]] = record
+        self._entries = entries
+        return entries
+
+    def record(self, image_id: str, result: GenerationResult):
+        """Append the outcome of one image, with checksums of every file it wrote"""
+        record: Dict[str, Any] = {
+            "id": image_id,
+            "status": (
+                GenerationStatus.COMPLETED if result.success else GenerationStatus.FAILED
+            ).value,
+            "timestamp": time.time()
+        }
+        if result.success and result.path:
+            record["outputs"] = [
+                {"path": path, "checksum": file_checksum(path)}
+                for path in self._result_paths(result)
+            ]
+        if result.error:
+            record["error"] = result.error
+
+        line = json.dumps(record)
+        with self._lock:
+            entries = self._load()
+            append_lines(self.path, [line], fsync=True)
+            entries[image_id] = record
+
+    @staticmethod
+    def _result_paths(result: GenerationResult) -> List[str]:
+        paths = [result.path]
+        if result.metadata:
+            paths.extend(result.metadata.get("renditions", []))
+        return paths
+
+    def completed(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """Return the record for image_id if it completed and its outputs still verify"""
+        record = self.load().get(image_id)
+        if not record or record.get("status") != GenerationStatus.COMPLETED.value:
+            return None
+
+        outputs = record.get("outputs") or []
+        if not outputs:
+            return None
+        for output in outputs:
+            path = output.get("path")
+            if not path or not os.path.exists(path):
+                return None
+            if file_checksum(path) != output.get("checksum"):
+                return None
+        return record
@@ -0,0 +1,163 @@
+"""A pool of API keys, each with its own quota and health"""
+
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import APIConfig, RateLimitConfig
+from .errors import AuthenticationError, RateLimitError
+from .ratelimit import RateLimiter
+
+
+class APIKey:
+    """One pooled key: its rate limiter, health and usage counts"""
+
+    def __init__(self, key: str, limiter: RateLimiter):
+        self.key = key
+        self.limiter = limiter
+        # Safe to log and use as a metric label
+        self.name = f"...{key[-4:]}"
+        self.sidelined_until = 0.0  # time.monotonic() the key may be used again
+        self.strikes = 0  # 429s since the last success; each doubles the cooldown
+        self.last_error: Optional[BaseException] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.sidelined_until
+
+
+class KeyPool:
+    """Spread API calls over several keys so throughput scales with their quotas.
+
+    acquire() takes a token from the healthy key whose limiter can issue
+    one soonest, breaking ties by fewest requests in flight. A key answering
+    429 sits out for its Retry-After or an exponential cooldown; one
+    answering 401/403 for auth_cooldown. Keys return on their own. A pool of
+    one key is never sidelined, leaving throttling to the retry backoff.
+    """
+
+    def __init__(
+        self,
+        keys: List[APIKey],
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0,
+        auth_cooldown: float = 600.0,
+        limiter: Optional[RateLimiter] = None
+    ):
+        if not keys:
+            raise ValueError("KeyPool needs at least one key")
+        self.keys = keys
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.auth_cooldown = auth_cooldown
+        # Overall limit across every key, on top of the per-key ones
+        self.limiter = limiter
+
+    @classmethod
+    def from_config(
+        cls,
+        api: APIConfig,
+        rate_limit: RateLimitConfig,
+        limiter: Optional[RateLimiter] = None
+    ) -> "KeyPool":
+        """One key per APIConfig.all_keys(), each limited to rate_limit's quota.
+
+        A given limiter is used as the quota of a single key, or as an
+        overall limit for several. With a shared state file, keys after the
+        first get their own file named after a digest of the key.
+        """
+        keys = api.all_keys()
+        if limiter is not None and len(keys) == 1:
+            return cls([APIKey(keys[0], limiter)])
+
+        pooled = []
+        for index, key in enumerate(keys):
+            state_file = rate_limit.shared_state_file
+            if state_file and index:
+                state_file = f"{state_file}.{hashlib.sha256(key.encode()).hexdigest()[:12]}"
+            pooled.append(APIKey(key, RateLimiter.from_config(rate_limit, state_file)))
+        return cls(pooled, api.key_cooldown, api.max_key_cooldown, api.auth_cooldown, limiter)
+
+    def pick(self) -> APIKey:
+        """The healthy key that can issue a token soonest, or the first to return if none is healthy"""
+        now = time.monotonic()
+        healthy = [k for k in self.keys if k.sidelined_until <= now]
+        if not healthy:
+            return min(self.keys, key=lambda k: k.sidelined_until)
+        if len(healthy) == 1:
+            return healthy[0]
+        return min(healthy, key=lambda k: (k.limiter.delay(), k.in_flight))
+
+    async def acquire(self) -> Tuple[APIKey, float]:
+        """Wait for a token on the best key; returns the key and the seconds waited.
+
+        Raises the last AuthenticationError if every key has been rejected.
+        """
+        start = time.monotonic()
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        while True:
+            key = self.pick()
+            if not key.healthy:
+                if all(isinstance(k.last_error, AuthenticationError) for k in self.keys):
+                    raise key.last_error
+                await asyncio.sleep(key.sidelined_until - time.monotonic())
+                continue
+            await key.limiter.acquire()
+            # It may have been sidelined while we waited for its token
+            if key.healthy:
+                key.in_flight += 1
+                key.requests += 1
+                return key, time.monotonic() - start
+
+    def release(self, key: APIKey, error: Optional[BaseException] = None) -> bool:
+        """Return a key after its request; True if the error got it sidelined"""
+        key.in_flight -= 1
+        if error is None:
+            key.strikes = 0
+            key.last_error = None
+            return False
+        if not isinstance(error, (RateLimitError, AuthenticationError)):
+            return False  # 5xx and timeouts say nothing about the key
+
+        key.failures += 1
+        if len(self.keys) < 2:
+            return False
+        key.last_error = error
+        if isinstance(error, AuthenticationError):
+            cooldown = self.auth_cooldown
+        else:
+            key.strikes += 1
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (key.strikes - 1))
+            cooldown = max(cooldown, error.retry_after or 0)
+        key.sidelined_until = time.monotonic() + cooldown
+        return True
+
+    def can_failover(self, error: Optional[BaseException]) -> bool:
+        """Whether error was the key's fault and another key is ready to take the retry"""
+        return (
+            len(self.keys) > 1
+            and isinstance(error, (RateLimitError, AuthenticationError))
+            and any(k.healthy for k in self.keys)
+        )
+
+    def healthy_count(self) -> int:
+        return sum(1 for k in self.keys if k.healthy)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "key": k.name,
+                "healthy": k.sidelined_until <= now,
+                "sidelined_for": max(0.0, k.sidelined_until - now),
+                "requests": k.requests,
+                "failures": k.failures,
+                "in_flight": k.in_flight
+            }
+            for k in self.keys
+        ]
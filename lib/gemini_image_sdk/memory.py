@@ -0,0 +1,213 @@
+"""Append-only persistence for AgentMemory"""
+
+import json
+import os
+from collections import deque
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .types import AgentMemory, GenerationResult, Interaction
+
+LOG_VERSION = 1
+
+
+class MemoryLog:
+    """JSON-lines log of an agent's memory.
+
+    The first line is a header, followed by "interaction" records (carrying
+    the GenerationResult of successful ones) and "context" records. Each
+    save appends only what changed since the last one; once the file holds
+    compact_factor times the memory window it is rewritten as just the
+    current window. Images whose interactions have left the window are
+    rewritten as "image" records, so the image window survives compaction.
+    A truncated final line is ignored on load.
+    """
+
+    def __init__(self, path: str, compact_factor: int = 2, min_compact_lines: int = 1000):
+        self.path = Path(path)
+        self.compact_factor = compact_factor
+        self.min_compact_lines = min_compact_lines
+        self._lines = 0  # lines we know the file holds; 0 forces a rewrite
+        self._saved_interactions = 0  # total_interactions as of the last write
+        self._saved_context: Optional[str] = None
+
+    def save(self, memory: AgentMemory):
+        """Persist new interactions and any context change, compacting when due"""
+        window = memory.max_entries or memory.total_interactions
+        # A compacted log holds up to a window of interactions and one of older images
+        limit = max(self.min_compact_lines, self.compact_factor * 2 * window)
+        # unsaved is bounded too; if it overflowed, images it dropped are only in memory
+        overflowed = memory.total_interactions - len(memory.unsaved) != self._saved_interactions
+        if (
+            not self._lines
+            or overflowed
+            or not self.path.exists()
+            or self._lines + len(memory.unsaved) + 1 > limit
+        ):
+            self.compact(memory)
+            return
+
+        pending = list(memory.unsaved)
+        memory.unsaved.clear()
+        lines = self._encode_all(
+            pending,
+            memory.total_interactions - len(pending),
+            memory.total_images - sum(1 for i in pending if i.result is not None)
+        )
+        context = self._context_json(memory.context)
+        if context != self._saved_context:
+            lines.append(json.dumps({"type": "context", "context": memory.context}, default=str))
+            self._saved_context = context
+        if not lines:
+            return
+
+        with open(self.path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        self._lines += len(lines)
+        self._saved_interactions = memory.total_interactions
+
+    def compact(self, memory: AgentMemory):
+        """Rewrite the log as a header, the current image and interaction windows and the context"""
+        history = memory.conversation_history
+        images = memory.generated_images
+        lines = [json.dumps({"type": "header", "version": LOG_VERSION, "max_entries": memory.max_entries})]
+        in_history = {id(i.result) for i in history if i.result is not None}
+        first_image_seq = memory.total_images - len(images) + 1
+        lines += [
+            json.dumps({"type": "image", "image_seq": seq, "result": asdict(image)}, default=str)
+            for seq, image in enumerate(images, first_image_seq)
+            if id(image) not in in_history
+        ]
+        lines += self._encode_all(
+            history,
+            memory.total_interactions - len(history),
+            memory.total_images - sum(1 for i in history if i.result is not None)
+        )
+        lines.append(json.dumps({"type": "context", "context": memory.context}, default=str))
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+        memory.unsaved.clear()
+        self._lines = len(lines)
+        self._saved_interactions = memory.total_interactions
+        self._saved_context = self._context_json(memory.context)
+
+    def load(self, memory: AgentMemory) -> bool:
+        """Attach this log to memory; records are parsed on first access.
+
+        Only the raw lines that can fall in the memory window are kept.
+        Returns False if the file is not a memory log (e.g. an old JSON dump).
+        """
+        interactions: Deque[str] = deque(maxlen=memory.max_entries)
+        # Every line carrying a GenerationResult, for the image window
+        image_lines: Deque[str] = deque(maxlen=memory.max_entries)
+        context_line: Optional[str] = None
+        lines = 1
+        with open(self.path, "r") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return False
+            if not isinstance(header, dict) or header.get("type") != "header":
+                return False
+            if header.get("version", LOG_VERSION) > LOG_VERSION:
+                raise ValueError(f"{self.path} was written by a newer SDK version")
+
+            truncated = False
+            for line in f:
+                if not line.endswith("\n"):
+                    # Torn final write; rewrite the file on the next save instead of appending to it
+                    truncated = True
+                    break
+                lines += 1
+                if line.startswith('{"type": "interaction"'):
+                    interactions.append(line)
+                    # Quotes inside strings are escaped, so only the key itself matches
+                    if '"result": {' in line:
+                        image_lines.append(line)
+                elif line.startswith('{"type": "image"'):
+                    image_lines.append(line)
+                elif line.startswith('{"type": "context"'):
+                    context_line = line
+
+        def restore():
+            # One GenerationResult per image, shared by its interaction and the image window
+            results: Dict[Any, GenerationResult] = {}
+            for line in image_lines:
+                record = self._parse(line)
+                if record.get("result"):
+                    results[record.get("image_seq")] = GenerationResult(**record["result"])
+
+            history: List[Interaction] = []
+            total_interactions = total_images = 0
+            for line in interactions:
+                record = self._parse(line)
+                if not record:
+                    continue
+                result = None
+                if record.get("result"):
+                    result = results.get(record.get("image_seq")) or GenerationResult(**record["result"])
+                history.append(Interaction(
+                    record["prompt"],
+                    record["result_id"],
+                    record["success"],
+                    record.get("timestamp"),
+                    result
+                ))
+                total_interactions = record.get("seq", total_interactions)
+                total_images = record.get("image_seq", total_images)
+
+            context: Dict[str, Any] = {}
+            if context_line:
+                try:
+                    context = json.loads(context_line)["context"]
+                except ValueError:
+                    pass
+            memory.replace(
+                history,
+                list(results.values()),
+                context,
+                total_interactions,
+                total_images
+            )
+            self._saved_context = self._context_json(context)
+
+        # Totals come from the last record, so saves can number new entries without a full parse
+        last = self._parse(interactions[-1]) if interactions else {}
+        memory.total_interactions = last.get("seq", 0)
+        memory.total_images = last.get("image_seq", 0)
+        memory.unsaved.clear()
+        memory.set_loader(restore)
+        self._saved_interactions = memory.total_interactions
+        self._lines = 0 if truncated else lines
+        return True
+
+    @staticmethod
+    def _encode_all(interactions: Iterable[Interaction], seq: int, image_seq: int) -> List[str]:
+        """Encode interactions, numbering them on from the given counts"""
+        lines = []
+        for interaction in interactions:
+            seq += 1
+            record: Dict[str, Any] = {"type": "interaction", **interaction.to_dict(), "seq": seq}
+            if interaction.result is not None:
+                image_seq += 1
+                record["result"] = asdict(interaction.result)
+            record["image_seq"] = image_seq
+            lines.append(json.dumps(record, default=str))
+        return lines
+
+    @staticmethod
+    def _parse(line: str) -> Dict[str, Any]:
+        try:
+            return json.loads(line)
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _context_json(context: Dict[str, Any]) -> str:
+        return json.dumps(context, sort_keys=True, default=str)
@@ -0,0 +1,238 @@
+"""Perceptual hashing and a nearest-neighbour index of generated images"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+IMAGE_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg", ".avif", ".gif", ".bmp")
+
+
+def _numpy() -> Any:
+    """NumPy if installed; hashing and queries fall back to pure Python without it"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def dhash(image: "Image.Image", hash_size: int = 8) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy"""
+    from PIL import Image
+
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX, reducing_gap=2.0)
+    np = _numpy()
+    if np is not None:
+        pixels = np.asarray(small, dtype=np.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big") >> (-bits.size % 8)
+
+    pixels = list(small.getdata())
+    width = hash_size + 1
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * width + col]
+            value = value << 1 | (pixels[row * width + col + 1] > left)
+    return value
+
+
+def hash_file(path: str, hash_size: int = 8) -> int:
+    """dhash of an image file, letting JPEG decode at reduced size"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        return dhash(image, hash_size)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualIndex:
+    """dHash of every indexed image, queryable by Hamming distance.
+
+    Stored as JSON lines (path, hash, mtime, size); the latest line for a
+    path wins and a "removed" line drops it. compact() rewrites the file
+    with only live entries. With NumPy, queries XOR the whole index at once.
+    """
+
+    def __init__(self, path: str, hash_size: int = 8):
+        self.path = path
+        self.hash_size = hash_size
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._matrix: Optional[Tuple[List[str], Any]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if record.get("removed"):
+                            self._entries.pop(record["path"], None)
+                        elif record.get("hash_size", 8) == self.hash_size:
+                            self._entries[record["path"]] = record
+        return self._entries
+
+    def _append(self, records: List[Dict[str, Any]]):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._load()
+
+    def get(self, path: str) -> Optional[int]:
+        entry = self._load().get(os.path.abspath(path))
+        return int(entry["hash"], 16) if entry else None
+
+    def add(self, path: str, image_hash: Optional[int] = None) -> int:
+        """Index the image at path, hashing the file unless image_hash is given"""
+        self.add_many([(path, image_hash)])
+        return self.get(path)
+
+    def add_many(self, items: Iterable[Tuple[str, Optional[int]]]):
+        records = []
+        for path, image_hash in items:
+            path = os.path.abspath(path)
+            if image_hash is None:
+                image_hash = hash_file(path, self.hash_size)
+            stat = os.stat(path)
+            records.append({
+                "path": path,
+                "hash": format(image_hash, "x"),
+                "hash_size": self.hash_size,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size
+            })
+        if not records:
+            return
+        with self._lock:
+            entries = self._load()
+            for record in records:
+                entries[record["path"]] = record
+            self._matrix = None
+            self._append(records)
+
+    def remove(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            if self._load().pop(path, None) is not None:
+                self._matrix = None
+                self._append([{"path": path, "removed": True}])
+
+    def scan(self, directory: str, recursive: bool = True) -> int:
+        """Index the images under directory, skipping unchanged files; returns how many were hashed.
+
+        Entries for files under directory that no longer exist are dropped.
+        """
+        from PIL import Image
+
+        root = Path(directory).resolve()
+        pattern = "**/*" if recursive else "*"
+        entries = self._load()
+        seen = set()
+        stale = []
+        for file in root.glob(pattern):
+            if file.suffix.lower() not in IMAGE_EXTENSIONS or not file.is_file():
+                continue
+            path = str(file)
+            seen.add(path)
+            stat = file.stat()
+            entry = entries.get(path)
+            if entry and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+                continue
+            stale.append(path)
+
+        hashed = []
+        for path in stale:
+            try:
+                hashed.append((path, hash_file(path, self.hash_size)))
+            except (OSError, Image.DecompressionBombError):
+                continue
+        self.add_many(hashed)
+
+        prefix = str(root) + os.sep
+        for path in [p for p in entries if p.startswith(prefix) and p not in seen]:
+            self.remove(path)
+        return len(hashed)
+
+    def _distances(self, target: int) -> Tuple[List[str], List[int]]:
+        with self._lock:
+            entries = self._load()
+            paths = list(entries)
+            np = _numpy()
+            if np is None or self.hash_size > 8:
+                return paths, [hamming(int(entries[p]["hash"], 16), target) for p in paths]
+            if self._matrix is None:
+                self._matrix = (paths, np.array([int(entries[p]["hash"], 16) for p in paths], dtype=np.uint64))
+            paths, hashes = self._matrix
+
+        xor = hashes ^ np.uint64(target)
+        return paths, np.unpackbits(xor.view(np.uint8)).reshape(len(paths), 64).sum(axis=1).tolist()
+
+    def query(
+        self,
+        target: Union[int, str],
+        max_distance: int = 10,
+        limit: int = 5,
+        exclude: Optional[str] = None
+    ) -> List[Tuple[str, int]]:
+        """Nearest indexed images to a hash or image file, as (path, distance) pairs"""
+        if isinstance(target, str):
+            target = self.get(target) if target in self else hash_file(target, self.hash_size)
+        exclude = os.path.abspath(exclude) if exclude else None
+
+        paths, distances = self._distances(target)
+        matches = [
+            (path, distance)
+            for path, distance in zip(paths, distances)
+            if distance <= max_distance and path != exclude
+        ]
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches[:limit]
+
+    def duplicates(self, max_distance: int = 4) -> List[List[str]]:
+        """Groups of indexed images within max_distance of each other"""
+        paths = list(self._load())
+        parent = {path: path for path in paths}
+
+        def find(path: str) -> str:
+            while parent[path] != path:
+                parent[path] = parent[parent[path]]
+                path = parent[path]
+            return path
+
+        for path in paths:
+            for other, _ in self.query(self.get(path), max_distance, limit=len(paths), exclude=path):
+                parent[find(other)] = find(path)
+
+        groups: Dict[str, List[str]] = {}
+        for path in paths:
+            groups.setdefault(find(path), []).append(path)
+        return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+    def compact(self):
+        """Rewrite the index file with only its live entries"""
+        with self._lock:
+            entries = self._load()
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write("".join(json.dumps(r) + "\n" for r in entries.values()))
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,166 @@
+"""Token-bucket rate limiting shared across tasks, generators and processes"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from .config import RateLimitConfig
+
+
+class RateLimiter:
+    """Token bucket with O(1) acquire.
+
+    Each acquire reserves a token immediately, letting the bucket go into
+    debt, and then sleeps until that token has been refilled. Waiters are
+    therefore served in the order they arrived without any of them
+    re-reading a shared window. The bookkeeping is guarded by a thread lock
+    rather than an asyncio primitive, so one limiter can be shared between
+    generators, agents and event loops.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: RateLimitConfig, state_file: Optional[str] = None) -> "RateLimiter":
+        """Build the limiter described by a RateLimitConfig, optionally with its own state file"""
+        state_file = state_file or config.shared_state_file
+        if state_file:
+            return FileRateLimiter(state_file, config.requests_per_minute, config.burst)
+        return cls(config.requests_per_minute, config.burst)
+
+    def delay(self) -> float:
+        """Seconds until a token is free, without taking it"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        return max(0.0, (1 - tokens) / self.rate)
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it"""
+        now = time.monotonic()
+        with self._lock:
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def _refund(self):
+        """Give back a reserved token whose waiter was cancelled"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    async def acquire(self) -> float:
+        """Wait for a token; returns the time spent waiting in seconds"""
+        wait = self._reserve()
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._refund()
+                raise
+        return wait
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class FileRateLimiter(RateLimiter):
+    """Token bucket whose state lives in a file so separate processes share one quota.
+
+    The state file holds the token count and a wall-clock timestamp, and is
+    only written under an exclusive ``flock``; delay() reads it under a
+    shared one and never writes. The critical section is a few bytes of
+    I/O, so taking the lock inline does not stall the loop.
+    """
+
+    def __init__(self, state_file: str, requests_per_minute: float, burst: int = 1):
+        if fcntl is None:
+            raise RuntimeError("FileRateLimiter requires fcntl (POSIX only)")
+        super().__init__(requests_per_minute, burst)
+        self.state_file = state_file
+        directory = os.path.dirname(os.path.abspath(state_file))
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_state(self, fd: int, now: float) -> Tuple[float, float]:
+        os.lseek(fd, 0, os.SEEK_SET)
+        raw = os.read(fd, 256)
+        try:
+            state = json.loads(raw)
+            return float(state["tokens"]), float(state["updated"])
+        except (ValueError, KeyError, TypeError):
+            return self.capacity, now
+
+    def _write_state(self, fd: int, tokens: float, updated: float):
+        data = json.dumps({"tokens": tokens, "updated": updated}).encode()
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, data)
+
+    def _update(self, delta: float, now: float) -> float:
+        """Refill, apply delta under the file lock and return the new token count"""
+        with self._lock:
+            fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                tokens, updated = self._read_state(fd, now)
+                tokens = min(
+                    self.capacity,
+                    tokens + max(0.0, now - updated) * self.rate
+                )
+                tokens += delta
+                self._write_state(fd, tokens, max(now, updated))
+                return tokens
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _reserve(self) -> float:
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        tokens = self._update(-1, time.time())
+        return max(0.0, -tokens / self.rate)
+
+    def _refund(self):
+        self._update(1, time.time())
+
+    def _peek(self, now: float) -> float:
+        """Current token count, read under a shared lock without writing the file"""
+        try:
+            fd = os.open(self.state_file, os.O_RDONLY)
+        except FileNotFoundError:
+            return self.capacity
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            tokens, updated = self._read_state(fd, now)
+            return min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def delay(self) -> float:
+        # KeyPool asks every key on each pick, so this must stay a read
+        tokens = self._peek(time.time())
+        return max(0.0, (1 - tokens) / self.rate)
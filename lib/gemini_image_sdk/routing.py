@@ -0,0 +1,141 @@
+"""Routing across candidate models by rolling latency and error statistics"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .config import Config
+from .errors import AuthenticationError
+
+
+class ModelRoute:
+    """One candidate model and its recent attempts"""
+
+    def __init__(self, model: str, window: int):
+        self.model = model
+        self.latencies: Deque[float] = deque(maxlen=window)  # seconds, successful attempts only
+        self.outcomes: Deque[bool] = deque(maxlen=window)  # False for errors and SLO misses
+        self.misses = 0  # consecutive errors or SLO misses
+        self.demoted_until = 0.0  # time.monotonic() the model is tried again
+        self.requests = 0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency(self, quantile: float = 0.9) -> Optional[float]:
+        """Recent latency at quantile, or None before the first success"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+
+class ModelRouter:
+    """Pick which model each API attempt goes to.
+
+    Models are preferred in the order given, skipping demoted ones. A
+    model is demoted for cooldown seconds after failure_threshold
+    consecutive errors or SLO misses, or once a full sample shows more
+    than max_error_rate misses or a p90 latency over latency_slo. It is
+    then tried again with fresh statistics. When every model is demoted
+    the first to come back is used.
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        latency_slo: Optional[float] = None,
+        window: int = 20,
+        failure_threshold: int = 3,
+        max_error_rate: float = 0.5,
+        cooldown: float = 60.0
+    ):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.routes = [ModelRoute(model, window) for model in dict.fromkeys(models)]
+        # Attempts needed before error rate and p90 are trusted
+        self.min_samples = min(window, 10)
+        self.latency_slo = latency_slo
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._by_model = {route.model: route for route in self.routes}
+
+    @classmethod
+    def from_config(cls, config: Config) -> "ModelRouter":
+        routing = config.routing
+        return cls(
+            [config.api.model, *routing.fallback_models],
+            routing.latency_slo,
+            routing.window,
+            routing.failure_threshold,
+            routing.max_error_rate,
+            routing.cooldown
+        )
+
+    @property
+    def models(self) -> List[str]:
+        return [route.model for route in self.routes]
+
+    def pick(self, avoid: Iterable[str] = ()) -> ModelRoute:
+        """The first healthy model not in avoid; avoided models are only used as a last resort"""
+        if len(self.routes) == 1:
+            return self.routes[0]
+        now = time.monotonic()
+        avoid = set(avoid)
+        candidates = [r for r in self.routes if r.model not in avoid] or self.routes
+        for route in candidates:
+            if route.demoted_until <= now:
+                return route
+        return min(candidates, key=lambda r: r.demoted_until)
+
+    def record(self, model: str, latency: float, error: Optional[BaseException] = None):
+        """Add one attempt's outcome to model's statistics"""
+        route = self._by_model.get(model)
+        if route is None or isinstance(error, AuthenticationError):
+            return  # the key's fault, not the model's
+        slow = self.latency_slo is not None and latency > self.latency_slo
+        if isinstance(error, asyncio.CancelledError) and not slow:
+            return  # abandoned before it could count as slow
+        route.requests += 1
+        if error is None:
+            route.latencies.append(latency)
+
+        if error is None and not slow:
+            route.outcomes.append(True)
+            route.misses = 0
+            return
+        route.outcomes.append(False)
+        route.misses += 1
+        if len(self.routes) > 1 and (route.misses >= self.failure_threshold or self._degraded(route)):
+            route.demoted_until = time.monotonic() + self.cooldown
+            route.misses = 0
+            route.outcomes.clear()
+            route.latencies.clear()
+
+    def _degraded(self, route: ModelRoute) -> bool:
+        if len(route.outcomes) < self.min_samples:
+            return False
+        if route.error_rate > self.max_error_rate:
+            return True
+        p90 = route.latency()
+        return self.latency_slo is not None and p90 is not None and p90 > self.latency_slo
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "model": route.model,
+                "healthy": route.demoted_until <= now,
+                "demoted_for": max(0.0, route.demoted_until - now),
+                "requests": route.requests,
+                "error_rate": route.error_rate,
+                "p50": route.latency(0.5),
+                "p90": route.latency(0.9)
+            }
+            for route in self.routes
+        ]
@@ -0,0 +1,126 @@
+"""Incremental extraction of base64 image data from streamed API responses"""
+
+import binascii
+import json
+from typing import Any, BinaryIO, Optional
+
+from .errors import NoImageDataError, ResponseFormatError
+
+_MARKER = b'"data:image'
+_PLACEHOLDER = "__streamed_image__"
+
+
+class DataURLExtractor:
+    """Decode the first ``data:image`` URL of a JSON body chunk by chunk.
+
+    Feed raw response chunks to ``feed``. Everything outside the data URL is
+    kept as a small JSON skeleton with the URL swapped for a placeholder,
+    while the base64 payload is decoded straight into ``sink`` in 4-byte
+    aligned pieces. Only one chunk and the decoded image are ever resident,
+    instead of the body, its parsed string and its decoded copy together.
+    """
+
+    def __init__(self, sink: BinaryIO):
+        self.sink = sink
+        self.mime_type: Optional[str] = None
+        self.response_bytes = 0
+        self.decoded_bytes = 0
+        self._skeleton = bytearray()
+        self._pending = b""
+        self._header = bytearray()
+        self._b64_tail = b""
+        self._state = "scan"
+        self._found = False
+
+    def feed(self, chunk: bytes):
+        """Consume the next chunk of the response body"""
+        self.response_bytes += len(chunk)
+        data = self._pending + chunk
+        self._pending = b""
+
+        while data:
+            if self._state == "scan":
+                idx = -1 if self._found else data.find(_MARKER)
+                if idx == -1:
+                    # Hold back a possible partial marker for the next chunk
+                    keep = 0 if self._found else len(_MARKER) - 1
+                    split = max(0, len(data) - keep)
+                    self._skeleton += data[:split]
+                    self._pending = data[split:]
+                    return
+                if self._escaped(data, idx):
+                    # \"data:image inside some other string, e.g. the message text
+                    end = idx + len(_MARKER)
+                    self._skeleton += data[:end]
+                    data = data[end:]
+                    continue
+                self._skeleton += data[:idx]
+                data = data[idx + 1:]
+                self._state = "header"
+
+            elif self._state == "header":
+                comma = data.find(b",")
+                if comma == -1:
+                    self._header += data
+                    if len(self._header) > 256:
+                        raise ResponseFormatError("Malformed image data URL in response")
+                    return
+                self._header += data[:comma]
+                self.mime_type = (
+                    self._header.decode("ascii", "replace")
+                    .replace("\\/", "/").split(":", 1)[-1].split(";", 1)[0]
+                )
+                data = data[comma + 1:]
+                self._state = "base64"
+
+            else:
+                quote = data.find(b'"')
+                segment = data if quote == -1 else data[:quote]
+                # JSON may escape "/" as "\/"; base64 never contains a backslash
+                self._write_base64(segment.replace(b"\\", b""), final=quote != -1)
+                if quote == -1:
+                    return
+                self._skeleton += json.dumps(_PLACEHOLDER).encode()
+                data = data[quote + 1:]
+                self._found = True
+                self._state = "scan"
+
+    def _escaped(self, data: bytes, idx: int) -> bool:
+        """Whether the quote at data[idx] is escaped, counting backslashes back into the skeleton"""
+        run = len(data[:idx]) - len(data[:idx].rstrip(b"\\"))
+        if run == idx:
+            run += len(self._skeleton) - len(bytes(self._skeleton).rstrip(b"\\"))
+        return run % 2 == 1
+
+    def _write_base64(self, segment: bytes, final: bool):
+        buffered = self._b64_tail + segment
+        usable = len(buffered) if final else len(buffered) - len(buffered) % 4
+        self._b64_tail = buffered[usable:]
+        if usable:
+            try:
+                decoded = binascii.a2b_base64(buffered[:usable])
+            except binascii.Error as e:
+                raise ResponseFormatError(f"Invalid base64 image data: {e}")
+            self.sink.write(decoded)
+            self.decoded_bytes += len(decoded)
+
+    def close(self) -> Any:
+        """Finish the stream, check where the image was found and return the parsed skeleton"""
+        self._skeleton += self._pending
+        self._pending = b""
+        if self._state != "scan":
+            raise ResponseFormatError("Response ended inside image data")
+
+        try:
+            data = json.loads(bytes(self._skeleton))
+        except ValueError as e:
+            raise ResponseFormatError(f"Invalid JSON in API response: {e}")
+
+        message = data.get("choices", [{}])[0].get("message", {})
+        images = message.get("images") or [{}]
+        url = images[0].get("image_url", {}).get("url", "")
+        if not self._found or url != _PLACEHOLDER:
+            raise NoImageDataError("No image data in response")
+
+        self.sink.seek(0)
+        return data
@@ -0,0 +1,286 @@
+"""How API requests reach the network: live, recorded to a cassette, or replayed from one"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+from .config import TransportConfig
+from .errors import CassetteMissError
+from .utils import append_lines
+
+# Response headers worth replaying; everything else (cookies, request ids) is dropped
+RECORDED_HEADERS = ("Content-Type", "Retry-After")
+
+
+def fingerprint(url: str, payload: Dict[str, Any]) -> str:
+    """Identity of a request for record/replay: its URL and JSON body, never its headers or key"""
+    material = json.dumps([url, payload], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded API responses, by request fingerprint.
+
+    A directory holding index.jsonl, one line per response, and the
+    response bodies gzipped under bodies/ by content hash so repeats are
+    stored once. A request answered several times (say a 500 and then the
+    retry's 200) replays those answers in order, then repeats the last.
+    Re-recording a request replaces its earlier answers. A line torn by an
+    interrupted run is skipped on load and ended before the next append.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._entries: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = {}
+        self._recorded: set = set()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._entries is None:
+            self._entries = {}
+            index = self.path / "index.jsonl"
+            if index.exists():
+                with open(index, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # torn final write
+                        answers = self._entries.setdefault(record["fingerprint"], [])
+                        if record.get("seq") == 0:
+                            answers.clear()
+                        answers.append(record)
+        return self._entries
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def _body_path(self, digest: str) -> Path:
+        return self.path / "bodies" / digest[:2] / f"{digest}.gz"
+
+    def add(
+        self,
+        request_fingerprint: str,
+        status: int,
+        headers: Mapping[str, str],
+        body: bytes,
+        ttfb: float,
+        duration: float
+    ):
+        """Record one response; ttfb and duration are the seconds to its headers and last byte"""
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = self._body_path(digest)
+        if not body_path.exists():
+            body_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = body_path.with_name(f"{body_path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(body, compresslevel=6))
+            os.replace(tmp_path, body_path)
+
+        with self._lock:
+            answers = self._load().setdefault(request_fingerprint, [])
+            # The first answer recorded by this process starts the request's sequence afresh
+            if request_fingerprint not in self._recorded:
+                self._recorded.add(request_fingerprint)
+                answers.clear()
+            record = {
+                "fingerprint": request_fingerprint,
+                "seq": len(answers),
+                "status": status,
+                "headers": {k: headers[k] for k in RECORDED_HEADERS if k in headers},
+                "body": digest,
+                "bytes": len(body),
+                "ttfb": round(ttfb, 4),
+                "duration": round(duration, 4)
+            }
+            answers.append(record)
+            append_lines(str(self.path / "index.jsonl"), [json.dumps(record)])
+
+    def next(self, request_fingerprint: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """The next recorded answer to a request and its body, or None if it was never recorded"""
+        with self._lock:
+            answers = self._load().get(request_fingerprint)
+            if not answers:
+                return None
+            cursor = self._cursors.get(request_fingerprint, 0)
+            self._cursors[request_fingerprint] = cursor + 1
+            record = answers[min(cursor, len(answers) - 1)]
+        with open(self._body_path(record["body"]), "rb") as f:
+            return record, gzip.decompress(f.read())
+
+    def rewind(self):
+        """Replay every request's answers from the first again"""
+        with self._lock:
+            self._cursors.clear()
+
+
+class _LiveResponse:
+    """The parts of an aiohttp response the SDK reads"""
+
+    def __init__(self, response: Any):
+        self._response = response
+        self.status: int = response.status
+        self.headers: Mapping[str, str] = response.headers
+
+    async def read(self) -> bytes:
+        return await self._response.read()
+
+    async def text(self) -> str:
+        return await self._response.text()
+
+    def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        return self._response.content.iter_chunked(size)
+
+
+class _RecordingResponse:
+    """A response that keeps a copy of every byte read from it"""
+
+    def __init__(self, response: _LiveResponse):
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+        self.body = bytearray()
+        self.complete = False
+
+    async def read(self) -> bytes:
+        body = await self._response.read()
+        self.body += body
+        self.complete = True
+        return body
+
+    async def text(self) -> str:
+        text = await self._response.text()
+        self.body += text.encode("utf-8")
+        self.complete = True
+        return text
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        async for chunk in self._response.iter_chunked(size):
+            self.body += chunk
+            yield chunk
+        self.complete = True
+
+
+class _ReplayResponse:
+    """A recorded response, streamed back at the recorded (or configured) pace"""
+
+    def __init__(self, record: Dict[str, Any], body: bytes, transfer_time: float):
+        self.status: int = record["status"]
+        self.headers: Mapping[str, str] = record["headers"]
+        self._body = body
+        self._transfer_time = transfer_time
+
+    async def read(self) -> bytes:
+        if self._transfer_time > 0:
+            await asyncio.sleep(self._transfer_time)
+        return self._body
+
+    async def text(self) -> str:
+        return (await self.read()).decode("utf-8", errors="replace")
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        chunks = max(1, -(-len(self._body) // size))
+        pause = self._transfer_time / chunks
+        for start in range(0, len(self._body), size):
+            if pause > 0:
+                await asyncio.sleep(pause)
+            yield self._body[start:start + size]
+
+
+class Transport:
+    """Sends API requests over the generator's aiohttp session"""
+
+    live = True
+
+    @asynccontextmanager
+    async def post(
+        self,
+        session: Any,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: Any
+    ) -> AsyncIterator[Any]:
+        """POST payload as JSON, yielding a response with status, headers, read(), text() and iter_chunked()"""
+        async with session.post(url, headers=headers, json=payload, timeout=timeout) as response:
+            yield _LiveResponse(response)
+
+
+class RecordingTransport(Transport):
+    """Sends requests live and records every fully read response in a cassette"""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    @asynccontextmanager
+    async def post(self, session, url, headers, payload, timeout) -> AsyncIterator[Any]:
+        start = time.monotonic()
+        async with super().post(session, url, headers, payload, timeout) as response:
+            ttfb = time.monotonic() - start
+            recording = _RecordingResponse(response)
+            try:
+                yield recording
+            finally:
+                # Kept even if the caller rejected the body, so replay fails the same way;
+                # a partly read body is not
+                if recording.complete:
+                    self.cassette.add(
+                        fingerprint(url, payload),
+                        recording.status,
+                        recording.headers,
+                        bytes(recording.body),
+                        ttfb,
+                        time.monotonic() - start
+                    )
+
+
+class ReplayTransport(Transport):
+    """Answers requests from a cassette without touching the network.
+
+    latency, if set, replaces each response's recorded time to first byte
+    and transfer time is skipped; latency_scale multiplies whichever is
+    used, so 0 replays as fast as the pipeline can consume.
+    """
+
+    live = False
+
+    def __init__(self, cassette: Cassette, latency: Optional[float] = None, latency_scale: float = 1.0):
+        self.cassette = cassette
+        self.latency = latency
+        self.latency_scale = latency_scale
+
+    @asynccontextmanager
+    async def post(self, session, url, headers, payload, timeout) -> AsyncIterator[Any]:
+        request_fingerprint = fingerprint(url, payload)
+        answer = self.cassette.next(request_fingerprint)
+        if answer is None:
+            raise CassetteMissError(
+                f"No recorded response for request {request_fingerprint[:12]} in {self.cassette.path}"
+            )
+        record, body = answer
+        if self.latency is not None:
+            ttfb, transfer_time = self.latency, 0.0
+        else:
+            ttfb = record.get("ttfb", 0.0)
+            transfer_time = max(0.0, record.get("duration", ttfb) - ttfb)
+        if ttfb * self.latency_scale > 0:
+            await asyncio.sleep(ttfb * self.latency_scale)
+        yield _ReplayResponse(record, body, transfer_time * self.latency_scale)
+
+
+def make_transport(config: TransportConfig) -> Transport:
+    """The transport a TransportConfig describes"""
+    if config.mode == "live":
+        return Transport()
+    cassette = Cassette(config.cassette)
+    if config.mode == "record":
+        return RecordingTransport(cassette)
+    return ReplayTransport(cassette, config.latency, config.latency_scale)
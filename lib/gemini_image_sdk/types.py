@@ -1,6 +1,8 @@
 """Type definitions for the Gemini Image SDK"""
 
-from typing import Optional, List, Dict, Any
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Callable, Deque, Iterable
 from dataclasses import dataclass
 from enum import Enum
 
@@ -13,6 +15,18 @@ class GenerationStatus(Enum):
     FAILED = "failed"
 
 
+@dataclass
+class Rendition:
+    """Additional output file rendered from the same generated image"""
+    width: int
+    height: Optional[int] = None  # keeps the source aspect ratio when omitted
+    format: str = "webp"
+    quality: Optional[int] = None  # defaults to the prompt/output quality
+    suffix: Optional[str] = None  # defaults to "-{width}w"
+    fit: Optional[str] = None  # "stretch", "fit", "cover" or "crop"; defaults to the prompt's
+    resample: Optional[str] = None  # resampling filter name; defaults to the prompt's
+
+
 @dataclass
 class ImagePrompt:
     """Single image generation prompt"""
@@ -21,6 +35,14 @@ class ImagePrompt:
     filename: str
     dir: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: Optional[str] = None
+    quality: Optional[int] = None
+    renditions: Optional[List[Rendition]] = None
+    fit: Optional[str] = None  # defaults to config.output.fit
+    resample: Optional[str] = None  # defaults to config.output.resample
+    hedge: bool = False  # race a fallback model once config.routing.latency_slo passes
 
 
 @dataclass
@@ -38,26 +60,187 @@ class GenerationResult:
 @dataclass
 class BatchConfig:
     """Configuration for batch image generation"""
-    images: List[ImagePrompt]
+    images: List[ImagePrompt]  # generate_batch_iter also accepts any (async) iterable
     output_dir: Optional[str] = None
     delay_ms: int = 2000
     parallel: bool = False
-    max_workers: int = 3
+    max_workers: int = 3  # fixed limit, or the starting limit when adaptive
+    adaptive_concurrency: bool = False  # AIMD control driven by 429/5xx and latency
+    min_workers: int = 1
+    adaptive_max_workers: int = 16
+    journal_path: Optional[str] = None  # append-only checkpoint journal, enables resume
+    resume: bool = True  # skip images the journal records as completed and verified
+    memory_budget_bytes: Optional[int] = None  # cap on estimated bytes held by in-flight images
+
+
+@dataclass
+class StepResult:
+    """Outcome of one step of an agent chain"""
+    id: str
+    tool: str
+    output: Any = None
+    error: Optional[str] = None
+    started_ms: float = 0.0  # offset from the start of the chain
+    duration_ms: float = 0.0
 
 
 @dataclass
+class ChainResult:
+    """Per-step outcomes of an agent chain, in the order the steps were given"""
+    steps: Dict[str, StepResult]
+    duration_ms: float = 0.0
+    
+    @property
+    def success(self) -> bool:
+        return all(step.error is None for step in self.steps.values())
+    
+    @property
+    def results(self) -> List[GenerationResult]:
+        """Every GenerationResult produced by the chain, flattened in step order"""
+        results = []
+        for step in self.steps.values():
+            outputs = step.output if isinstance(step.output, list) else [step.output]
+            results.extend(o for o in outputs if isinstance(o, GenerationResult))
+        return results
+    
+    def output(self, step_id: str) -> Any:
+        return self.steps[step_id].output
+
+
+class Interaction:
+    """One prompt and its result; slotted so long histories stay small"""
+    
+    __slots__ = ("prompt", "result_id", "success", "timestamp", "result")
+    _FIELDS = ("prompt", "result_id", "success", "timestamp")
+    
+    def __init__(
+        self,
+        prompt: str,
+        result_id: str,
+        success: bool,
+        timestamp: Optional[float] = None,
+        result: Optional[GenerationResult] = None
+    ):
+        self.prompt = prompt
+        self.result_id = result_id
+        self.success = success
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.result = result  # kept for successful generations only
+    
+    def __getitem__(self, key: str) -> Any:
+        # Dict-style access, as history entries used to be plain dicts
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self._FIELDS else default
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self._FIELDS}
+    
+    def __repr__(self) -> str:
+        return f"Interaction({self.to_dict()!r})"
+
+
 class AgentMemory:
-    """Memory for conversation context in agent mode"""
-    conversation_history: List[Dict[str, str]]
-    generated_images: List[GenerationResult]
-    context: Dict[str, Any]
+    """Bounded memory for conversation context in agent mode.
+    
+    Only the latest max_entries interactions and images are kept (None
+    keeps everything). total_interactions and total_images keep counting
+    past the window, so they are safe to number files with. Memory loaded
+    from disk is parsed on first access.
+    """
+    
+    def __init__(
+        self,
+        conversation_history: Optional[Iterable[Any]] = None,
+        generated_images: Optional[Iterable[GenerationResult]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        max_entries: Optional[int] = 1000
+    ):
+        self.max_entries = max_entries
+        self._history: Deque[Interaction] = deque(maxlen=max_entries)
+        self._images: Deque[GenerationResult] = deque(maxlen=max_entries)
+        self._context: Dict[str, Any] = {}
+        self._loader: Optional[Callable[[], None]] = None
+        # Interactions not yet written by MemoryLog.save
+        self.unsaved: Deque[Interaction] = deque(maxlen=max_entries)
+        self.total_interactions = 0
+        self.total_images = 0
+        self.replace(conversation_history or [], generated_images or [], context or {})
+    
+    def replace(
+        self,
+        conversation_history: Iterable[Any],
+        generated_images: Iterable[GenerationResult],
+        context: Dict[str, Any],
+        total_interactions: Optional[int] = None,
+        total_images: Optional[int] = None
+    ):
+        """Swap in new contents, e.g. when restoring from disk"""
+        self._history = deque(
+            (entry if isinstance(entry, Interaction) else Interaction(
+                entry.get("prompt", ""),
+                entry.get("result_id", ""),
+                entry.get("success", False),
+                entry.get("timestamp")
+            ) for entry in conversation_history),
+            maxlen=self.max_entries
+        )
+        self._images = deque(generated_images, maxlen=self.max_entries)
+        self._context = context
+        self.total_interactions = max(total_interactions or 0, len(self._history))
+        self.total_images = max(total_images or 0, len(self._images))
+    
+    def set_loader(self, loader: Callable[[], None]):
+        """Defer restoring memory until it is first read; loader calls replace()"""
+        self._loader = loader
+    
+    def _materialize(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            loader()
+    
+    @property
+    def conversation_history(self) -> Deque[Interaction]:
+        self._materialize()
+        return self._history
+    
+    @conversation_history.setter
+    def conversation_history(self, value: Iterable[Any]):
+        self._materialize()
+        self.replace(value, self._images, self._context, total_images=self.total_images)
+    
+    @property
+    def generated_images(self) -> Deque[GenerationResult]:
+        self._materialize()
+        return self._images
+    
+    @generated_images.setter
+    def generated_images(self, value: Iterable[GenerationResult]):
+        self._materialize()
+        self.replace(self._history, value, self._context, total_interactions=self.total_interactions)
+    
+    @property
+    def context(self) -> Dict[str, Any]:
+        self._materialize()
+        return self._context
+    
+    @context.setter
+    def context(self, value: Dict[str, Any]):
+        self._materialize()
+        self._context = value
     
     def add_interaction(self, prompt: str, result: GenerationResult):
         """Add an interaction to memory"""
-        self.conversation_history.append({
-            "prompt": prompt,
-            "result_id": result.id,
-            "success": result.success
-        })
+        self._materialize()
+        interaction = Interaction(
+            prompt, result.id, result.success, result=result if result.success else None
+        )
+        self._history.append(interaction)
+        self.total_interactions += 1
         if result.success:
-            self.generated_images.append(result)
\ No newline at end of file
+            self._images.append(result)
+            self.total_images += 1
+        self.unsaved.append(interaction)
@@ -0,0 +1,42 @@
+"""Small helpers shared across the SDK's modules"""
+
+import os
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Iterable, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+
+async def aenumerate(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[Tuple[int, T]]:
+    """enumerate() over a sync or async iterable"""
+    index = 0
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield index, item
+            index += 1
+    else:
+        for item in items:
+            yield index, item
+            index += 1
+
+
+def append_lines(path: str, lines: Iterable[str], fsync: bool = False):
+    """Append lines to a JSON-lines file, first ending a line torn by an interrupted write.
+
+    Without that newline the first new line would be glued onto the torn
+    one and both would be skipped on load.
+    """
+    data = "".join(line + "\n" for line in lines).encode("utf-8")
+    if not data:
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab+") as f:
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                data = b"\n" + data
+        # Append mode writes at the end whatever the read position
+        f.write(data)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
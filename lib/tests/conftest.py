@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import io
+import json
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gemini_image_sdk import APIConfig, Config, Transport
+
+
+def make_png(shade: int = 0, size: int = 64) -> bytes:
+    """A gradient PNG; different shades give images far apart in dhash"""
+    from PIL import Image
+
+    image = Image.linear_gradient("L").resize((size, size))
+    if shade:
+        image = image.rotate(90 * shade)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def image_body(png: bytes) -> bytes:
+    url = "data:image/png;base64," + base64.b64encode(png).decode()
+    return json.dumps({"choices": [{"message": {"images": [{"image_url": {"url": url}}]}}]}).encode()
+
+
+class FakeResponse:
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    async def text(self):
+        return self._body.decode()
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self._body), size):
+            yield self._body[start:start + size]
+
+
+class FakeAPI(Transport):
+    """Answers API requests in-process, recording each as (model, prompt, key).
+
+    respond(payload, call_number) returns a status, a body and optionally
+    headers; by default every request gets the same image.
+    """
+
+    live = False
+
+    def __init__(self, respond=None, delay=0.0):
+        self.respond = respond or (lambda payload, n: (200, image_body(make_png())))
+        self.delay = delay
+        self.calls = []
+
+    @asynccontextmanager
+    async def post(self, session, url, headers, payload, timeout):
+        self.calls.append((payload["model"], payload["messages"][-1]["content"], headers["Authorization"]))
+        delay = self.delay(payload) if callable(self.delay) else self.delay
+        if delay:
+            await asyncio.sleep(delay)
+        yield FakeResponse(*self.respond(payload, len(self.calls)))
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Quiet config writing under tmp_path, with no cache and no network warm-up"""
+    config = Config(api=APIConfig(key="test-key"), logging_enabled=False, cache_enabled=False)
+    config.output.base_dir = str(tmp_path / "out")
+    config.output.width = 32
+    config.output.height = 32
+    config.http.warmup = False
+    config.rate_limit.requests_per_minute = 60000
+    config.rate_limit.burst = 100
+    config.rate_limit.retry_delay_ms = 1
+    return config
@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+import pytest
+from conftest import FakeAPI
+
+from gemini_image_sdk import GenerationResult, ImageGeneratorAgent
+
+
+@pytest.fixture
+def agent(config):
+    config.enhancer.enabled = False
+    agent = ImageGeneratorAgent(config)
+    agent.generator.transport = FakeAPI()
+    return agent
+
+
+def test_execute_chain_returns_enhanced_prompts(agent):
+    chain = [
+        {"tool": "enhance_prompt", "params": {"base_prompt": "a fox"}},
+        {"tool": "enhance_prompt", "params": {"base_prompt": "a hen"}}
+    ]
+    outputs = asyncio.run(agent.execute_chain(chain))
+    assert len(outputs) == 2
+    assert outputs[0].startswith("a fox, ") and outputs[1].startswith("a hen, ")
+
+
+def test_execute_chain_flattens_outputs_in_step_order(agent):
+    chain = [
+        {"id": "prompt", "tool": "enhance_prompt", "params": {"base_prompt": "a fox"}},
+        {"tool": "generate_variations", "params": {"base_prompt": "$prompt", "count": 2}}
+    ]
+    outputs = asyncio.run(agent.execute_chain(chain))
+    assert isinstance(outputs[0], str)
+    assert [type(o) for o in outputs[1:]] == [GenerationResult, GenerationResult]
+
+
+def test_style_transfer_of_a_resolved_prompt_gets_a_short_filename(agent):
+    chain = [
+        {"id": "prompt", "tool": "enhance_prompt", "params": {"base_prompt": "a fox in a misty forest at dawn"}},
+        {"id": "styled", "tool": "style_transfer", "params": {"prompt": "$prompt", "style": "anime"}}
+    ]
+    result = asyncio.run(agent.execute_dag(chain))
+    image = result.output("styled")
+    assert result.success
+    assert image.filename.startswith("anime_") and len(image.filename) <= 40
+    assert os.path.exists(image.path)
+
+
+def test_failed_step_skips_its_dependents(agent):
+    chain = [
+        {"id": "broken", "tool": "no_such_tool"},
+        {"id": "after", "tool": "enhance_prompt", "params": {"base_prompt": "x"}, "depends_on": ["broken"]}
+    ]
+    result = asyncio.run(agent.execute_dag(chain))
+    assert result.steps["broken"].error == "Unknown tool: no_such_tool"
+    assert result.steps["after"].error.startswith("Skipped")
+    assert asyncio.run(agent.execute_chain(chain)) == []
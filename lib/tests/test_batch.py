@@ -0,0 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from conftest import FakeAPI
+
+from gemini_image_sdk import BatchConfig, ImageGenerator, ImagePrompt
+
+
+class CountingAPI(FakeAPI):
+    """FakeAPI that tracks how many calls are in flight at once"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.peak = 0
+
+    @asynccontextmanager
+    async def post(self, session, url, headers, payload, timeout):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            async with super().post(session, url, headers, payload, timeout) as response:
+                yield response
+        finally:
+            self.in_flight -= 1
+
+
+def _batch(count, **kwargs):
+    images = [ImagePrompt(id=str(i), prompt=f"scene {i}", filename=f"{i}.webp") for i in range(count)]
+    return BatchConfig(images=images, parallel=True, **kwargs)
+
+
+async def _consume(generator, batch_config):
+    return [result async for result in generator.generate_batch_iter(batch_config)]
+
+
+def test_iter_stays_within_fixed_max_workers(config):
+    api = CountingAPI(delay=0.005)
+    results = asyncio.run(_consume(ImageGenerator(config, transport=api), _batch(20, max_workers=3)))
+    assert len(results) == 20 and all(r.success for r in results)
+    assert api.peak == 3
+
+
+def test_iter_lets_adaptive_concurrency_use_its_headroom(config):
+    api = CountingAPI(delay=0.005)
+    generator = ImageGenerator(config, transport=api)
+    batch_config = _batch(200, max_workers=2, adaptive_concurrency=True, adaptive_max_workers=8)
+    results = asyncio.run(_consume(generator, batch_config))
+
+    assert all(r.success for r in results)
+    assert generator.concurrency_limiter.limit > 4
+    # Twice max_workers used to cap dispatches at 4 whatever the limit grew to
+    assert api.peak > 4
@@ -0,0 +1,64 @@
+import asyncio
+
+from conftest import FakeAPI
+
+from gemini_image_sdk import ImageCache, ImageGenerator, Rendition
+
+
+def _cache_with(tmp_path, **entries):
+    cache = ImageCache(str(tmp_path / "cache"))
+    for key, data in entries.items():
+        source = tmp_path / f"{key}.src"
+        source.write_bytes(data)
+        cache.put(key, str(source))
+    return cache
+
+
+def test_partial_hit_writes_nothing_and_counts_one_miss(tmp_path):
+    cache = _cache_with(tmp_path, main=b"main")
+    out = tmp_path / "out"
+    candidates = [[("main", str(out / "a.webp")), ("thumb", str(out / "a-thumb.webp"))]] * 2
+
+    assert cache.get_first(candidates) is None
+    assert not out.exists()
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 0
+
+
+def test_first_complete_candidate_wins(tmp_path):
+    cache = _cache_with(tmp_path, a1=b"a1", b1=b"b1", b2=b"b2")
+    out = tmp_path / "out"
+    candidates = [
+        [("a1", str(out / "1")), ("a2", str(out / "2"))],
+        [("b1", str(out / "1")), ("b2", str(out / "2"))]
+    ]
+
+    assert cache.get_first(candidates) == 1
+    assert (out / "1").read_bytes() == b"b1" and (out / "2").read_bytes() == b"b2"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 0
+
+
+def test_vanished_file_is_a_miss(tmp_path):
+    cache = _cache_with(tmp_path, main=b"main")
+    cache.stats()
+    for path in (tmp_path / "cache").rglob("main"):
+        path.unlink()
+    assert not cache.get("main", str(tmp_path / "out.webp"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_generation_counts_one_lookup_across_models_and_renditions(config, tmp_path):
+    config.cache_enabled = True
+    config.cache_dir = str(tmp_path / "cache")
+    config.routing.fallback_models = ["backup-1", "backup-2"]
+    generator = ImageGenerator(config, transport=FakeAPI())
+    renditions = [Rendition(width=16, height=16, suffix="-sm"), Rendition(width=8, height=8, suffix="-xs")]
+
+    async def twice():
+        first = await generator.generate_single("a fox", "fox.webp", renditions=renditions)
+        second = await generator.generate_single("a fox", "fox.webp", renditions=renditions)
+        return first, second
+
+    first, second = asyncio.run(twice())
+    assert first.metadata["cache"] == "miss" and second.metadata["cache"] == "hit"
+    stats = generator.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,26 @@
+import io
+import json
+
+import pytest
+
+from gemini_image_sdk.cli import _iter_records
+
+
+def test_reading_stdin_leaves_it_open(monkeypatch):
+    stdin = io.StringIO('{"prompt": "a fox"}\n# comment\n\n{"prompt": "a hen"}\n')
+    monkeypatch.setattr("sys.stdin", stdin)
+    assert [r["prompt"] for r in _iter_records("-")] == ["a fox", "a hen"]
+    assert not stdin.closed
+
+
+def test_manifest_file_records_stream_in_order(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text("\n".join(json.dumps({"id": str(i), "prompt": f"p{i}"}) for i in range(3)))
+    assert [r["id"] for r in _iter_records(str(path))] == ["0", "1", "2"]
+
+
+def test_invalid_line_names_its_location(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('{"prompt": "ok"}\n{broken\n')
+    with pytest.raises(SystemExit, match=r"prompts.jsonl:2: invalid JSON"):
+        list(_iter_records(str(path)))
@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+from conftest import FakeAPI
+
+from gemini_image_sdk import ImageGenerator
+
+
+def _generate_together(generator, prompt, filenames):
+    async def main():
+        async with generator:
+            return await asyncio.gather(*(generator.generate_single(prompt, name) for name in filenames))
+
+    return asyncio.run(main())
+
+
+def test_identical_prompts_share_one_call(config):
+    api = FakeAPI(delay=0.05)
+    generator = ImageGenerator(config, transport=api)
+    results = _generate_together(generator, "a lighthouse", ["a.webp", "b.webp", "c.webp"])
+
+    assert len(api.calls) == 1
+    assert all(r.success for r in results)
+    assert [bool((r.metadata or {}).get("coalesced")) for r in results].count(True) == 2
+    assert all(os.path.exists(r.path) for r in results)
+
+
+def test_leader_failure_fails_followers(config):
+    api = FakeAPI(respond=lambda payload, n: (400, b"bad request"), delay=0.05)
+    generator = ImageGenerator(config, transport=api)
+    results = _generate_together(generator, "a lighthouse", ["a.webp", "b.webp"])
+
+    assert len(api.calls) == 1
+    assert not any(r.success for r in results)
+
+
+def test_coalesced_copies_are_not_flagged_as_duplicates(config, tmp_path):
+    config.dedup.index_path = str(tmp_path / "index.jsonl")
+    api = FakeAPI(delay=0.05)
+    generator = ImageGenerator(config, transport=api)
+    results = _generate_together(generator, "a lighthouse", ["a.webp", "b.webp", "c.webp"])
+
+    assert all(r.success for r in results)
+    assert not any("duplicate_of" in r.metadata for r in results)
+    assert len(generator.phash_index) == 3
+
+
+def test_skipped_duplicate_leader_does_not_break_followers(config, tmp_path):
+    config.dedup.index_path = str(tmp_path / "index.jsonl")
+    config.dedup.policy = "skip"
+    api = FakeAPI(delay=0.05)
+    generator = ImageGenerator(config, transport=api)
+    first = asyncio.run(generator.generate_single("the original", "original.webp"))
+
+    results = _generate_together(generator, "the same again", ["again0.webp", "again1.webp", "again2.webp"])
+
+    assert len(api.calls) == 2
+    for result in results:
+        assert result.success, result.error
+        assert result.metadata["skipped"] == "duplicate"
+        assert result.metadata["duplicate_of"] == first.path
+        assert result.path == first.path
+    assert not any(os.path.exists(os.path.join(config.output.base_dir, f"again{i}.webp")) for i in range(3))
+
+
+def _caching_dedup(config, tmp_path, policy):
+    config.cache_enabled = True
+    config.cache_dir = str(tmp_path / "cache")
+    config.dedup.index_path = str(tmp_path / "index.jsonl")
+    config.dedup.policy = policy
+
+
+def test_skipped_duplicate_stays_skipped_on_rerun(config, tmp_path):
+    _caching_dedup(config, tmp_path, "skip")
+    api = FakeAPI()
+    generator = ImageGenerator(config, transport=api)
+    first = asyncio.run(generator.generate_single("the original", "a.webp"))
+    skipped = asyncio.run(generator.generate_single("the same again", "b.webp"))
+    assert skipped.metadata["skipped"] == "duplicate"
+
+    rerun = asyncio.run(generator.generate_single("the same again", "b.webp"))
+    assert rerun.metadata["cache"] == "miss"
+    assert rerun.metadata["skipped"] == "duplicate"
+    assert rerun.path == first.path
+    assert not os.path.exists(os.path.join(config.output.base_dir, "b.webp"))
+
+
+def test_cache_hits_are_checked_against_the_index(config, tmp_path):
+    _caching_dedup(config, tmp_path, "flag")
+    generator = ImageGenerator(config, transport=FakeAPI())
+    asyncio.run(generator.generate_single("a lighthouse", "a.webp"))
+    other = tmp_path / "other"
+    restored = asyncio.run(generator.generate_single("a lighthouse", "a.webp", output_dir=str(other)))
+
+    assert restored.metadata["cache"] == "hit"
+    assert restored.metadata["duplicate_of"] == os.path.join(config.output.base_dir, "a.webp")
+    assert str(other / "a.webp") in generator.phash_index
@@ -0,0 +1,74 @@
+import asyncio
+
+from gemini_image_sdk import AdaptiveConcurrencyLimiter, MemoryBudget, RateLimitError
+
+
+def test_limit_grows_on_success_and_halves_on_throttling():
+    limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=16, window=4, cooldown_s=0)
+    for _ in range(40):
+        limiter.record(0.1)
+    grown = limiter.limit
+    assert grown > 4
+
+    limiter.record(0.1, RateLimitError(429, "slow down"))
+    assert limiter.limit == grown // 2
+
+
+def test_lasting_latency_shift_becomes_the_new_baseline():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, min_limit=1, window=4, cooldown_s=0)
+    # One lucky fast window, then the service settles at 10x slower
+    for _ in range(4):
+        limiter.record(0.01)
+    for _ in range(200):
+        limiter.record(0.1)
+
+    assert limiter.stats()["baseline_p95_ms"] >= 50
+    # Cut while the shift was new, then allowed to grow back
+    assert limiter.decreases >= 1
+    assert limiter.limit > 1
+
+
+def test_faster_p95_lowers_the_baseline_at_once():
+    limiter = AdaptiveConcurrencyLimiter(window=4)
+    for _ in range(4):
+        limiter.record(0.2)
+    for _ in range(4):
+        limiter.record(0.05)
+    assert limiter.stats()["baseline_p95_ms"] == 50
+
+
+def test_waiters_are_admitted_up_to_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, max_limit=2)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+def test_memory_budget_queues_in_order_and_admits_oversized_alone():
+    budget = MemoryBudget(100)
+    order = []
+
+    async def hold(name, nbytes):
+        await budget.acquire(nbytes)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        budget.release(nbytes)
+
+    async def main():
+        await asyncio.gather(hold("a", 60), hold("b", 60), hold("huge", 500), hold("c", 10))
+
+    asyncio.run(main())
+    assert order == ["a", "b", "huge", "c"]
+    assert budget.in_use == 0
+    assert budget.peak == 500
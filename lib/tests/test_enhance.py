@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from conftest import FakeAPI
+
+from gemini_image_sdk import APIConfig, ImageGenerator, ImagePrompt, PromptEnhancer
+from gemini_image_sdk.enhance import PromptCache
+
+
+def _text(content):
+    return json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+
+
+def test_prompt_cache_skips_malformed_lines(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text(
+        json.dumps({"key": "a", "prompt": "first"}) + "\n"
+        + "[1, 2]\n"
+        + json.dumps({"other": "tool"}) + "\n"
+        + '{"key": "torn\n'
+        + json.dumps({"key": "a", "prompt": "latest"}) + "\n"
+    )
+    cache = PromptCache(str(path))
+    assert cache.get("a") == "latest"
+    assert cache.get("other") is None
+
+
+def test_enhancer_uses_the_key_pool(config):
+    config.api = APIConfig(keys=["key-busy", "key-free"])
+    config.enhancer.cache_enabled = False
+
+    def respond(payload, call):
+        return 200, _text("a detailed fox")
+
+    api = FakeAPI(respond=respond)
+    generator = ImageGenerator(config, transport=api)
+    enhancer = PromptEnhancer(generator)
+
+    async def main():
+        async with generator:
+            return await asyncio.gather(*(enhancer.enhance(f"fox {i}") for i in range(4)))
+
+    assert asyncio.run(main()) == ["a detailed fox"] * 4
+    stats = {key["key"]: key for key in generator.key_pool.stats()}
+    assert sum(key["requests"] for key in stats.values()) == 4
+    assert all(key["in_flight"] == 0 for key in stats.values())
+
+
+def test_enhancer_fails_over_from_a_throttled_key(config):
+    config.api = APIConfig(keys=["key-busy", "key-free"])
+    config.enhancer.cache_enabled = False
+    config.enhancer.fallback_on_error = False
+
+    def respond(payload, call):
+        if call == 1:
+            return 429, b"slow down", {"Retry-After": "30"}
+        return 200, _text("a detailed fox")
+
+    api = FakeAPI(respond=respond)
+    generator = ImageGenerator(config, transport=api)
+    enhancer = PromptEnhancer(generator)
+
+    assert asyncio.run(enhancer.enhance("fox")) == "a detailed fox"
+    assert api.calls[0][2] != api.calls[1][2]
+    assert generator.key_pool.healthy_count() == 1
+    assert sum(key["failures"] for key in generator.key_pool.stats()) == 1
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_enhance_prompts_keeps_order_and_description(config):
+    config.enhancer.cache_enabled = False
+    api = FakeAPI(respond=lambda payload, call: (200, _text(payload["messages"][-1]["content"][-12:])))
+    generator = ImageGenerator(config, transport=api)
+    enhancer = PromptEnhancer(generator)
+    images = [ImagePrompt(id=str(i), prompt=f"p{i}", filename=f"{i}.webp") for i in range(5)]
+
+    enhanced = asyncio.run(_collect(enhancer.enhance_prompts(images)))
+    assert [image.id for image in enhanced] == ["0", "1", "2", "3", "4"]
+    assert [image.metadata["description"] for image in enhanced] == ["p0", "p1", "p2", "p3", "p4"]
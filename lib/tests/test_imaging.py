@@ -0,0 +1,48 @@
+import io
+
+from PIL import Image
+
+from gemini_image_sdk import ImageCache
+from gemini_image_sdk.config import ProcessingConfig
+from gemini_image_sdk.imaging import OutputSpec, render_image, resize_image
+
+
+def _source(width=1024, height=1024):
+    return Image.linear_gradient("L").resize((width, height)).convert("RGB")
+
+
+def test_reducing_gap_is_opt_in():
+    assert ProcessingConfig().reducing_gap is None
+
+
+def test_small_downscales_resize_exactly_with_a_gap():
+    source = _source()
+    exact = resize_image(source, 800, 600, "cover")
+    gapped = resize_image(source, 800, 600, "cover", reducing_gap=2.0)
+    assert gapped.tobytes() == exact.tobytes()
+
+
+def test_large_downscales_use_reduce():
+    source = _source()
+    gapped = resize_image(source, 100, 100, reducing_gap=2.0)
+    assert gapped.size == (100, 100)
+    assert gapped.tobytes() != resize_image(source, 100, 100).tobytes()
+
+
+def test_jpeg_draft_only_with_a_gap(tmp_path):
+    buffer = io.BytesIO()
+    _source(2048, 2048).save(buffer, "JPEG", quality=90)
+    jpeg = buffer.getvalue()
+    spec = OutputSpec(str(tmp_path / "out.png"), 128, 128, "png", 90)
+
+    render_image(jpeg, [spec])
+    exact = Image.open(spec.path).tobytes()
+    render_image(jpeg, [spec], reducing_gap=2.0)
+    assert Image.open(spec.path).tobytes() != exact
+
+
+def test_cache_key_includes_reducing_gap():
+    base = ("model", "prompt", 800, 600, "webp", 90, "stretch", "lanczos")
+    assert ImageCache.make_key(*base) == ImageCache.make_key(*base, None)
+    assert ImageCache.make_key(*base) != ImageCache.make_key(*base, 2.0)
+    assert ImageCache.make_key(*base, 2.0) != ImageCache.make_key(*base, 3.0)
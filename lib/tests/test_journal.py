@@ -0,0 +1,83 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import FakeAPI, image_body, make_png
+
+from gemini_image_sdk import BatchConfig, GenerationResult, ImageGenerator, ImagePrompt
+from gemini_image_sdk.journal import BatchJournal
+
+
+def _written(tmp_path, name, data=b"pixels"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return GenerationResult(success=True, id=name, filename=name, path=str(path))
+
+
+def test_completed_record_verifies_its_files(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("a", _written(tmp_path, "a.webp"))
+    journal.record("b", GenerationResult(success=False, id="b", filename="b.webp", error="boom"))
+
+    reopened = BatchJournal(journal.path)
+    assert reopened.completed("a")["outputs"][0]["path"] == str(tmp_path / "a.webp")
+    assert reopened.completed("b") is None
+
+    (tmp_path / "a.webp").write_bytes(b"tampered")
+    assert BatchJournal(journal.path).completed("a") is None
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("a", _written(tmp_path, "a.webp"))
+    with open(journal.path, "a") as f:
+        f.write('{"id": "b", "status": "comp')
+
+    reopened = BatchJournal(journal.path)
+    assert set(reopened.load()) == {"a"}
+    assert reopened.completed("a")
+
+    # The first record after the crash is not glued onto the torn line
+    reopened.record("c", _written(tmp_path, "c.webp"))
+    assert set(BatchJournal(journal.path).load()) == {"a", "c"}
+
+
+def test_record_after_a_torn_first_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"id": "a", "status": "completed"')
+    BatchJournal(str(path)).record("b", _written(tmp_path, "b.webp"))
+    assert set(BatchJournal(str(path)).load()) == {"b"}
+
+
+def test_records_from_many_threads_stay_whole(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    results = [_written(tmp_path, f"{i}.webp", bytes([i]) * 1000) for i in range(32)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda r: journal.record(r.id, r), results))
+
+    with open(journal.path) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 32
+    assert len(journal.load()) == 32
+    assert all(BatchJournal(journal.path).completed(r.id) for r in results)
+
+
+def test_resumed_batch_only_regenerates_what_did_not_complete(config, tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    images = [ImagePrompt(id=str(i), prompt=f"scene {i}", filename=f"{i}.webp") for i in range(4)]
+
+    def fail_scene_two(payload, call):
+        if "scene 2" in json.dumps(payload):
+            return 400, b"bad request"
+        return 200, image_body(make_png(call))
+
+    batch = BatchConfig(images=images, parallel=True, max_workers=4, journal_path=journal_path)
+    first = asyncio.run(ImageGenerator(config, transport=FakeAPI(respond=fail_scene_two)).generate_batch(batch))
+    assert [r.success for r in first] == [True, True, False, True]
+
+    api = FakeAPI()
+    second = asyncio.run(ImageGenerator(config, transport=api).generate_batch(batch))
+    assert all(r.success for r in second)
+    assert len(api.calls) == 1
+    assert [bool(r.metadata and r.metadata.get("resumed")) for r in second] == [True, True, False, True]
+    assert [r.path for i, r in enumerate(second) if i != 2] == [r.path for i, r in enumerate(first) if i != 2]
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from gemini_image_sdk import (
+    APIKey,
+    AuthenticationError,
+    FileRateLimiter,
+    KeyPool,
+    RateLimitError,
+    RateLimiter,
+    ServerError
+)
+
+
+def _pool(*names, **kwargs):
+    return KeyPool([APIKey(name, RateLimiter(60000, burst=10)) for name in names], **kwargs)
+
+
+def test_acquire_spreads_in_flight_requests():
+    pool = _pool("key-a", "key-b")
+
+    async def main():
+        return [(await pool.acquire())[0] for _ in range(4)]
+
+    keys = asyncio.run(main())
+    assert sorted(k.key for k in keys) == ["key-a", "key-a", "key-b", "key-b"]
+    for key in keys:
+        pool.release(key)
+    assert all(k["in_flight"] == 0 for k in pool.stats())
+
+
+def test_rate_limited_key_sits_out_for_retry_after():
+    pool = _pool("key-a", "key-b", cooldown=1.0)
+    key = pool.keys[0]
+    key.in_flight = 1
+    assert pool.release(key, RateLimitError(429, "slow down", retry_after=30))
+    assert 29 < pool.stats()[0]["sidelined_for"] <= 30
+    assert pool.can_failover(key.last_error)
+    assert pool.pick() is pool.keys[1]
+
+
+def test_server_errors_do_not_sideline_a_key():
+    pool = _pool("key-a", "key-b")
+    key = pool.keys[0]
+    key.in_flight = 1
+    assert not pool.release(key, ServerError(503, "busy"))
+    assert pool.healthy_count() == 2
+    assert not pool.can_failover(ServerError(503, "busy"))
+
+
+def test_single_key_is_never_sidelined():
+    pool = _pool("key-a")
+    key = pool.keys[0]
+    key.in_flight = 1
+    assert not pool.release(key, RateLimitError(429, "slow down", retry_after=30))
+    assert pool.healthy_count() == 1
+    assert not pool.can_failover(RateLimitError(429, "slow down"))
+
+
+def test_acquire_raises_once_every_key_is_rejected():
+    pool = _pool("key-a", "key-b")
+    for key in pool.keys:
+        key.in_flight = 1
+        pool.release(key, AuthenticationError(401, "bad key"))
+
+    with pytest.raises(AuthenticationError):
+        asyncio.run(pool.acquire())
+
+
+def test_pick_probes_file_limiters_without_writing(tmp_path):
+    limiters = [FileRateLimiter(str(tmp_path / f"{i}.json"), 60, burst=2) for i in range(3)]
+    pool = KeyPool([APIKey(f"key-{i}", limiter) for i, limiter in enumerate(limiters)])
+    for _ in range(5):
+        pool.pick()
+    assert list(tmp_path.iterdir()) == []
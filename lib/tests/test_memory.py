@@ -0,0 +1,134 @@
+import json
+
+from gemini_image_sdk import GenerationResult, ImageGeneratorAgent
+from gemini_image_sdk.memory import MemoryLog
+from gemini_image_sdk.types import AgentMemory
+
+
+def _result(n, success=True):
+    return GenerationResult(success=success, id=f"img{n}", filename=f"img{n}.webp", path=f"/out/img{n}.webp")
+
+
+def _add(memory, start, stop):
+    # Every other generation succeeds
+    for n in range(start, stop):
+        memory.add_interaction(f"prompt {n}", _result(n, success=n % 2 == 1))
+
+
+def _reload(path, window):
+    memory = AgentMemory(max_entries=window)
+    assert MemoryLog(path).load(memory)
+    return memory
+
+
+def _snapshot(memory):
+    return (
+        [(i.prompt, i.success, i.result.id if i.result else None) for i in memory.conversation_history],
+        [image.id for image in memory.generated_images],
+        memory.context,
+        memory.total_interactions,
+        memory.total_images
+    )
+
+
+def test_appended_saves_round_trip(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    memory = AgentMemory(max_entries=5)
+    log = MemoryLog(path)
+    _add(memory, 0, 3)
+    log.save(memory)
+    _add(memory, 3, 10)
+    memory.context["preferred_style"] = "watercolor"
+    log.save(memory)
+
+    reloaded = _reload(path, 5)
+    assert _snapshot(reloaded) == _snapshot(memory)
+    assert [image.id for image in reloaded.generated_images] == ["img1", "img3", "img5", "img7", "img9"]
+    # Interactions and the image window share one result object
+    assert reloaded.conversation_history[-1].result is reloaded.generated_images[-1]
+
+
+def test_compaction_keeps_the_image_window(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    memory = AgentMemory(max_entries=5)
+    log = MemoryLog(path, min_compact_lines=1)
+    for n in range(40):
+        _add(memory, n, n + 1)
+        log.save(memory)
+
+    with open(path) as f:
+        assert sum(1 for _ in f) <= 2 * 2 * 5 + 1
+    reloaded = _reload(path, 5)
+    assert _snapshot(reloaded) == _snapshot(memory)
+    assert len(reloaded.generated_images) == 5
+
+
+def test_many_unsaved_interactions_still_save_every_image(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    memory = AgentMemory(max_entries=5)
+    log = MemoryLog(path)
+    _add(memory, 0, 2)
+    log.save(memory)
+    # More than the window between saves
+    _add(memory, 2, 20)
+    log.save(memory)
+    assert _snapshot(_reload(path, 5)) == _snapshot(memory)
+
+
+def test_numbering_continues_after_reload(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    memory = AgentMemory(max_entries=5)
+    MemoryLog(path).save(memory)
+    _add(memory, 0, 4)
+    MemoryLog(path).save(memory)
+
+    reloaded = AgentMemory(max_entries=5)
+    log = MemoryLog(path)
+    log.load(reloaded)
+    assert (reloaded.total_interactions, reloaded.total_images) == (4, 2)
+    _add(reloaded, 4, 6)
+    log.save(reloaded)
+    assert _reload(path, 5).total_images == 3
+
+
+def test_torn_final_line_is_ignored_and_rewritten(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    memory = AgentMemory(max_entries=5)
+    _add(memory, 0, 4)
+    MemoryLog(path).save(memory)
+    with open(path, "a") as f:
+        f.write('{"type": "interaction", "prompt": "half')
+
+    reloaded = AgentMemory(max_entries=5)
+    log = MemoryLog(path)
+    log.load(reloaded)
+    assert len(reloaded.conversation_history) == 4
+    _add(reloaded, 4, 5)
+    log.save(reloaded)
+
+    with open(path) as f:
+        assert all(json.loads(line) for line in f)
+    assert _snapshot(_reload(path, 5)) == _snapshot(reloaded)
+
+
+def test_old_json_dump_is_migrated(config, tmp_path):
+    path = tmp_path / "memory.json"
+    path.write_text(json.dumps({
+        "conversation_history": [
+            {"prompt": "a fox", "result_id": "fox", "success": True, "timestamp": 1.0},
+            {"prompt": "a hen", "result_id": "hen", "success": False, "timestamp": 2.0}
+        ],
+        "generated_images": [{"id": "fox", "filename": "fox.webp", "path": "/out/fox.webp"}],
+        "context": {"preferred_style": "ink"}
+    }))
+
+    agent = ImageGeneratorAgent(config, memory_window=5)
+    agent.load_memory(str(path))
+    assert agent.memory.conversation_history[0].result is agent.memory.generated_images[0]
+    agent.save_memory(str(path))
+
+    with open(path) as f:
+        assert json.loads(f.readline())["type"] == "header"
+    migrated = _reload(str(path), 5)
+    assert _snapshot(migrated) == _snapshot(agent.memory)
+    assert migrated.context == {"preferred_style": "ink"}
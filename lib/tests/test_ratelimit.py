@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from gemini_image_sdk import FileRateLimiter, RateLimiter
+
+
+def test_burst_then_steady_rate():
+    limiter = RateLimiter(requests_per_minute=600, burst=3)
+
+    async def main():
+        return [await limiter.acquire() for _ in range(5)]
+
+    waits = asyncio.run(main())
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(0.1, abs=0.02)
+    assert waits[4] == pytest.approx(0.1, abs=0.02)
+
+
+def test_concurrent_waiters_are_spaced_out():
+    limiter = RateLimiter(requests_per_minute=1200, burst=1)
+
+    async def main():
+        start = time.monotonic()
+        done = []
+
+        async def take():
+            await limiter.acquire()
+            done.append(time.monotonic() - start)
+
+        await asyncio.gather(*(take() for _ in range(5)))
+        return done
+
+    done = asyncio.run(main())
+    # One token up front, then one every 50ms
+    assert done[-1] == pytest.approx(0.2, abs=0.05)
+
+
+def test_cancelled_waiter_refunds_its_token():
+    limiter = RateLimiter(requests_per_minute=60, burst=1)
+
+    async def main():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(main())
+    # Back to the one token in debt from the first acquire, not two
+    assert limiter.delay() == pytest.approx(1.0, abs=0.05)
+
+
+def test_delay_does_not_take_a_token():
+    limiter = RateLimiter(requests_per_minute=60, burst=1)
+    assert limiter.delay() == 0
+    assert limiter.delay() == 0
+    asyncio.run(limiter.acquire())
+    assert limiter.delay() == pytest.approx(1.0, abs=0.05)
+
+
+def test_file_limiters_share_one_bucket(tmp_path):
+    state = str(tmp_path / "bucket.json")
+    first = FileRateLimiter(state, requests_per_minute=60, burst=2)
+    second = FileRateLimiter(state, requests_per_minute=60, burst=2)
+
+    async def main():
+        await first.acquire()
+        await second.acquire()
+
+    asyncio.run(main())
+    assert first.delay() == pytest.approx(1.0, abs=0.05)
+    assert second.delay() == pytest.approx(1.0, abs=0.05)
+
+
+def test_file_limiter_delay_is_read_only(tmp_path):
+    state = tmp_path / "bucket.json"
+    limiter = FileRateLimiter(str(state), requests_per_minute=60, burst=1)
+    assert limiter.delay() == 0
+    assert not state.exists()
+
+    asyncio.run(limiter.acquire())
+    before = (state.read_bytes(), os.stat(state).st_mtime_ns)
+    time.sleep(0.01)
+    for _ in range(10):
+        limiter.delay()
+    assert (state.read_bytes(), os.stat(state).st_mtime_ns) == before
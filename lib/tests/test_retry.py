@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+from conftest import FakeAPI, image_body, make_png
+
+from gemini_image_sdk import (
+    AuthenticationError,
+    ClientError,
+    ImageGenerator,
+    RateLimitError,
+    RequestTimeoutError,
+    ServerError
+)
+from gemini_image_sdk.errors import api_error, is_retryable, parse_retry_after
+
+
+@pytest.mark.parametrize("status, kind, retryable", [
+    (429, RateLimitError, True),
+    (500, ServerError, True),
+    (503, ServerError, True),
+    (401, AuthenticationError, False),
+    (403, AuthenticationError, False),
+    (400, ClientError, False),
+    (408, None, True)
+])
+def test_api_error_classification(status, kind, retryable):
+    error = api_error(status, "message")
+    if kind is not None:
+        assert isinstance(error, kind)
+    assert error.status == status
+    assert is_retryable(error) is retryable
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+    assert 25 <= parse_retry_after(date) <= 31
+
+
+def _failing_then_ok(*statuses, headers=None):
+    def respond(payload, call):
+        if call <= len(statuses):
+            return statuses[call - 1], b"nope", headers or {}
+        return 200, image_body(make_png())
+    return respond
+
+
+def test_server_errors_are_retried(config):
+    api = FakeAPI(respond=_failing_then_ok(500, 503))
+    generator = ImageGenerator(config, transport=api)
+    result = asyncio.run(generator.generate_single("p", "p.webp"))
+    assert result.success
+    assert len(api.calls) == 3
+    assert generator.metrics.counter("retries_total").value() == 2
+
+
+def test_client_errors_are_not_retried(config):
+    api = FakeAPI(respond=_failing_then_ok(400))
+    generator = ImageGenerator(config, transport=api)
+    result = asyncio.run(generator.generate_single("p", "p.webp"))
+    assert not result.success
+    assert "400" in result.error
+    assert len(api.calls) == 1
+
+
+def test_retry_after_sets_the_minimum_delay(config):
+    generator = ImageGenerator(config)
+    error = api_error(429, "slow down", retry_after=2.5)
+    assert generator._retry_delay(2, error) == 2.5
+    assert generator._retry_delay(2, api_error(500, "oops")) <= config.rate_limit.retry_delay_ms / 1000
+
+
+def test_deadline_error_is_not_rewrapped(config):
+    # One token per 0.1s, already spent, against a 0.05s image deadline
+    config.rate_limit.requests_per_minute = 600
+    config.rate_limit.burst = 1
+    config.http.image_deadline = 0.05
+    api = FakeAPI()
+    generator = ImageGenerator(config, transport=api)
+
+    async def main():
+        await generator.rate_limiter.acquire()
+        async with generator:
+            await generator.generate_with_retry("p")
+
+    with pytest.raises(RequestTimeoutError) as caught:
+        asyncio.run(main())
+    assert str(caught.value) == "Image deadline of 0.05s exceeded"
+    assert api.calls == []
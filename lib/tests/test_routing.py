@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from conftest import FakeAPI, image_body, make_png
+
+from gemini_image_sdk import AuthenticationError, ImageGenerator, ModelRouter, ServerError
+
+
+def test_consecutive_failures_demote_until_cooldown():
+    router = ModelRouter(["primary", "backup"], failure_threshold=2, cooldown=0.05)
+    router.record("primary", 0.1, ServerError(503, "busy"))
+    assert router.pick().model == "primary"
+    router.record("primary", 0.1, ServerError(503, "busy"))
+    assert router.pick().model == "backup"
+
+    time.sleep(0.06)
+    assert router.pick().model == "primary"
+    assert router.stats()[0]["requests"] == 2
+
+
+def test_slo_misses_count_as_failures():
+    router = ModelRouter(["primary", "backup"], latency_slo=0.5, failure_threshold=2)
+    router.record("primary", 0.1)
+    router.record("primary", 0.9)
+    router.record("primary", 0.1)
+    router.record("primary", 0.9)
+    assert router.pick().model == "primary"
+    router.record("primary", 0.9)
+    assert router.pick().model == "backup"
+
+
+def test_key_errors_and_single_models_never_demote():
+    router = ModelRouter(["primary", "backup"], failure_threshold=1)
+    router.record("primary", 0.1, AuthenticationError(401, "bad key"))
+    assert router.pick().model == "primary"
+
+    alone = ModelRouter(["only"], failure_threshold=1)
+    alone.record("only", 0.1, ServerError(503, "busy"))
+    assert alone.pick().model == "only"
+
+
+def test_retry_after_server_error_goes_to_the_fallback(config):
+    config.routing.fallback_models = ["backup"]
+
+    def respond(payload, call):
+        if payload["model"] == config.api.model:
+            return 503, b"busy"
+        return 200, image_body(make_png())
+
+    api = FakeAPI(respond=respond)
+    result = asyncio.run(ImageGenerator(config, transport=api).generate_single("a fox", "fox.webp"))
+    assert result.success
+    assert result.metadata["model"] == "backup"
+    assert [call[0] for call in api.calls] == [config.api.model, "backup"]
+
+
+def _slow_primary(config):
+    config.routing.fallback_models = ["backup"]
+    config.routing.latency_slo = 0.05
+    return FakeAPI(delay=lambda payload: 0.3 if payload["model"] == config.api.model else 0.0)
+
+
+def test_hedge_races_a_slow_primary_against_the_fallback(config):
+    api = _slow_primary(config)
+    generator = ImageGenerator(config, transport=api)
+
+    start = time.monotonic()
+    result = asyncio.run(generator.generate_single("a fox", "fox.webp", hedge=True))
+    assert time.monotonic() - start < 0.25
+    assert result.success
+    assert result.metadata["model"] == "backup"
+    assert [call[0] for call in api.calls] == [config.api.model, "backup"]
+    assert generator.metrics.counter("hedged_total").value(winner="fallback") == 1
+
+
+def test_no_hedge_without_opting_in(config):
+    api = _slow_primary(config)
+    generator = ImageGenerator(config, transport=api)
+    result = asyncio.run(generator.generate_single("a fox", "fox.webp"))
+    assert result.metadata["model"] == config.api.model
+    assert len(api.calls) == 1
@@ -0,0 +1,80 @@
+import asyncio
+
+from gemini_image_sdk import ImageGenerator
+
+
+class SlowClosingSession:
+    """Stands in for aiohttp.ClientSession, which reports closed only once close() returns"""
+
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        await asyncio.sleep(0.01)
+        self.closed = True
+
+
+def _generator(config):
+    generator = ImageGenerator(config)
+    generator.created = []
+
+    def create_session():
+        session = SlowClosingSession()
+        generator.created.append(session)
+        return session
+
+    generator._create_session = create_session
+    return generator
+
+
+def test_nested_entries_share_one_session(config):
+    async def main():
+        generator = _generator(config)
+        async with generator:
+            async with generator:
+                pass
+            assert not generator.created[0].closed
+        return generator
+
+    generator = asyncio.run(main())
+    assert len(generator.created) == 1
+    assert generator.created[0].closed
+    assert generator._session is None
+
+
+def test_entry_during_close_gets_a_live_session(config):
+    async def user(generator, start_after):
+        await asyncio.sleep(start_after)
+        async with generator:
+            session = generator._session
+            await asyncio.sleep(0.02)
+            # Still open: nobody closed it out from under this user
+            assert not session.closed
+
+    async def main():
+        generator = _generator(config)
+        # The later users enter while the earlier ones' session is still closing
+        await asyncio.gather(*(user(generator, i * 0.025) for i in range(4)))
+        return generator
+
+    generator = asyncio.run(main())
+    assert len(generator.created) > 1
+    assert all(session.closed for session in generator.created)
+    assert generator._session is None
+    assert generator._session_refs == 0
+
+
+def test_close_detaches_the_session(config):
+    async def main():
+        generator = _generator(config)
+        await generator.__aenter__()
+        closing = asyncio.ensure_future(generator.close())
+        await asyncio.sleep(0)
+        async with generator:
+            fresh = generator._session
+        await closing
+        return generator, fresh
+
+    generator, fresh = asyncio.run(main())
+    assert fresh is not generator.created[0]
+    assert all(session.closed for session in generator.created)
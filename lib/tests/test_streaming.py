@@ -0,0 +1,73 @@
+import base64
+import io
+import json
+
+import pytest
+from conftest import make_png
+
+from gemini_image_sdk import NoImageDataError, ResponseFormatError
+from gemini_image_sdk.streaming import DataURLExtractor
+
+PNG = make_png(size=128)
+
+
+def _body(content="", url=None, **message):
+    url = url or "data:image/png;base64," + base64.b64encode(PNG).decode()
+    message = {"content": content, "images": [{"image_url": {"url": url}}], **message}
+    return json.dumps({"choices": [{"message": message}]}).encode()
+
+
+def _extract(body, chunk_size):
+    sink = io.BytesIO()
+    extractor = DataURLExtractor(sink)
+    for start in range(0, len(body), chunk_size):
+        extractor.feed(body[start:start + chunk_size])
+    return extractor, extractor.close(), sink.read()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+def test_chunk_boundaries(chunk_size):
+    extractor, data, image = _extract(_body("here you go"), chunk_size)
+    assert image == PNG
+    assert extractor.mime_type == "image/png"
+    assert data["choices"][0]["message"]["content"] == "here you go"
+    assert extractor.decoded_bytes == len(PNG)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+def test_escaped_slashes(chunk_size):
+    body = _body().replace(b"/", b"\\/")
+    assert b"image\\/png" in body
+    extractor, _, image = _extract(body, chunk_size)
+    assert image == PNG
+    assert extractor.mime_type == "image/png"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+def test_quoted_data_url_in_text_is_not_the_image(chunk_size):
+    content = 'Embed it as src="data:image/png;base64,AAAA" or \\"data:image/gif;base64,R0lG\\"'
+    body = _body(content)
+    assert b'\\"data:image' in body
+    extractor, data, image = _extract(body, chunk_size)
+    assert image == PNG
+    assert data["choices"][0]["message"]["content"] == content
+
+
+def test_escaped_backslash_before_the_real_url():
+    # The content ends in a backslash, so the quote that opens the URL is preceded by an escaped one
+    body = _body("C:\\")
+    assert b'\\\\"' in body
+    _, _, image = _extract(body, 1)
+    assert image == PNG
+
+
+def test_response_without_image():
+    body = json.dumps({"choices": [{"message": {"content": "no image today"}}]}).encode()
+    with pytest.raises(NoImageDataError):
+        _extract(body, 3)
+
+
+def test_truncated_image_data():
+    body = _body()
+    with pytest.raises(ResponseFormatError):
+        _extract(body[:len(body) // 2], 1024)
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from conftest import FakeResponse, image_body, make_png
+
+from gemini_image_sdk import (
+    Cassette,
+    CassetteMissError,
+    ImageGenerator,
+    RecordingTransport,
+    ReplayTransport
+)
+from gemini_image_sdk.transport import fingerprint
+
+
+class FakeSession:
+    """Stands in for aiohttp.ClientSession under the live transport"""
+
+    closed = False
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = 0
+
+    @asynccontextmanager
+    async def post(self, url, headers, json, timeout):
+        self.calls += 1
+        response = FakeResponse(*self.respond(json, self.calls))
+        response.content = response  # aiohttp streams from response.content
+        yield response
+
+    async def close(self):
+        self.closed = True
+
+
+def _recording_generator(config, cassette, respond):
+    generator = ImageGenerator(config, transport=RecordingTransport(cassette))
+    session = FakeSession(respond)
+    generator._create_session = lambda: session
+    return generator, session
+
+
+def _flaky(payload, call):
+    if call == 1:
+        return 500, b"try again", {"Retry-After": "0", "Set-Cookie": "secret"}
+    return 200, image_body(make_png()), {"Content-Type": "application/json"}
+
+
+def test_recorded_run_replays_offline(config, tmp_path):
+    cassette_path = str(tmp_path / "cassette")
+    generator, session = _recording_generator(config, Cassette(cassette_path), _flaky)
+    recorded = asyncio.run(generator.generate_single("a fox", "fox.webp"))
+    assert recorded.success and session.calls == 2
+
+    config.output.base_dir = str(tmp_path / "replayed")
+    replayer = ImageGenerator(config, transport=ReplayTransport(Cassette(cassette_path), latency_scale=0))
+    replayed = asyncio.run(replayer.generate_single("a fox", "fox.webp"))
+
+    assert replayed.success
+    assert replayer.metrics.counter("retries_total").value() == 1
+    with open(recorded.path, "rb") as a, open(replayed.path, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_answers_replay_in_order_then_repeat(tmp_path):
+    cassette = Cassette(str(tmp_path / "cassette"))
+    session = FakeSession(_flaky)
+    recorder = RecordingTransport(cassette)
+    payload = {"model": "m", "messages": [{"role": "user", "content": "a fox"}]}
+
+    async def post(transport, session=None):
+        async with transport.post(session, "https://api/x", {"Authorization": "Bearer k"}, payload, None) as r:
+            return r.status, dict(r.headers), await r.read()
+
+    async def record():
+        for _ in range(2):
+            await post(recorder, session)
+
+    asyncio.run(record())
+
+    replay = ReplayTransport(Cassette(str(tmp_path / "cassette")), latency_scale=0)
+
+    async def replay_all():
+        return [await post(replay) for _ in range(3)]
+
+    answers = asyncio.run(replay_all())
+    assert [status for status, _, _ in answers] == [500, 200, 200]
+    assert answers[0][1] == {"Retry-After": "0"}
+    assert answers[1][2] == answers[2][2] == image_body(make_png())
+
+    payload["model"] = "other"
+    with pytest.raises(CassetteMissError):
+        asyncio.run(post(replay))
+
+
+def test_rerecording_replaces_earlier_answers(tmp_path):
+    path = str(tmp_path / "cassette")
+    Cassette(path).add("req", 500, {}, b"old", 0.0, 0.0)
+    rerecorded = Cassette(path)
+    rerecorded.add("req", 200, {}, b"new", 0.0, 0.0)
+    rerecorded.add("req", 200, {}, b"new", 0.0, 0.0)
+
+    replayed = Cassette(path)
+    assert [replayed.next("req")[1] for _ in range(3)] == [b"new"] * 3
+    assert len(list((tmp_path / "cassette" / "bodies").rglob("*.gz"))) == 2
+
+
+def test_replay_latency_is_scaled_or_replaced(tmp_path):
+    cassette = Cassette(str(tmp_path / "cassette"))
+    payload = {"model": "m"}
+    cassette.add(fingerprint("https://api/x", payload), 200, {}, b"{}", ttfb=0.2, duration=0.2)
+
+    async def timed(transport):
+        cassette.rewind()
+        start = time.monotonic()
+        async with transport.post(None, "https://api/x", {}, payload, None) as response:
+            await response.read()
+        return time.monotonic() - start
+
+    assert asyncio.run(timed(ReplayTransport(cassette, latency_scale=0.25))) == pytest.approx(0.05, abs=0.03)
+    assert asyncio.run(timed(ReplayTransport(cassette, latency=0.01))) < 0.05
+    assert asyncio.run(timed(ReplayTransport(cassette, latency_scale=0))) < 0.02
+
+
+def test_recording_after_an_interrupted_write_keeps_the_new_answer(tmp_path):
+    path = tmp_path / "cassette"
+    Cassette(str(path)).add("first", 200, {}, b"one", 0.0, 0.0)
+    with open(path / "index.jsonl", "a") as f:
+        f.write('{"fingerprint": "torn", "seq": 0, "sta')
+
+    Cassette(str(path)).add("second", 200, {}, b"two", 0.0, 0.0)
+    replayed = Cassette(str(path))
+    assert replayed.next("first")[1] == b"one"
+    assert replayed.next("second")[1] == b"two"
+    assert replayed.next("torn") is None
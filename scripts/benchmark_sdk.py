@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Offline CPU hot-path benchmarks for the Gemini Image SDK
+
+Fixture images are synthesized at our real output sizes, so no network or
+API key is needed. Results are written as JSON for comparison across commits:
+
+    python scripts/benchmark_sdk.py --output bench_results.json
+    python scripts/benchmark_sdk.py --quick --filter encode
+    python scripts/benchmark_sdk.py --filter import
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lib"))
+
+from PIL import Image
+
+from gemini_image_sdk import (
+    Config,
+    APIConfig,
+    BatchConfig,
+    Cassette,
+    ImageGenerator,
+    ImageGeneratorAgent,
+    ImagePrompt,
+    GenerationResult,
+    RateLimiter,
+    TransportConfig
+)
+from gemini_image_sdk.imaging import OutputSpec, render_image, resize_image
+from gemini_image_sdk.streaming import DataURLExtractor
+from gemini_image_sdk.transport import fingerprint
+
+# Output sizes used by the site scripts
+SIZES = [(1792, 1024), (1920, 1080), (800, 600)]
+# Gemini returns 1024x1024 PNGs; this is what every output is rendered from
+SOURCE_SIZE = (1024, 1024)
+FORMATS = [("webp", 90), ("webp", 75), ("jpeg", 90), ("png", 90)]
+MEMORY_SIZES = [100, 1000, 10000]
+# Statements timed in a fresh interpreter by bench_import
+IMPORT_TARGETS = {
+    "package": "import gemini_image_sdk",
+    "config_validate": "from gemini_image_sdk import Config, APIConfig; Config(api=APIConfig(key='x')).validate()",
+    "cli": "import gemini_image_sdk.cli",
+    "generator": "from gemini_image_sdk import ImageGenerator",
+    "agent": "from gemini_image_sdk import ImageGeneratorAgent"
+}
+# Dependencies that should only load once a request or image needs them
+HEAVY_MODULES = ("aiohttp", "PIL", "numpy")
+# Images per replayed batch in bench_pipeline
+PIPELINE_IMAGES = 24
+# Downscale targets for thumbnails and srcset renditions
+THUMBNAIL_SIZES = [(800, 600), (400, 300), (200, 150)]
+# ProcessingConfig.reducing_gap timed by bench_resize_engine
+REDUCING_GAP = 2.0
+
+
+def make_fixture(width: int, height: int) -> bytes:
+    """Synthesize a PNG whose size and entropy resemble a generated image"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 48)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def make_response(png: bytes) -> bytes:
+    """Wrap a PNG in an OpenRouter-style chat completion body"""
+    url = "data:image/png;base64," + base64.b64encode(png).decode()
+    return json.dumps({
+        "id": "gen-bench",
+        "choices": [{"message": {"role": "assistant", "content": "", "images": [
+            {"type": "image_url", "image_url": {"url": url}}
+        ]}}]
+    }).encode()
+
+
+def measure(fn, repeat: int, number: int = 1) -> dict:
+    """Time fn() `number` times per sample, `repeat` samples; report per-call stats"""
+    fn()  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+        "repeat": repeat,
+        "number": number
+    }
+
+
+def bench_decode(args, results):
+    png = make_fixture(*SOURCE_SIZE)
+    data_url = "data:image/png;base64," + base64.b64encode(png).decode()
+    body = make_response(png)
+
+    results["decode.b64decode"] = {
+        "payload_bytes": len(data_url),
+        **measure(lambda: base64.b64decode(data_url.split(",", 1)[1]), args.repeat, 5)
+    }
+
+    def streamed():
+        extractor = DataURLExtractor(io.BytesIO())
+        for i in range(0, len(body), 64 * 1024):
+            extractor.feed(body[i:i + 64 * 1024])
+        extractor.close()
+
+    results["decode.streaming_extractor"] = {
+        "payload_bytes": len(body),
+        **measure(streamed, args.repeat, 5)
+    }
+    results["decode.pil_open_load"] = measure(
+        lambda: Image.open(io.BytesIO(png)).load(), args.repeat, 5
+    )
+
+
+def bench_resize(args, results):
+    source = Image.open(io.BytesIO(make_fixture(*SOURCE_SIZE)))
+    source.load()
+    for width, height in SIZES:
+        results[f"resize.lanczos.{width}x{height}"] = measure(
+            lambda: source.resize((width, height), Image.Resampling.LANCZOS), args.repeat
+        )
+
+
+def bench_resize_engine(args, results):
+    """resize_image and render_image with reducing_gap (reduce, JPEG draft) against the same exact resize"""
+    png = make_fixture(*SOURCE_SIZE)
+    large = Image.open(io.BytesIO(make_fixture(2048, 2048)))
+    buffer = io.BytesIO()
+    large.convert("RGB").save(buffer, "JPEG", quality=90)
+    jpeg = buffer.getvalue()
+
+    sources = {"png1024": png, "jpeg2048": jpeg}
+    for name, data in sources.items():
+        source = Image.open(io.BytesIO(data))
+        source.load()
+        for width, height in SIZES + THUMBNAIL_SIZES:
+            for fit in ("stretch", "cover"):
+                baseline = measure(lambda: resize_image(source, width, height, fit), args.repeat)
+                fast = measure(
+                    lambda: resize_image(source, width, height, fit, reducing_gap=REDUCING_GAP),
+                    args.repeat
+                )
+                results[f"resize_engine.{name}.{fit}.{width}x{height}"] = {
+                    **fast,
+                    "baseline_median_ms": baseline["median_ms"],
+                    "speedup": baseline["median_ms"] / fast["median_ms"]
+                }
+
+    # Decode + resize + encode from a large JPEG, where draft mode skips most of the decode
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "thumb.webp")
+        for width, height in THUMBNAIL_SIZES:
+            spec = OutputSpec(path, width, height, "webp", 80, "cover")
+            baseline = measure(lambda: render_image(jpeg, [spec]), args.repeat)
+            fast = measure(lambda: render_image(jpeg, [spec], reducing_gap=REDUCING_GAP), args.repeat)
+            results[f"resize_engine.render_jpeg_draft.{width}x{height}"] = {
+                **fast,
+                "baseline_median_ms": baseline["median_ms"],
+                "speedup": baseline["median_ms"] / fast["median_ms"]
+            }
+
+
+def bench_encode(args, results):
+    for width, height in SIZES:
+        image = Image.open(io.BytesIO(make_fixture(width, height)))
+        image.load()
+        for fmt, quality in FORMATS:
+            sizes = []
+
+            def encode():
+                buffer = io.BytesIO()
+                image.save(buffer, fmt.upper(), quality=quality)
+                sizes.append(buffer.tell())
+
+            timing = measure(encode, args.repeat)
+            results[f"encode.{fmt}.q{quality}.{width}x{height}"] = {
+                "output_bytes": sizes[-1],
+                **timing
+            }
+
+
+def bench_save_image(args, results):
+    """End-to-end post-processing as ImageGenerator runs it per image"""
+    png = make_fixture(*SOURCE_SIZE)
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in SIZES:
+            spec = OutputSpec(os.path.join(tmp, "out.webp"), width, height, "webp", 90)
+            results[f"save_image.webp.{width}x{height}"] = measure(
+                lambda: render_image(png, [spec]), args.repeat
+            )
+
+
+def bench_rate_limiter(args, results):
+    count = 2000 if args.quick else 20000
+    limiter = RateLimiter(requests_per_minute=1e12, burst=count)
+
+    async def acquire_all():
+        for _ in range(count):
+            await limiter.acquire()
+
+    samples = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        asyncio.run(acquire_all())
+        samples.append((time.perf_counter() - start) / count)
+    results["rate_limiter.acquire"] = {
+        "median_us": statistics.median(samples) * 1e6,
+        "min_us": min(samples) * 1e6,
+        "operations": count
+    }
+
+
+def bench_memory(args, results):
+    config = Config(api=APIConfig(key="benchmark"), logging_enabled=False, cache_enabled=False)
+    sizes = MEMORY_SIZES[:2] if args.quick else MEMORY_SIZES
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            agent = ImageGeneratorAgent(config)
+            result = GenerationResult(
+                success=True, id="bench", filename="bench.webp", path="/tmp/bench.webp"
+            )
+
+            start = time.perf_counter()
+            for i in range(size):
+                agent.memory.add_interaction(f"prompt {i}", result)
+            add_us = (time.perf_counter() - start) / size * 1e6
+
+            path = os.path.join(tmp, f"memory_{size}.jsonl")
+            results[f"memory.add_interaction.{size}"] = {"per_call_us": add_us}
+            # A single first save writes the whole window; later ones append only new entries
+            start = time.perf_counter()
+            agent.save_memory(path)
+            results[f"memory.save_memory.{size}"] = {
+                "median_ms": (time.perf_counter() - start) * 1000,
+                "file_bytes": os.path.getsize(path)
+            }
+
+            def add_and_save():
+                agent.memory.add_interaction("prompt", result)
+                agent.save_memory(path)
+
+            results[f"memory.append_save.{size}"] = measure(add_and_save, args.repeat, 100)
+
+
+def bench_import(args, results):
+    """Cold import time of the SDK entry points, each in a fresh interpreter"""
+    lib = str(Path(__file__).resolve().parent.parent / "lib")
+    env = dict(os.environ, PYTHONPATH=lib + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    check = f"; import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+
+    def run(statement: str) -> str:
+        return subprocess.run(
+            [sys.executable, "-c", statement + check],
+            capture_output=True, text=True, env=env, check=True
+        ).stdout.strip()
+
+    def interpreter_ms(statement: str) -> list:
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run(statement)
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    baseline = statistics.median(interpreter_ms("pass"))
+    for name, statement in IMPORT_TARGETS.items():
+        samples = interpreter_ms(statement)
+        heavy = run(statement)
+        results[f"import.{name}"] = {
+            "median_ms": max(0.0, statistics.median(samples) - baseline),
+            "min_ms": max(0.0, min(samples) - baseline),
+            "interpreter_ms": baseline,
+            "heavy_modules": heavy.split(",") if heavy else [],
+            "repeat": args.repeat
+        }
+
+
+def _pipeline_config(cassette: str, output_dir: str) -> Config:
+    config = Config(
+        api=APIConfig(key="benchmark"),
+        transport=TransportConfig(mode="replay", cassette=cassette, latency_scale=0.0),
+        logging_enabled=False,
+        cache_enabled=False,
+        coalesce_enabled=False
+    )
+    config.output.base_dir = output_dir
+    config.rate_limit.requests_per_minute = 1e9
+    config.rate_limit.burst = 10 ** 6
+    return config
+
+
+def _synthesize_cassette(path: str, prompts: list):
+    """Record one fixture response per prompt, as if each had come from the API"""
+    cassette = Cassette(path)
+    generator = ImageGenerator(_pipeline_config(path, path))
+    bodies = [make_response(make_fixture(*SOURCE_SIZE)) for _ in range(4)]
+    for index, prompt in enumerate(prompts):
+        url, payload = generator._image_request(prompt.prompt, generator.config.api.model)
+        cassette.add(fingerprint(url, payload), 200, {"Content-Type": "application/json"},
+                     bodies[index % len(bodies)], ttfb=0.0, duration=0.0)
+
+
+def bench_pipeline(args, results):
+    """generate_batch end to end against a replayed cassette, with no network or response latency"""
+    count = PIPELINE_IMAGES // 2 if args.quick else PIPELINE_IMAGES
+    with tempfile.TemporaryDirectory() as tmp:
+        prompts = [
+            ImagePrompt(id=str(i), prompt=f"benchmark scene {i}", filename=f"{i}.webp", width=1792, height=1024)
+            for i in range(count)
+        ]
+        cassette = os.path.join(tmp, "cassette")
+        _synthesize_cassette(cassette, prompts)
+
+        async def run_batch(workers: int) -> list:
+            async with ImageGenerator(_pipeline_config(cassette, tmp)) as generator:
+                return await generator.generate_batch(BatchConfig(
+                    images=prompts, output_dir=tmp, parallel=True, max_workers=workers
+                ))
+
+        for workers in (1, 4):
+            failures = []
+
+            def batch():
+                failures[:] = [r.error for r in asyncio.run(run_batch(workers)) if not r.success]
+
+            stats = measure(batch, args.repeat)
+            stats["images"] = count
+            stats["images_per_s"] = count / (stats["median_ms"] / 1000)
+            stats["failures"] = len(failures)
+            results[f"pipeline.generate_batch.workers_{workers}"] = stats
+
+
+BENCHMARKS = {
+    "import": bench_import,
+    "decode": bench_decode,
+    "resize": bench_resize,
+    "resize_engine": bench_resize_engine,
+    "encode": bench_encode,
+    "save_image": bench_save_image,
+    "rate_limiter": bench_rate_limiter,
+    "memory": bench_memory,
+    "pipeline": bench_pipeline
+}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    import PIL
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--repeat", type=int, default=None, help="samples per benchmark")
+    parser.add_argument("--quick", action="store_true", help="fewer samples and sizes")
+    parser.add_argument("--filter", default=None, help="only run groups containing this text")
+    args = parser.parse_args()
+    if args.repeat is None:
+        args.repeat = 3 if args.quick else 10
+
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        print(f"⏱️  {name}...")
+        bench(args, results)
+
+    for key, value in results.items():
+        timing = value.get("median_ms", value.get("median_us", value.get("per_call_us")))
+        unit = "ms" if "median_ms" in value else "us"
+        print(f"   {key:<40} {timing:10.3f} {unit}")
+
+    report = {"environment": environment(), "results": results}
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
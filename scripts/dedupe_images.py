@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate images in an asset folder by perceptual hash
+
+Hashes are kept in an index file, so rescans only hash new or changed files:
+
+    python scripts/dedupe_images.py public/images/ai
+    python scripts/dedupe_images.py public/images/ai --distance 8 --similar-to hero.webp
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lib"))
+
+from gemini_image_sdk import PerceptualIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default="public/images/ai", help="folder to scan")
+    parser.add_argument("--index", default="./.cache/gemini_phash.jsonl", help="perceptual-hash index file")
+    parser.add_argument("--distance", type=int, default=5, help="max Hamming distance counted as a duplicate")
+    parser.add_argument("--similar-to", help="list the indexed images nearest to this file instead")
+    args = parser.parse_args()
+
+    index = PerceptualIndex(args.index)
+    start = time.perf_counter()
+    hashed = index.scan(args.directory)
+    index.compact()
+    print(f"🔍 Indexed {len(index)} images ({hashed} hashed) in {time.perf_counter() - start:.2f}s")
+
+    if args.similar_to:
+        for path, distance in index.query(args.similar_to, args.distance, limit=10, exclude=args.similar_to):
+            print(f"   {distance:2d}  {os.path.relpath(path)}")
+        return
+
+    groups = index.duplicates(args.distance)
+    for group in groups:
+        print(f"\n🖼️  {len(group)} near-duplicates:")
+        for path in group:
+            print(f"   {os.path.relpath(path)}  ({os.path.getsize(path) / 1024:.0f} KiB)")
+    print(f"\n📊 {len(groups)} duplicate groups, {sum(len(g) - 1 for g in groups)} redundant files")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,64 +3,36 @@
 Generate artistic images for HealthTech Forge using OpenRouter API
 """
 
-import requests
+import asyncio
 import json
-import base64
+import sys
 from pathlib import Path
 import time
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lib"))
+
+from gemini_image_sdk import Config, APIConfig, EnhancerConfig, ImageGenerator, PromptEnhancer
+
 # Configuration
 API_KEY = "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"
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
+API_URL = "https://openrouter.ai/api/v1"
 OUTPUT_DIR = Path("/Users/mattrundle/Documents/BetterPractice/public/images/ai")
 
 # Create output directory
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def generate_image_prompt(description):
-    """Generate an enhanced image prompt using Gemini"""
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "http://localhost:3000",
-        "X-Title": "HealthTech Forge"
-    }
-
-    prompt = f"""Create a detailed image generation prompt for: {description}
-
-    Requirements:
-    - Ultra-modern, artistic style
-    - Dark background with neon accents
-    - Futuristic healthcare technology aesthetic
-    - Photorealistic quality
-    - Cinematic lighting
-    - Include specific details about composition, colors, and mood
-    - Make it visually striking and unique
-
-    Return only the enhanced prompt, no explanations."""
-
-    data = {
-        "model": "google/gemini-flash-1.5",
-        "messages": [
-            {"role": "system", "content": "You are an expert at creating detailed, artistic image generation prompts."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.8,
-        "max_tokens": 500
-    }
-
-    try:
-        response = requests.post(API_URL, headers=headers, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
-            return description
-    except Exception as e:
-        print(f"Error generating prompt: {e}")
-        return description
+STYLE = """- Ultra-modern, artistic style
+- Dark background with neon accents
+- Futuristic healthcare technology aesthetic
+- Photorealistic quality
+- Cinematic lighting
+- Include specific details about composition, colors, and mood
+- Make it visually striking and unique"""
+
+
+async def generate_image_prompt(enhancer, description):
+    """Generate an enhanced image prompt using Gemini; falls back to the description on errors"""
+    return await enhancer.enhance(description, STYLE)
 
 # Image descriptions for the website
 IMAGES_TO_GENERATE = {
@@ -97,24 +69,36 @@ def save_prompt_as_placeholder(name, prompt):
         }, f, indent=2)
     print(f"✅ Saved prompt for {name}")
 
-def main():
+async def main():
     print("🎨 Generating Artistic Image Prompts for HealthTech Forge")
     print("=" * 60)
 
-    for image_name, description in IMAGES_TO_GENERATE.items():
+    config = Config(
+        api=APIConfig(
+            key=API_KEY,
+            base_url=API_URL,
+            headers={"HTTP-Referer": "http://localhost:3000", "X-Title": "HealthTech Forge"}
+        ),
+        enhancer=EnhancerConfig(enabled=True),
+        logging_enabled=False
+    )
+
+    # All prompts are requested concurrently, within the enhancer's rate and concurrency limits
+    async with ImageGenerator(config) as generator:
+        enhancer = PromptEnhancer(generator)
+        enhanced_prompts = await asyncio.gather(*(
+            generate_image_prompt(enhancer, description)
+            for description in IMAGES_TO_GENERATE.values()
+        ))
+
+    for (image_name, description), enhanced_prompt in zip(IMAGES_TO_GENERATE.items(), enhanced_prompts):
         print(f"\n🖼️  Processing: {image_name}")
         print(f"   Description: {description[:80]}...")
-
-        # Generate enhanced prompt
-        enhanced_prompt = generate_image_prompt(description)
         print(f"   Enhanced: {enhanced_prompt[:80]}...")
 
         # Save the prompt
         save_prompt_as_placeholder(image_name, enhanced_prompt)
 
-        # Rate limiting
-        time.sleep(1)
-
     print("\n" + "=" * 60)
     print("✨ Prompt generation complete!")
     print(f"📁 Prompts saved to: {OUTPUT_DIR}")
@@ -124,4 +108,4 @@ def main():
     print("3. Place generated images in the public/images/ai directory")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
@@ -95,14 +95,12 @@ async def generate_images():
             print(f"   Prompt: {specs['prompt'][:80]}...")
 
             try:
-                # Update output config for specific size
-                generator.config.output.width = specs['size'][0]
-                generator.config.output.height = specs['size'][1]
-
-                # Generate the image
+                # Generate the image at its own size
                 result = await generator.generate_single(
                     prompt=specs['prompt'],
-                    filename=f"{image_name}.webp"
+                    filename=f"{image_name}.webp",
+                    width=specs['size'][0],
+                    height=specs['size'][1]
                 )
 
                 if result.success: